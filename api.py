@@ -0,0 +1,348 @@
+# Headless HTTP API over the same download core as the Streamlit app, for
+# server-to-server use. Runs on asyncio; extraction and downloads happen
+# on the shared job workers, so the event loop only handles requests.
+#
+#   python api.py --port 8503
+#
+#   POST   /api/info                {"url": ...}                     -> video info and formats
+#   POST   /api/jobs                {"url": ..., "quality": "720p",
+#                                    "whole_playlist": false,
+#                                    "start": "1:30", "end": "2:00"} -> 202 {"job_id": ...}
+#   GET    /api/jobs/<id>?wait=30                                    -> job status (waits up to 30 s to finish)
+#   DELETE /api/jobs/<id>                                            -> cancel the job
+#   GET    /api/jobs/<id>/result                                     -> the file (Range requests supported)
+#   DELETE /api/jobs/<id>/result                                     -> free the file on the server
+#   GET    /healthz
+#
+# Jobs are queued and throttled per client like the app's sessions; a
+# client names itself with an "X-Client-Id" header, or is told apart by
+# its address.
+
+import argparse
+import asyncio
+import hmac
+import json
+import re
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+import config
+from clips import parse_clip
+from core import VideoInfoError, get_video_info, job_download_filename, pick_format, submit_download
+from delivery import get_artifact_store, parse_range
+from jobs import DONE, get_job_registry
+from metrics import get_metrics, start_metrics_server
+
+MAX_BODY = 64 * 1024
+MAX_WAIT = 60
+CLIENT_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, headers, body, peer=None):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path.rstrip('/') or '/'
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+        self.peer = peer
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return data
+
+    # The scheduler session of the caller: its X-Client-Id, or its address
+    @property
+    def session_id(self):
+        client_id = self.headers.get('x-client-id', '')
+        if client_id and not CLIENT_ID_RE.match(client_id):
+            raise HTTPError(400, "X-Client-Id may only hold up to 64 letters, digits and . _ : -")
+        return f"api-{client_id}" if client_id else f"api-addr-{self.peer or 'unknown'}"
+
+    @property
+    def keep_alive(self):
+        return self.headers.get('connection', '').lower() != 'close'
+
+
+async def read_request(reader, peer=None):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get('content-length', '0')
+    if not length.isdigit():
+        raise HTTPError(400, "Invalid Content-Length")
+    if int(length) > MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(int(length)) if int(length) else b''
+    return Request(method.upper(), target, headers, body, peer)
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+
+async def send_json(writer, status, data, keep_alive=True):
+    body = json.dumps(data).encode('utf-8')
+    writer.write(response_head(status, {
+        'Content-Type': 'application/json',
+        'Content-Length': len(body),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }) + body)
+    await writer.drain()
+
+
+def job_status(job):
+    status = {
+        'job_id': job.id,
+        'state': job.state,
+        'progress': job.progress,
+        'status_text': job.status_text,
+        'title': job.meta.get('title'),
+        'quality': job.meta.get('quality'),
+        'clip': job.meta.get('clip'),
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+    if job.error:
+        status['error'] = job.error
+    if job.cancel_requested:
+        status['cancelled'] = True
+    if job.state == DONE:
+        status['filename'] = job_download_filename(job)
+        status['cached'] = bool(job.result.get('cached'))
+        status['result_url'] = f"/api/jobs/{job.id}/result"
+        status['available'] = get_artifact_store().has(job.result['token'])
+    return status
+
+
+def get_job(job_id):
+    job = get_job_registry().get(job_id)
+    if job is None:
+        raise HTTPError(404, "No such job")
+    return job
+
+
+async def handle_info(request, writer):
+    url = request.json().get('url')
+    if not url:
+        raise HTTPError(400, "\"url\" is required")
+    try:
+        video_info = await asyncio.to_thread(get_video_info, url)
+    except VideoInfoError as e:
+        raise HTTPError(422, str(e))
+    await send_json(writer, 200, video_info, request.keep_alive)
+
+
+async def handle_submit(request, writer):
+    data = request.json()
+    session_id = request.session_id
+    url = data.get('url')
+    if not url:
+        raise HTTPError(400, "\"url\" is required")
+    try:
+        video_info = await asyncio.to_thread(get_video_info, url)
+        quality, selected_format = pick_format(video_info, data.get('quality'))
+        clip = None
+        if data.get('start') is not None or data.get('end') is not None:
+            clip = parse_clip(str(data.get('start') or ''), str(data.get('end') or ''), video_info['duration'])
+    except VideoInfoError as e:
+        raise HTTPError(422, str(e))
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+    # One session per client, so a client's jobs take turns with everyone
+    # else's, and only its own older results make room for new ones
+    get_artifact_store().set_session_budget(session_id, config.API_CLIENT_DISK_BUDGET)
+    try:
+        job_id = submit_download(url, video_info, quality, session_id,
+                                 whole_playlist=bool(data.get('whole_playlist')), clip=clip)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    await send_json(writer, 202, {
+        'job_id': job_id,
+        'quality': quality,
+        'format': selected_format,
+        'status_url': f"/api/jobs/{job_id}",
+        'result_url': f"/api/jobs/{job_id}/result",
+    }, request.keep_alive)
+
+
+async def handle_status(request, writer, job_id):
+    job = get_job(job_id)
+    try:
+        wait = min(float(request.query.get('wait', ['0'])[0]), MAX_WAIT)
+    except ValueError:
+        raise HTTPError(400, "\"wait\" must be a number of seconds")
+
+    # Long polling: hold the request until the job finishes or time runs out
+    deadline = time.monotonic() + wait
+    while not job.finished and time.monotonic() < deadline:
+        await asyncio.sleep(min(config.JOB_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+    await send_json(writer, 200, job_status(job), request.keep_alive)
+
+
+async def handle_cancel(request, writer, job_id):
+    job = get_job(job_id)
+    cancelled = get_job_registry().cancel(job.id)
+    await send_json(writer, 200, {'job_id': job.id, 'cancelled': cancelled}, request.keep_alive)
+
+
+async def handle_result(request, writer, job_id):
+    job = get_job(job_id)
+    if job.state != DONE:
+        raise HTTPError(409, f"Job is {job.state}")
+
+    store = get_artifact_store()
+    if request.method == 'DELETE':
+        store.discard(job.result['token'])
+        await send_json(writer, 200, {'job_id': job.id, 'deleted': True}, request.keep_alive)
+        return
+
+    artifact = store.acquire(job.result['token'])
+    if artifact is None:
+        raise HTTPError(410, "The file has expired; submit the job again")
+    try:
+        size = artifact.size
+        try:
+            byte_range = parse_range(request.headers.get('range'), size)
+        except ValueError:
+            writer.write(response_head(416, {'Content-Range': f'bytes */{size}', 'Content-Length': 0}))
+            await writer.drain()
+            return
+
+        headers = {
+            'Content-Type': artifact.mime,
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(job_download_filename(job))}",
+            'Connection': 'keep-alive' if request.keep_alive else 'close',
+        }
+        if byte_range is None:
+            status, (start, end) = 200, (0, size - 1)
+        else:
+            status, (start, end) = 206, byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        length = end - start + 1 if size else 0
+        headers['Content-Length'] = length
+
+        writer.write(response_head(status, headers))
+        await writer.drain()
+        if request.method == 'GET' and length:
+            with get_metrics().span('delivery', mode='api'):
+                for piece in artifact.pieces(start, length):
+                    if isinstance(piece, bytes):
+                        writer.write(piece)
+                        await writer.drain()
+                        continue
+                    path, offset, count = piece
+                    with open(path, 'rb') as f:
+                        # sendfile where the transport supports it, chunked reads otherwise
+                        await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+            get_metrics().inc('ytdl_delivery_bytes_total', length, mode='api')
+    finally:
+        store.release(artifact)
+
+
+async def dispatch(request, writer):
+    if config.API_TOKEN:
+        supplied = request.headers.get('authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {config.API_TOKEN}".encode()):
+            raise HTTPError(401, "Missing or wrong API token")
+
+    parts = request.path.strip('/').split('/')
+    if request.path == '/healthz' and request.method == 'GET':
+        await send_json(writer, 200, {'status': 'ok', 'jobs': get_job_registry().stats()}, request.keep_alive)
+    elif request.path == '/api/info' and request.method == 'POST':
+        await handle_info(request, writer)
+    elif request.path == '/api/jobs' and request.method == 'POST':
+        await handle_submit(request, writer)
+    elif len(parts) == 3 and parts[:2] == ['api', 'jobs'] and request.method == 'GET':
+        await handle_status(request, writer, parts[2])
+    elif len(parts) == 3 and parts[:2] == ['api', 'jobs'] and request.method == 'DELETE':
+        await handle_cancel(request, writer, parts[2])
+    elif len(parts) == 4 and parts[:2] == ['api', 'jobs'] and parts[3] == 'result' \
+            and request.method in ('GET', 'HEAD', 'DELETE'):
+        await handle_result(request, writer, parts[2])
+    else:
+        raise HTTPError(404, "Not found")
+
+
+async def handle_connection(reader, writer):
+    peer = writer.get_extra_info('peername')
+    try:
+        while True:
+            try:
+                request = await read_request(reader, peer[0] if peer else None)
+                if request is None:
+                    break
+                await dispatch(request, writer)
+            except HTTPError as e:
+                await send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                break
+            if not request.keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception as e:
+        try:
+            await send_json(writer, 500, {'error': str(e)}, keep_alive=False)
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port):
+    server = await asyncio.start_server(handle_connection, host, port)
+    addresses = ', '.join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Serving the download API on {addresses}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API for submitting downloads and fetching the files")
+    parser.add_argument('--host', default=config.API_HOST)
+    parser.add_argument('--port', type=int, default=config.API_PORT)
+    args = parser.parse_args()
+
+    try:
+        start_metrics_server()
+    except OSError:
+        pass
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
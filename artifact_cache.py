@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import config
+from metrics import get_metrics
+
+
+# Cache key for a finished file: the same video, format and post-processing
+# always produce the same bytes
+def artifact_key(video_id, format_id, postprocessing=None):
+    raw = json.dumps([video_id, format_id, postprocessing or {}], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, key, path, size, last_used):
+        self.key = key
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.size = size
+        self.last_used = last_used
+        self.refs = 0
+
+
+# Shared on-disk cache of finished downloads. Each entry is a directory
+# objects/<key>/ holding one file under its original name. Files are moved
+# in through a staging directory and renamed into place, so readers never
+# see partial files. Entries in use (refs > 0) are never evicted; the rest
+# are evicted least recently used first once the byte budget is exceeded.
+class ArtifactCache:
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.objects_dir = self.root / "objects"
+        self.staging_dir = self.root / "staging"
+
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load()
+
+    def _load(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        for entry_dir in self.objects_dir.iterdir():
+            files = [f for f in entry_dir.iterdir() if f.is_file()] if entry_dir.is_dir() else []
+            if len(files) != 1:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            stat = files[0].stat()
+            entry = CacheEntry(entry_dir.name, str(files[0]), stat.st_size, entry_dir.stat().st_mtime)
+            self._entries[entry.key] = entry
+            self.total_bytes += entry.size
+
+        with self._lock:
+            self._evict_locked()
+
+    # Whether an entry exists, without pinning or counting a lookup
+    def has(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and os.path.exists(entry.path)
+
+    # Look up and pin an entry; call release(key) when done with it
+    def acquire(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(entry.path):
+                self.misses += 1
+                get_metrics().inc('ytdl_cache_requests_total', cache='artifact', result='miss')
+                return None
+            entry.refs += 1
+            self._touch_locked(entry)
+            self.hits += 1
+            get_metrics().inc('ytdl_cache_requests_total', cache='artifact', result='hit')
+            return entry
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+            self._evict_locked()
+
+    # Move a finished file into the cache and return its pinned entry, or
+    # None if it doesn't fit in the budget (the file is left where it was)
+    def put(self, key, path):
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return None
+
+        staging = Path(tempfile.mkdtemp(dir=self.staging_dir))
+        try:
+            staged_file = staging / os.path.basename(path)
+            shutil.move(path, staged_file)
+
+            with self._lock:
+                existing = self._entries.get(key)
+                if existing is not None:
+                    # Someone else cached the same artifact first
+                    existing.refs += 1
+                    self._touch_locked(existing)
+                    shutil.rmtree(staging, ignore_errors=True)
+                    return existing
+
+                final_dir = self.objects_dir / key
+                shutil.rmtree(final_dir, ignore_errors=True)
+                os.rename(staging, final_dir)
+
+                entry = CacheEntry(key, str(final_dir / staged_file.name), size, time.time())
+                entry.refs = 1
+                self._entries[key] = entry
+                self.total_bytes += size
+                self._evict_locked()
+                return entry
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+
+    def _touch_locked(self, entry):
+        entry.last_used = time.time()
+        try:
+            os.utime(os.path.dirname(entry.path))
+        except OSError:
+            pass
+
+    def _evict_locked(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_used):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if entry.refs > 0:
+                continue
+            del self._entries[entry.key]
+            self.total_bytes -= entry.size
+            self.evictions += 1
+            shutil.rmtree(os.path.dirname(entry.path), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Process-wide artifact cache, or None when disabled (budget of 0)
+def get_artifact_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None and config.ARTIFACT_CACHE_MAX_BYTES > 0:
+            _cache = ArtifactCache(config.ARTIFACT_CACHE_DIR, config.ARTIFACT_CACHE_MAX_BYTES)
+        return _cache
@@ -0,0 +1,102 @@
+import os
+import subprocess
+
+from capabilities import get_capabilities
+from metrics import get_metrics
+from parallel_encode import encode_mp3_parallel, get_core_pool
+
+# Audio-only download modes. "m4a" and "opus" keep the original stream
+# (AAC or Opus) without re-encoding; only "mp3" transcodes.
+AUDIO_MODES = {
+    'm4a': {
+        'label': "Audio Only (M4A)",
+        'format': 'bestaudio[ext=m4a]/bestaudio',
+        'ext': 'm4a',
+        'source_ext': 'm4a',
+    },
+    'opus': {
+        'label': "Audio Only (Opus)",
+        'format': 'bestaudio[acodec=opus]/bestaudio',
+        'ext': 'opus',
+        'source_codec': 'opus',
+    },
+    'mp3': {
+        'label': "Audio Only (MP3)",
+        'format': 'bestaudio',
+        'ext': 'mp3',
+        'bitrate': 192,
+    },
+}
+
+
+class AudioConversionError(Exception):
+    pass
+
+
+def run_ffmpeg(args):
+    result = subprocess.run(
+        [get_capabilities().ffmpeg_path or 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *args],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg failed: {result.stderr.strip()[-500:]}")
+
+
+# Copy the audio stream into a new container without re-encoding
+def remux_audio(source_path, output_path):
+    run_ffmpeg(['-i', source_path, '-vn', '-map', '0:a:0', '-c:a', 'copy', output_path])
+
+
+def encode_mp3(source_path, output_path, bitrate=192):
+    run_ffmpeg(['-i', source_path, '-vn', '-map', '0:a:0', '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k', output_path])
+
+
+# Turn a downloaded audio source into the requested mode. Returns the path of
+# the file to deliver: the converted file, or for M4A and Opus the untouched
+# source when no remux is needed or FFmpeg isn't usable. MP3 can't fall back
+# to the source; AudioConversionError is raised instead, and the source stays
+# where it is, so a retry doesn't download it again.
+def finish_audio(source_path, mode, progress=None):
+    settings = AUDIO_MODES[mode]
+    base, source_ext = os.path.splitext(source_path)
+    source_ext = source_ext[1:].lower()
+
+    if source_ext == settings['ext']:
+        return source_path
+    capabilities = get_capabilities()
+    if not capabilities.ffmpeg_available:
+        if mode == 'mp3':
+            raise AudioConversionError("MP3 conversion needs FFmpeg, which is not installed")
+        return source_path
+    if mode == 'mp3' and capabilities.encoders and not capabilities.has_encoder('libmp3lame'):
+        raise AudioConversionError("This FFmpeg has no MP3 encoder (libmp3lame)")
+
+    output_path = f"{base}.{settings['ext']}"
+    try:
+        if mode == 'mp3':
+            if progress:
+                progress.message("Converting to MP3...")
+            # Long sources are encoded in segments on several cores; the
+            # rest takes one of the same encoding slots
+            with get_metrics().span('postprocessing', postprocessor='encode_mp3'):
+                if not encode_mp3_parallel(source_path, output_path, settings['bitrate'], progress):
+                    get_core_pool().run(lambda: encode_mp3(source_path, output_path, settings['bitrate']))
+        elif mode == 'opus' or (mode == 'm4a' and source_ext == 'mp4'):
+            # Opus in WebM -> .opus, or AAC in MP4 -> .m4a, as a stream copy
+            with get_metrics().span('postprocessing', postprocessor='remux_audio'):
+                get_core_pool().run(lambda: remux_audio(source_path, output_path))
+        else:
+            # The source isn't in a codec this container can hold as-is
+            return source_path
+    except Exception as e:
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        if mode == 'mp3':
+            raise AudioConversionError(f"MP3 conversion failed: {e}") from e
+        return source_path
+
+    os.remove(source_path)
+    return output_path
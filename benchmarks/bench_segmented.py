@@ -0,0 +1,88 @@
+# Measure single- vs multi-connection download speed against a local HTTP
+# server that throttles each connection, like YouTube's CDN does.
+#
+#   python -m benchmarks.bench_segmented --size-mb 64 --rate-mb 4 --connections 1,2,4,8
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.media_server import start_media_server, synthetic_bytes
+from segmented import download_segmented, probe_size, urllib_range_opener
+
+
+def expected_digest(size, block=4 * 1024 * 1024):
+    digest = hashlib.sha256()
+    for offset in range(0, size, block):
+        digest.update(synthetic_bytes(offset, min(block, size - offset)))
+    return digest.hexdigest()
+
+
+def file_digest(path, block=4 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(block):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmented downloads against a throttled local server")
+    parser.add_argument('--size-mb', type=float, default=64)
+    parser.add_argument('--rate-mb', type=float, default=4, help="per-connection limit in MB/s (0 = unlimited)")
+    parser.add_argument('--connections', default='1,2,4,8')
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    rate = args.rate_mb * 1024 * 1024 or None
+    chunk_size = int(args.chunk_mb * 1024 * 1024)
+    server, url = start_media_server(size, rate=rate)
+    expected = expected_digest(size)
+
+    results = []
+    try:
+        open_range = urllib_range_opener(url)
+        probed_size, supports_ranges = probe_size(open_range)
+        assert probed_size == size and supports_ranges, "media server must support ranges"
+
+        baseline = None
+        print(f"{'connections':>11}  {'seconds':>8}  {'MB/s':>8}  {'speedup':>7}")
+        for connections in [int(c) for c in args.connections.split(',')]:
+            with tempfile.TemporaryDirectory() as tmp:
+                dest = os.path.join(tmp, 'media.mp4')
+                started = time.perf_counter()
+                download_segmented(open_range, dest, size, connections=connections, chunk_size=chunk_size)
+                elapsed = time.perf_counter() - started
+                ok = file_digest(dest) == expected
+
+            throughput = size / elapsed / (1024 * 1024)
+            baseline = baseline or elapsed
+            results.append({
+                'connections': connections,
+                'chunk_size': chunk_size,
+                'seconds': elapsed,
+                'mb_per_s': throughput,
+                'speedup': baseline / elapsed,
+                'verified': ok,
+            })
+            print(f"{connections:>11}  {elapsed:>8.2f}  {throughput:>8.1f}  {baseline / elapsed:>6.2f}x"
+                  + ("" if ok else "  CHECKSUM MISMATCH"))
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'size': size, 'per_connection_rate': rate, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,629 @@
+# Offline benchmark suite for the whole pipeline: turning info dicts into
+# format options, size estimation, the metadata cache, downloads, playlist
+# ZIPs, file delivery and thumbnails. Nothing touches the network: info dicts are
+# synthetic or replayed from `yt-dlp -J` output, and media comes from a
+# local HTTP server. Each stage runs in its own process, so peak RSS is
+# per stage.
+#
+#   python -m benchmarks.bench_suite --json after.json --compare before.json
+#   python -m benchmarks.bench_suite --stages delivery_memory,delivery_stream --file-mb 256
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Keep the size model, metadata cache and artifacts of a real install out
+# of the measurements. Stage processes inherit this from the parent.
+if 'YTDL_DATA_DIR' not in os.environ:
+    os.environ['YTDL_DATA_DIR'] = tempfile.mkdtemp(prefix='ytdl-bench-')
+    os.environ['YTDL_BENCH_OWNS_DATA_DIR'] = '1'
+os.environ.setdefault('YTDL_CAPABILITY_REFRESH_INTERVAL', '0')
+
+from benchmarks.media_server import start_image_server, start_media_server, synthetic_bytes
+from benchmarks.synthetic import load_infos, make_flat_playlist, make_info
+
+MB = 1024 * 1024
+
+
+# Peak resident set size of this process so far, in MB
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+# Latency percentiles in ms, plus throughput over the summed latencies (or
+# over `wall_seconds` when the calls ran concurrently)
+def summarize(latencies, total_bytes=0, wall_seconds=None):
+    ordered = sorted(latencies)
+    elapsed = wall_seconds if wall_seconds is not None else sum(ordered)
+    summary = {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p90_ms': percentile(ordered, 90) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'ops_per_s': len(ordered) / elapsed if elapsed else None,
+    }
+    if total_bytes:
+        summary['bytes'] = total_bytes
+        summary['mb_per_s'] = total_bytes / MB / elapsed if elapsed else None
+    return summary
+
+
+# Call fn() `iterations` times after `warmup` untimed calls; throughput
+# is reported in MB/s when each call moves `bytes_per_call` bytes
+def measure(fn, iterations, warmup=1, bytes_per_call=0):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, bytes_per_call * iterations)
+
+
+def write_synthetic_file(path, size):
+    with open(path, 'wb') as f:
+        for offset in range(0, size, 4 * MB):
+            f.write(synthetic_bytes(offset, min(4 * MB, size - offset)))
+
+
+# Read a URL to the end in `chunk_size` pieces without keeping the body.
+# Returns (bytes, seconds to first byte).
+def drain(url, chunk_size=MB):
+    started = time.perf_counter()
+    first_byte = None
+    total = 0
+    with urllib.request.urlopen(url, timeout=60) as response:
+        while chunk := response.read(chunk_size):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            total += len(chunk)
+    return total, first_byte
+
+
+# ---------------------------------------------------------------------------
+# Stages. Each takes the params dict and returns {measurement: summary}.
+
+# Without FFmpeg, split pairs may only fill the tiers above the best
+# progressive format (720p in synthetic infos), never the gaps below it
+def check_split_tiers():
+    from formats import select_formats
+
+    info = make_info(seed=2)
+    formats, _ = select_formats(info, allow_merge=False, allow_split=True)
+    heights = {name: fmt['height'] for name, fmt in formats.items()}
+    split = sorted(fmt['height'] for fmt in formats.values() if fmt.get('needs_ffmpeg'))
+    progressive = sorted(fmt['height'] for fmt in formats.values() if not fmt.get('needs_ffmpeg'))
+    if not split or min(split) <= 720 or progressive != [360, 720]:
+        raise AssertionError(f"unexpected split tiers: {heights}")
+
+
+# info dict -> format options, what get_video_info does after extraction
+def stage_video_info(params):
+    from video_info import build_video_info
+
+    check_split_tiers()
+    results = {}
+    for count in params['format_counts']:
+        info = make_info(format_count=count, seed=count)
+        for ffmpeg_available in (False, True):
+            name = f"{count}_formats_{'merge' if ffmpeg_available else 'progressive'}"
+            results[name] = measure(lambda: build_video_info(info, ffmpeg_available), params['iterations'])
+
+    for path in params['infos']:
+        infos = load_infos(path)
+        if not infos:
+            continue
+        position = [0]
+
+        def replay():
+            info = infos[position[0] % len(infos)]
+            position[0] += 1
+            build_video_info(info, True)
+
+        results[f"recorded_{Path(path).stem}"] = measure(replay, max(params['iterations'], len(infos)))
+    return results
+
+
+def stage_estimate_size(params):
+    from formats import select_formats
+    from size_estimator import SizeEstimator
+
+    estimator = SizeEstimator(Path(os.environ['YTDL_DATA_DIR']) / 'bench_size_model.json')
+    info = make_info(format_count=max(params['format_counts']), seed=1)
+    formats, _ = select_formats(info, allow_merge=True)
+    choices = [(fmt['format_id'], fmt['height']) for fmt in formats.values()]
+
+    # Without sizes or bitrates every estimate has to come from the model
+    bare = dict(info, formats=[
+        {key: value for key, value in fmt.items() if key not in ('filesize', 'filesize_approx', 'tbr', 'vbr', 'abr')}
+        for fmt in info['formats']
+    ])
+
+    def estimate_all(target):
+        for format_id, height in choices:
+            estimator.estimate(target, format_id, height)
+        estimator.estimate(target, 'bestaudio', 0, audio_only=True)
+
+    results = {
+        'metadata': measure(lambda: estimate_all(info), params['iterations']),
+        'default_model': measure(lambda: estimate_all(bare), params['iterations']),
+    }
+
+    samples = [0]
+
+    def record():
+        samples[0] += 1
+        height = [144, 360, 720, 1080, 2160][samples[0] % 5]
+        estimator.record(height, 'vp9', 60 + samples[0] % 3600, height * 5000 * (60 + samples[0] % 3600),
+                         predicted=height * 4800 * 60, source='model')
+
+    # record() persists the model on every call, so this includes the JSON write
+    results['record'] = measure(record, params['iterations'] * 5)
+    results['trained_model'] = measure(lambda: estimate_all(bare), params['iterations'])
+    return results
+
+
+def stage_metadata_cache(params):
+    from metadata_cache import MetadataCache
+    from video_info import build_video_info
+
+    path = Path(os.environ['YTDL_DATA_DIR']) / 'bench_metadata.sqlite3'
+    value = build_video_info(make_info(format_count=max(params['format_counts'])), True)
+    keys = [f"bench{index:07d}:merge" for index in range(params['cache_entries'])]
+
+    cache = MetadataCache(path, ttl=3600, max_memory_entries=len(keys), max_disk_entries=len(keys) * 2)
+    position = [0]
+
+    def next_key():
+        key = keys[position[0] % len(keys)]
+        position[0] += 1
+        return key
+
+    results = {'set': measure(lambda: cache.set(next_key(), value), len(keys), warmup=0)}
+    results['memory_hit'] = measure(lambda: cache.get(next_key()), len(keys))
+
+    # A fresh instance with a one-entry memory layer has to go to SQLite every time
+    cold = MetadataCache(path, ttl=3600, max_memory_entries=1, max_disk_entries=len(keys) * 2)
+    results['disk_hit'] = measure(lambda: cold.get(next_key()), len(keys))
+    results['miss'] = measure(lambda: cold.get('missing:merge'), len(keys))
+    return results
+
+
+def stage_download(params):
+    from segmented import download_segmented, urllib_range_opener
+
+    size = int(params['file_mb'] * MB)
+    server, url = start_media_server(size, rate=params['rate_mb'] * MB or None)
+    work_dir = tempfile.mkdtemp(prefix='ytdl-bench-download-')
+    results = {}
+    try:
+        open_range = urllib_range_opener(url)
+        dest = os.path.join(work_dir, 'media.mp4')
+
+        def fetch(connections):
+            def run():
+                download_segmented(open_range, dest, size, connections=connections,
+                                   chunk_size=size if connections == 1 else int(params['chunk_mb'] * MB))
+                os.remove(dest)
+            return run
+
+        iterations = params['download_iterations']
+        results['single_connection'] = measure(fetch(1), iterations, bytes_per_call=size)
+        for connections in params['connections']:
+            if connections > 1:
+                results[f"segmented_{connections}"] = measure(fetch(connections), iterations, bytes_per_call=size)
+
+        # The same file through core.download_video, the path every job
+        # takes (yt-dlp's generic extractor picks up the local URL)
+        try:
+            import yt_dlp  # noqa: F401
+        except ImportError:
+            results['download_video'] = {'skipped': "yt-dlp is not installed"}
+        else:
+            from core import download_video
+
+            def via_download_video():
+                filename, path = download_video(url, 'best', 'bench', {'size': size})
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+            results['download_video'] = measure(via_download_video, iterations, bytes_per_call=size)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def stage_playlist(params):
+    from playlist import download_playlist, playlist_entries
+    from segmented import download_segmented, urllib_range_opener
+
+    results = {}
+
+    # Walking a long flat playlist, as the job does before downloading
+    long_playlist = make_flat_playlist(params['playlist_length'])
+    results[f"expand_{params['playlist_length']}_entries"] = measure(
+        lambda: sum(1 for _ in playlist_entries(long_playlist)), params['iterations'])
+
+    size = int(params['playlist_video_mb'] * MB)
+    count = params['playlist_videos']
+    server, url = start_media_server(size, rate=params['rate_mb'] * MB or None)
+    playlist = make_flat_playlist(count, url_for=lambda index: f"{url}?v={index}")
+
+    def expand(playlist_url):
+        return playlist['title'], playlist['playlist_count'], playlist_entries(playlist)
+
+    def download_entry(entry_url, progress):
+        temp_dir = tempfile.mkdtemp(prefix='ytdl-bench-entry-')
+        dest = os.path.join(temp_dir, 'video.mp4')
+
+        def on_progress(downloaded):
+            progress.hook({'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': size})
+
+        download_segmented(urllib_range_opener(entry_url), dest, size, connections=1, chunk_size=size,
+                           on_progress=on_progress)
+        progress.hook({'status': 'finished', 'downloaded_bytes': size, 'total_bytes': size})
+        return f"video {entry_url.rsplit('=', 1)[1]}.mp4", dest
+
+    def run():
+        filename, zip_path = download_playlist('bench://playlist', download_entry,
+                                               concurrency=params['playlist_concurrency'], retries=0,
+                                               progress_callback=lambda **update: None, expand=expand)
+        shutil.rmtree(os.path.dirname(zip_path), ignore_errors=True)
+
+    try:
+        results[f"zip_{count}_videos"] = measure(run, params['download_iterations'], warmup=0,
+                                                 bytes_per_call=size * count)
+    finally:
+        server.shutdown()
+    return results
+
+
+# The in-memory delivery path: the whole file is read before the browser
+# gets a byte
+def stage_delivery_memory(params):
+    size = int(params['file_mb'] * MB)
+    work_dir = tempfile.mkdtemp(prefix='ytdl-bench-delivery-')
+    try:
+        path = os.path.join(work_dir, 'media.mp4')
+        write_synthetic_file(path, size)
+
+        def read_into_memory():
+            with open(path, 'rb') as f:
+                f.read()
+
+        return {'read_into_memory': measure(read_into_memory, params['download_iterations'], bytes_per_call=size)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# The streaming delivery path: the delivery server sends the file to
+# clients reading it in chunks, one at a time and several at once
+def stage_delivery_stream(params):
+    from delivery import ArtifactStore, DeliveryHandler
+
+    size = int(params['file_mb'] * MB)
+    work_dir = tempfile.mkdtemp(prefix='ytdl-bench-delivery-')
+    store = ArtifactStore(session_disk_budget=1 << 62, eviction_policy='lru', ttl=3600)
+    handler = type('Handler', (DeliveryHandler,), {'store': store})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        path = os.path.join(work_dir, 'media.mp4')
+        write_synthetic_file(path, size)
+        token = store.register('bench', path, 'video/mp4')
+        host, port = server.server_address
+        url = f"http://{host}:{port}/files/{token}/media.mp4"
+
+        first_bytes = []
+
+        def stream():
+            first_bytes.append(drain(url)[1])
+
+        results = {'stream': measure(stream, params['download_iterations'], bytes_per_call=size)}
+        results['time_to_first_byte'] = summarize(first_bytes[1:] or first_bytes)
+
+        clients = params['delivery_clients']
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            started = time.perf_counter()
+            drain(url)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[f"stream_{clients}_clients"] = summarize(latencies, size * clients, time.perf_counter() - started)
+        return results
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# Info-panel thumbnails against a local image host that answers after
+# --thumbnail-delay-ms: first fetches, memory hits, concurrent sessions
+# asking for the same new video (one request upstream), expired entries
+# (served at once, then revalidated with a 304 in the background) and an
+# image that can't be fetched (placeholder, not retried right away)
+def stage_thumbnails(params):
+    from thumbnails import ThumbnailCache, placeholder
+
+    delay = params['thumbnail_delay_ms'] / 1000
+    server, base_url, served = start_image_server(placeholder(1280), delay=delay)
+    work_dir = tempfile.mkdtemp(prefix='ytdl-bench-thumbnails-')
+
+    def make_cache(ttl):
+        return ThumbnailCache(work_dir, width=320, ttl=ttl, max_memory_bytes=64 * MB, max_disk_bytes=64 * MB,
+                              timeout=5 + delay)
+
+    def wait_for(status, count):
+        deadline = time.monotonic() + 5 + delay
+        while served.get(status, 0) < count:
+            if time.monotonic() > deadline:
+                raise AssertionError(f"expected {count} served with status {status}, got {served}")
+            time.sleep(0.01)
+
+    try:
+        results = {}
+        cache = make_cache(ttl=3600)
+        videos = [0]
+
+        def first_fetch():
+            videos[0] += 1
+            cache.get(f"video{videos[0]}", f"{base_url}/vi/video{videos[0]}.png")
+
+        results['first_fetch'] = measure(first_fetch, params['download_iterations'], warmup=0)
+        results['memory_hit'] = measure(lambda: cache.get('video1', f"{base_url}/vi/video1.png"),
+                                        params['iterations'])
+
+        # Sessions opening the same new video at once
+        clients = params['thumbnail_clients']
+        before = served.get(200, 0)
+        barrier = threading.Barrier(clients)
+        latencies = []
+
+        def client():
+            barrier.wait()
+            started = time.perf_counter()
+            cache.get('shared', f"{base_url}/vi/shared.png")
+            latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[f"shared_{clients}_clients"] = summarize(latencies, wall_seconds=time.perf_counter() - started)
+        if served.get(200, 0) - before != 1:
+            raise AssertionError(f"{clients} sessions fetched one new thumbnail "
+                                 f"{served.get(200, 0) - before} times")
+
+        # Expired entries: the stored copy comes back without waiting for
+        # the host, and one conditional request brings it up to date
+        stale_cache = make_cache(ttl=0)
+        urls = [f"{base_url}/vi/video{index}.png" for index in range(1, videos[0] + 1)]
+        revalidated = served.get(304, 0)
+        results['stale_hit'] = measure(lambda: [stale_cache.get(f"video{index + 1}", url)
+                                                for index, url in enumerate(urls)], 1, warmup=0)
+        wait_for(304, revalidated + len(urls))
+        if results['stale_hit']['max_ms'] / len(urls) >= params['thumbnail_delay_ms'] > 0:
+            raise AssertionError("serving an expired thumbnail waited for the image host")
+
+        # An image that can't be fetched shows the placeholder, and the
+        # host isn't asked again until the retry delay has passed
+        results['missing'] = measure(lambda: cache.get('missing', f"{base_url}/missing.png"), 1, warmup=0)
+        if cache.get('missing', f"{base_url}/missing.png") != cache.placeholder or served.get(404) != 1:
+            raise AssertionError(f"missing image: expected the placeholder after one 404, got {served}")
+        return results
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+STAGES = {
+    'video_info': stage_video_info,
+    'estimate_size': stage_estimate_size,
+    'metadata_cache': stage_metadata_cache,
+    'download': stage_download,
+    'playlist': stage_playlist,
+    'delivery_memory': stage_delivery_memory,
+    'delivery_stream': stage_delivery_stream,
+    'thumbnails': stage_thumbnails,
+}
+
+
+def run_stage(name, params):
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    try:
+        measurements = STAGES[name](params)
+        error = None
+    except Exception as e:
+        measurements, error = {}, f"{type(e).__name__}: {e}"
+    return {
+        'seconds': time.perf_counter() - started,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+        'measurements': measurements,
+        'error': error,
+    }
+
+
+# Run a stage in a fresh interpreter so its peak RSS isn't inherited from
+# earlier stages
+def run_stage_isolated(name, params):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_stage, (name, params))
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def format_number(value, digits=1):
+    return '-' if value is None else f"{value:.{digits}f}"
+
+
+def print_stage(name, result):
+    print(f"\n{name}  ({result['seconds']:.1f} s, peak RSS {format_number(result['peak_rss_mb'])} MB,"
+          f" baseline {format_number(result['baseline_rss_mb'])} MB)")
+    if result['error']:
+        print(f"  FAILED: {result['error']}")
+    for measurement, summary in result['measurements'].items():
+        if 'skipped' in summary:
+            print(f"  {measurement:<32} skipped: {summary['skipped']}")
+            continue
+        throughput = (f"{format_number(summary['mb_per_s'])} MB/s" if 'mb_per_s' in summary
+                      else f"{format_number(summary['ops_per_s'])} ops/s")
+        print(f"  {measurement:<32} n={summary['count']:<5} p50 {format_number(summary['p50_ms'], 2):>9} ms"
+              f"  p90 {format_number(summary['p90_ms'], 2):>9} ms  p99 {format_number(summary['p99_ms'], 2):>9} ms"
+              f"  {throughput:>14}")
+
+
+def change(new, old):
+    if not new or not old:
+        return '-'
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+# Print how each measurement moved relative to an earlier run
+def print_comparison(report, baseline):
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('started_at', '?')}):")
+    for name, result in report['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if not old:
+            continue
+        print(f"  {name:<18} peak RSS {change(result['peak_rss_mb'], old.get('peak_rss_mb'))}")
+        for measurement, summary in result['measurements'].items():
+            old_summary = old.get('measurements', {}).get(measurement)
+            if not old_summary or 'skipped' in summary or 'skipped' in old_summary:
+                continue
+            rate_key = 'mb_per_s' if 'mb_per_s' in summary else 'ops_per_s'
+            print(f"    {measurement:<30} p50 {change(summary['p50_ms'], old_summary.get('p50_ms')):>8}"
+                  f"  p99 {change(summary['p99_ms'], old_summary.get('p99_ms')):>8}"
+                  f"  throughput {change(summary.get(rate_key), old_summary.get(rate_key)):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for metadata processing, downloads and delivery")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated subset of: " + ', '.join(STAGES))
+    parser.add_argument('--iterations', type=int, default=200, help="repetitions of the in-memory measurements")
+    parser.add_argument('--download-iterations', type=int, default=3, help="repetitions of downloads and delivery")
+    parser.add_argument('--format-counts', default='30,300,1000', help="sizes of the synthetic format lists")
+    parser.add_argument('--info', action='append', default=[], help="replay info dicts from `yt-dlp -J`/`-j` output")
+    parser.add_argument('--cache-entries', type=int, default=500)
+    parser.add_argument('--file-mb', type=float, default=64, help="size of downloaded and delivered files")
+    parser.add_argument('--rate-mb', type=float, default=0, help="per-connection server limit in MB/s (0 = unlimited)")
+    parser.add_argument('--connections', default='2,4,8')
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--playlist-length', type=int, default=5000, help="entries in the long flat playlist")
+    parser.add_argument('--playlist-videos', type=int, default=20, help="videos downloaded into the playlist ZIP")
+    parser.add_argument('--playlist-video-mb', type=float, default=2)
+    parser.add_argument('--playlist-concurrency', type=int, default=4)
+    parser.add_argument('--delivery-clients', type=int, default=8, help="concurrent clients for delivery")
+    parser.add_argument('--thumbnail-clients', type=int, default=16, help="sessions asking for one thumbnail at once")
+    parser.add_argument('--thumbnail-delay-ms', type=float, default=200, help="response delay of the image host")
+    parser.add_argument('--in-process', action='store_true', help="run stages in this process (peak RSS accumulates)")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="print changes relative to an earlier --json file")
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    params = {
+        'iterations': args.iterations,
+        'download_iterations': args.download_iterations,
+        'format_counts': [int(count) for count in args.format_counts.split(',')],
+        'infos': [str(Path(path).resolve()) for path in args.info],
+        'cache_entries': args.cache_entries,
+        'file_mb': args.file_mb,
+        'rate_mb': args.rate_mb,
+        'connections': [int(c) for c in args.connections.split(',')],
+        'chunk_mb': args.chunk_mb,
+        'playlist_length': args.playlist_length,
+        'playlist_videos': args.playlist_videos,
+        'playlist_video_mb': args.playlist_video_mb,
+        'playlist_concurrency': args.playlist_concurrency,
+        'delivery_clients': args.delivery_clients,
+        'thumbnail_clients': args.thumbnail_clients,
+        'thumbnail_delay_ms': args.thumbnail_delay_ms,
+    }
+
+    report = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'stages': {},
+    }
+
+    try:
+        for name in stages:
+            result = run_stage(name, params) if args.in_process else run_stage_isolated(name, params)
+            report['stages'][name] = result
+            print_stage(name, result)
+    finally:
+        if os.environ.get('YTDL_BENCH_OWNS_DATA_DIR'):
+            shutil.rmtree(os.environ['YTDL_DATA_DIR'], ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Check the thumbnail cache's behaviour against a local image server:
+# first fetches, one upstream request for concurrent sessions, expired
+# copies served at once and revalidated with a 304 in the background, the
+# placeholder for images that can't be fetched, and damaged disk entries.
+# Exits with status 1 if any check fails.
+#
+#   python -m benchmarks.check_thumbnails
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.media_server import start_image_server
+from thumbnails import ThumbnailCache, placeholder
+
+MB = 1024 * 1024
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+# Wait until the server has answered `count` requests with `status`
+def wait_for(served, status, count, timeout):
+    deadline = time.monotonic() + timeout
+    while served.get(status, 0) < count:
+        if time.monotonic() > deadline:
+            raise CheckFailed(f"expected {count} responses with status {status}, got {served}")
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the thumbnail cache against a local image server")
+    parser.add_argument('--delay-ms', type=float, default=200, help="response delay of the image host")
+    parser.add_argument('--clients', type=int, default=16, help="sessions asking for one thumbnail at once")
+    args = parser.parse_args()
+
+    delay = args.delay_ms / 1000
+    image = placeholder(1280)
+    server, base_url, served = start_image_server(image, delay=delay)
+    directory = tempfile.mkdtemp(prefix='ytdl-check-thumbnails-')
+
+    def make_cache(ttl):
+        return ThumbnailCache(directory, width=320, ttl=ttl, max_memory_bytes=16 * MB, max_disk_bytes=16 * MB,
+                              timeout=5 + delay)
+
+    cache = make_cache(ttl=3600)
+
+    def first_fetch():
+        data, mime = cache.get('video1', f"{base_url}/vi/video1.png")
+        expect(served.get(200) == 1, f"one 200 expected, got {served}")
+        expect(data and mime and (data, mime) != cache.placeholder, "the image itself expected")
+        cache.get('video1', f"{base_url}/vi/video1.png")
+        expect(served.get(200) == 1, f"a fresh entry must not be fetched again, got {served}")
+
+    def shared_fetch():
+        before = served.get(200, 0)
+        barrier = threading.Barrier(args.clients)
+        results = []
+
+        def client():
+            barrier.wait()
+            results.append(cache.get('shared', f"{base_url}/vi/shared.png"))
+
+        threads = [threading.Thread(target=client) for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expect(served.get(200, 0) - before == 1,
+               f"{args.clients} sessions fetched one new thumbnail {served.get(200, 0) - before} times")
+        expect(len(set(results)) == 1 and results[0] != cache.placeholder, "every session must get the image")
+
+    def stale_while_revalidate():
+        stale = make_cache(ttl=0)  # the same directory: every entry is expired
+        expected = cache.get('video1', f"{base_url}/vi/video1.png")
+        fetched_at = json.loads((Path(directory) / f"{stale.key('video1', None)}.json").read_text())['fetched_at']
+        before = served.get(304, 0)
+
+        started = time.monotonic()
+        result = stale.get('video1', f"{base_url}/vi/video1.png")
+        elapsed = time.monotonic() - started
+        expect(result == expected, "the expired copy must be served")
+        expect(elapsed < delay / 2, f"serving the expired copy waited {elapsed * 1000:.0f} ms for the host")
+
+        wait_for(served, 304, before + 1, 5 + delay)
+        deadline = time.monotonic() + 5
+        while json.loads((Path(directory) / f"{stale.key('video1', None)}.json").read_text())['fetched_at'] \
+                == fetched_at:
+            expect(time.monotonic() < deadline, "a 304 must renew the stored copy")
+            time.sleep(0.01)
+        expect(served.get(200) == 2, f"revalidation must not download the image again, got {served}")
+
+    def missing_image():
+        result = cache.get('missing', f"{base_url}/missing.png")
+        expect(result == cache.placeholder, "the placeholder expected for a 404")
+        expect(cache.get('missing', f"{base_url}/missing.png") == cache.placeholder, "the placeholder again")
+        expect(served.get(404) == 1, f"a failed image must not be retried right away, got {served}")
+
+    def damaged_sidecar():
+        for index, meta in enumerate(([], {'url': f"{base_url}/vi/damaged.png"}, {'url': None, 'mime': 1,
+                                                                                  'fetched_at': None})):
+            video_id = f"damaged{index}"
+            key = cache.key(video_id, None)
+            (Path(directory) / f"{key}.json").write_text(json.dumps(meta))
+            (Path(directory) / f"{key}.img").write_bytes(b'not an image')
+            fresh = make_cache(ttl=3600)
+            before = served.get(200, 0)
+            result = fresh.get(video_id, f"{base_url}/vi/{video_id}.png")
+            expect(result != cache.placeholder and served.get(200, 0) == before + 1,
+                   f"a damaged entry ({meta!r}) must be fetched again")
+
+    checks = [
+        ("first fetch", first_fetch),
+        ("shared fetch", shared_fetch),
+        ("stale while revalidate", stale_while_revalidate),
+        ("missing image", missing_image),
+        ("damaged sidecar", damaged_sidecar),
+    ]
+    failed = 0
+    try:
+        for name, check in checks:
+            try:
+                check()
+                print(f"ok      {name}")
+            except Exception as e:
+                failed += 1
+                print(f"FAILED  {name}: {type(e).__name__}: {e}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
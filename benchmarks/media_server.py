@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Synthetic media is a repeating 251-byte pattern, so any range can be
+# generated (and verified) without keeping the file in memory
+PATTERN = bytes(range(251)) * 1024
+RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+def synthetic_bytes(offset, length):
+    start = offset % 251
+    out = bytearray()
+    while len(out) < length:
+        piece = PATTERN[start:start + length - len(out)]
+        out += piece
+        start = 0
+    return bytes(out)
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    size = 0
+    rate = None  # bytes per second per connection, None for unlimited
+    write_size = 64 * 1024
+    content_type = 'video/mp4'
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        start, end = 0, self.size - 1
+        match = RANGE_RE.match(self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else self.size - 1, self.size - 1)
+            if start >= self.size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{self.size}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{self.size}')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', self.content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        # Throttle each connection separately, like a CDN limiting per-connection speed
+        offset = start
+        began = time.monotonic()
+        sent = 0
+        try:
+            while offset <= end:
+                length = min(self.write_size, end - offset + 1)
+                self.wfile.write(synthetic_bytes(offset, length))
+                offset += length
+                sent += length
+                if self.rate:
+                    ahead = sent / self.rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve `size` bytes of synthetic media on 127.0.0.1 in a background thread.
+# Returns (server, url); call server.shutdown() when done.
+def start_media_server(size, rate=None, content_type='video/mp4'):
+    handler = type('Handler', (MediaHandler,), {'size': size, 'rate': rate, 'content_type': content_type})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/media.mp4"
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    image = b''
+    etag = '"bench-image"'
+    delay = 0.0     # seconds before each response, like a slow image host
+    served = None   # status -> count, shared by the server's threads
+    lock = None
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.path.startswith('/missing'):
+            status = 404
+        elif self.headers.get('If-None-Match') == self.etag:
+            status = 304
+        else:
+            status = 200
+        with self.lock:
+            self.served[status] = self.served.get(status, 0) + 1
+
+        self.send_response(status)
+        if status == 200:
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(self.image)))
+            self.send_header('ETag', self.etag)
+        else:
+            self.send_header('Content-Length', '0')
+            if status == 304:
+                self.send_header('ETag', self.etag)
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(self.image)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve `image` as a PNG with an ETag on 127.0.0.1 (any path; /missing...
+# answers 404) in a background thread. Returns (server, base url, served),
+# served counting the answers by status code; call server.shutdown() when
+# done.
+def start_image_server(image, delay=0.0):
+    served = {}
+    handler = type('Handler', (ImageHandler,), {
+        'image': image, 'delay': delay, 'served': served, 'lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}", served
@@ -0,0 +1,101 @@
+# Synthetic yt-dlp info dicts shaped like YouTube's, for benchmarking
+# without the network. Real responses recorded with `yt-dlp -J URL` can be
+# replayed instead with load_infos().
+
+import json
+import random
+
+HEIGHTS = [144, 240, 360, 480, 720, 1080, 1440, 2160, 4320]
+VIDEO_CODECS = [('avc1.640028', 'mp4'), ('vp09.00.40.08', 'webm'), ('av01.0.08M.08', 'mp4')]
+AUDIO_CODECS = [('mp4a.40.2', 'm4a', 129), ('mp4a.40.5', 'm4a', 48), ('opus', 'webm', 135), ('opus', 'webm', 70)]
+PROTOCOLS = ['https', 'm3u8_native', 'http_dash_segments']
+
+# Rough YouTube bitrates in kbit/s per height for 30 fps H.264
+BASE_KBPS = {144: 100, 240: 250, 360: 500, 480: 1000, 720: 2500, 1080: 4500, 1440: 9000, 2160: 18000, 4320: 40000}
+
+
+# A single video's info dict with about `format_count` formats. YouTube
+# lists every rendition once per protocol and language, which is how real
+# responses reach hundreds of formats; `missing_sizes` is the fraction of
+# formats without filesize, like live and HLS-only videos.
+def make_info(video_id='bench0000001', format_count=60, duration=600, missing_sizes=0.2, seed=0):
+    rng = random.Random(seed)
+    formats = []
+
+    def add(fmt):
+        fmt['format_id'] = f"{len(formats) + 100}"
+        if rng.random() >= missing_sizes and fmt.get('tbr'):
+            fmt['filesize'] = int(fmt['tbr'] * 1000 / 8 * duration * rng.uniform(0.9, 1.1))
+        formats.append(fmt)
+
+    # Storyboards come first in real responses and have neither stream
+    add({'ext': 'mhtml', 'vcodec': 'none', 'acodec': 'none', 'protocol': 'mhtml', 'format_note': 'storyboard'})
+
+    while len(formats) < format_count:
+        protocol = rng.choice(PROTOCOLS)
+        language = rng.choice(['en', 'de', 'ja', None])
+
+        acodec, aext, abr = rng.choice(AUDIO_CODECS)
+        add({'ext': aext, 'vcodec': 'none', 'acodec': acodec, 'abr': abr, 'tbr': abr,
+             'protocol': protocol, 'language': language})
+
+        for height in HEIGHTS:
+            if len(formats) >= format_count:
+                break
+            vcodec, vext = rng.choice(VIDEO_CODECS)
+            fps = rng.choice([30, 30, 60])
+            kbps = BASE_KBPS[height] * (1.5 if fps == 60 else 1.0) * (0.7 if vcodec[:4] in ('vp09', 'av01') else 1.0)
+            add({'ext': vext, 'vcodec': vcodec, 'acodec': 'none', 'height': height, 'width': height * 16 // 9,
+                 'fps': fps, 'vbr': kbps, 'tbr': kbps, 'protocol': protocol})
+
+        # The classic progressive formats
+        for height, kbps in ((360, 600), (720, 2600)):
+            if len(formats) < format_count:
+                add({'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': height,
+                     'width': height * 16 // 9, 'fps': 30, 'tbr': kbps, 'protocol': 'https'})
+
+    return {
+        'id': video_id,
+        'title': f"Benchmark video {video_id}",
+        'uploader': 'Benchmark channel',
+        'duration': duration,
+        'view_count': rng.randint(0, 10 ** 7),
+        'thumbnail': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'formats': formats,
+    }
+
+
+# A flat playlist (what extract_flat returns): entries carry only a URL and title
+def make_flat_playlist(count, url_for=None, playlist_id='PLbench'):
+    url_for = url_for or (lambda index: f"https://www.youtube.com/watch?v=bench{index:07d}")
+    return {
+        '_type': 'playlist',
+        'id': playlist_id,
+        'title': f"Benchmark playlist ({count} videos)",
+        'playlist_count': count,
+        'entries': [
+            {'_type': 'url', 'url': url_for(index), 'title': f"Video {index}"}
+            for index in range(1, count + 1)
+        ],
+    }
+
+
+# Info dicts from a file written by `yt-dlp -J` (one JSON document) or
+# `yt-dlp -j` (one per line). Playlists with full entries are flattened
+# into their videos.
+def load_infos(path):
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    try:
+        documents = [json.loads(text)]
+    except json.JSONDecodeError:
+        documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    infos = []
+    for document in documents:
+        if document.get('_type') == 'playlist':
+            infos.extend(entry for entry in document.get('entries') or [] if entry and entry.get('formats'))
+        else:
+            infos.append(document)
+    return infos
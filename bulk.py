@@ -0,0 +1,94 @@
+import contextvars
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config
+from url_utils import canonical_video_url, extract_video_id, is_playlist_url
+
+SEPARATOR_RE = re.compile(r'[\s,;]+')
+
+
+# URLs (or bare video IDs) from a pasted list or an uploaded text/CSV file,
+# in the order given. Anything else, like CSV headers, is ignored.
+def parse_url_list(text):
+    urls = []
+    for token in SEPARATOR_RE.split(text or ''):
+        token = token.strip('"\'<>()[]')
+        if token.startswith(('http://', 'https://')) or extract_video_id(token):
+            urls.append(token)
+    return urls
+
+
+# Collapse URLs that point at the same video (watch, youtu.be, shorts,
+# embed, bare ID) into one canonical URL. Playlists and other links are
+# only deduplicated by exact match. Returns [(url, [given forms])] in
+# first-seen order.
+def dedupe_urls(urls):
+    groups = {}
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        video_id = None if is_playlist_url(url) else extract_video_id(url)
+        key = video_id or url
+        if key not in groups:
+            groups[key] = (canonical_video_url(video_id) if video_id else url, [])
+        groups[key][1].append(url)
+    return list(groups.values())
+
+
+# One result row per unique URL; fetch_rows fills them in
+def make_rows(groups):
+    return [
+        {'url': url, 'given': given, 'status': 'queued', 'info': None, 'error': None}
+        for url, given in groups
+    ]
+
+
+# Fetch metadata for every row with at most `concurrency` requests in
+# flight. Rows are updated in place as each result arrives, so a reader
+# holding the same list sees them fill in. progress_callback is also called
+# without arguments while waiting; when it raises (the job was cancelled)
+# the rows not started yet are dropped and stay 'queued'.
+def fetch_rows(rows, fetch_info, concurrency, progress_callback=None):
+    cancelled = threading.Event()
+
+    def fetch(row):
+        if cancelled.is_set():
+            return
+        row['status'] = 'fetching'
+        try:
+            info = fetch_info(row['url'])
+        except Exception as e:
+            row.update(status='error', error=str(e))
+        else:
+            row.update(status='done', info=info)
+
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="bulk-info")
+    try:
+        pending = {pool.submit(contextvars.copy_context().run, fetch, row) for row in rows}
+        while pending:
+            finished, pending = wait(pending, timeout=config.JOB_POLL_INTERVAL)
+            for future in finished:
+                future.result()
+            done += len(finished)
+            if not progress_callback:
+                continue
+            if not finished:
+                progress_callback()
+                continue
+            failed = sum(1 for row in rows if row['status'] == 'error')
+            text = f"Fetched {done} of {len(rows)} videos"
+            if failed:
+                text += f" ({failed} failed)"
+            progress_callback(progress=done / max(len(rows), 1), text=text)
+    except BaseException:
+        # Don't wait for the queue: drop what hasn't started, and let the
+        # fetches already running finish on their own
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return rows
@@ -0,0 +1,109 @@
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+import config
+
+VERSION_RE = re.compile(r'version\s+(\S+)')
+ENCODER_RE = re.compile(r'^\s*[VAS][F.][S.][X.][B.][D.]\s+(\S+)', re.MULTILINE)
+
+
+# What the host can do: FFmpeg/ffprobe presence, versions and encoders
+class Capabilities:
+    def __init__(self, ffmpeg_path=None, ffmpeg_version=None, ffprobe_path=None, ffprobe_version=None,
+                 encoders=None, probed_at=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffmpeg_version = ffmpeg_version
+        self.ffprobe_path = ffprobe_path
+        self.ffprobe_version = ffprobe_version
+        self.encoders = encoders or frozenset()
+        self.probed_at = probed_at or time.time()
+
+    @property
+    def ffmpeg_available(self):
+        return self.ffmpeg_path is not None
+
+    @property
+    def ffprobe_available(self):
+        return self.ffprobe_path is not None
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def as_dict(self):
+        return {
+            'ffmpeg': self.ffmpeg_path,
+            'ffmpeg_version': self.ffmpeg_version,
+            'ffprobe': self.ffprobe_path,
+            'ffprobe_version': self.ffprobe_version,
+            'encoders': len(self.encoders),
+            'probed_at': self.probed_at,
+        }
+
+
+def _run(args):
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=10)
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _probe_tool(name):
+    path = shutil.which(name)
+    if path is None:
+        return None, None
+    output = _run([path, '-version'])
+    if output is None:
+        return None, None
+    match = VERSION_RE.search(output.splitlines()[0] if output else '')
+    return path, match.group(1) if match else 'unknown'
+
+
+def probe_capabilities():
+    ffmpeg_path, ffmpeg_version = _probe_tool('ffmpeg')
+    ffprobe_path, ffprobe_version = _probe_tool('ffprobe')
+
+    encoders = frozenset()
+    if ffmpeg_path:
+        output = _run([ffmpeg_path, '-hide_banner', '-encoders']) or ''
+        encoders = frozenset(ENCODER_RE.findall(output))
+
+    return Capabilities(ffmpeg_path, ffmpeg_version, ffprobe_path, ffprobe_version, encoders)
+
+
+_capabilities = None
+_lock = threading.Lock()
+_refresher = None
+
+
+def _refresh_forever(interval):
+    global _capabilities
+    while True:
+        time.sleep(interval)
+        try:
+            capabilities = probe_capabilities()
+        except Exception:
+            continue
+        with _lock:
+            _capabilities = capabilities
+
+
+# Capabilities probed once per process and refreshed in the background, so
+# sessions never shell out to FFmpeg themselves
+def get_capabilities():
+    global _capabilities, _refresher
+    with _lock:
+        if _capabilities is None:
+            _capabilities = probe_capabilities()
+        if _refresher is None and config.CAPABILITY_REFRESH_INTERVAL > 0:
+            _refresher = threading.Thread(
+                target=_refresh_forever,
+                args=(config.CAPABILITY_REFRESH_INTERVAL,),
+                name="capability-refresh",
+                daemon=True,
+            )
+            _refresher.start()
+        return _capabilities
@@ -0,0 +1,162 @@
+# Batch command line over the same download core as the Streamlit app.
+#
+#   python cli.py info URL [URL ...] [--json]
+#   python cli.py download URL [URL ...] [-f urls.txt] [-q 720p] [-o downloads/] [--whole-playlist]
+#                          [--start 1:30] [--end 2:00]
+#
+# Downloads run on the shared job workers (YTDL_JOB_WORKERS at a time);
+# progress goes to stderr and the saved file paths to stdout.
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+import config
+from bulk import dedupe_urls, fetch_rows, make_rows, parse_url_list
+from clips import parse_clip
+from core import format_size, get_video_info, job_download_filename, pick_format, submit_download
+from delivery import get_artifact_store
+from jobs import DONE, get_job_registry
+
+
+# URLs from the command line and from --file ("-" reads stdin), with
+# different links to the same video collapsed into one
+def collect_urls(args):
+    urls = list(args.urls)
+    for path in args.file or []:
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        with f:
+            urls.extend(parse_url_list(f.read()))
+    return [url for url, _ in dedupe_urls(urls)]
+
+
+# Fetch info for every URL, BULK_CONCURRENCY at a time.
+# Returns [(url, info or None, error)].
+def fetch_all(urls):
+    rows = fetch_rows(make_rows([(url, [url]) for url in urls]), get_video_info, config.BULK_CONCURRENCY)
+    return [(row['url'], row['info'], row['error']) for row in rows]
+
+
+def command_info(args):
+    results = fetch_all(collect_urls(args))
+    if args.json:
+        json.dump([{'url': url, 'info': info, 'error': error} for url, info, error in results], sys.stdout, indent=2)
+        print()
+    else:
+        for url, info, error in results:
+            if error:
+                print(f"{url}\n  {error}\n")
+                continue
+            print(f"{info['title']} ({info['channel']}, {info['duration']} s)\n  {url}")
+            for label, fmt in info['formats'].items():
+                print(f"  {label:<22} {fmt['ext']:<5} {format_size(fmt['size'])}")
+            print()
+    return 1 if any(error for _, _, error in results) else 0
+
+
+# Copy a finished job's file into `output_dir` without overwriting
+# anything there, then free it on the server side
+def save_result(job, output_dir):
+    store = get_artifact_store()
+    artifact = store.acquire(job.result['token'])
+    if artifact is None:
+        raise Exception("The downloaded file expired before it could be saved")
+    try:
+        base, ext = os.path.splitext(job_download_filename(job))
+        target = os.path.join(output_dir, base + ext)
+        counter = 1
+        while os.path.exists(target):
+            counter += 1
+            target = os.path.join(output_dir, f"{base} ({counter}){ext}")
+        artifact.save(target)
+    finally:
+        store.release(artifact)
+    store.discard(job.result['token'])
+    return target
+
+
+def command_download(args):
+    urls = collect_urls(args)
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    session_id = f"cli-{uuid.uuid4().hex}"
+    registry = get_job_registry()
+
+    failures = 0
+    jobs = {}  # job ID -> URL
+    for url, info, error in fetch_all(urls):
+        if error:
+            print(f"FAILED {url}: {error}", file=sys.stderr)
+            failures += 1
+            continue
+        try:
+            quality, _ = pick_format(info, args.quality)
+            clip = parse_clip(args.start, args.end, info['duration']) if args.start or args.end else None
+            job_id = submit_download(url, info, quality, session_id, whole_playlist=args.whole_playlist, clip=clip)
+        except ValueError as e:
+            print(f"FAILED {url}: {e}", file=sys.stderr)
+            failures += 1
+            continue
+        jobs[job_id] = url
+        print(f"Queued {info['title']} [{quality}]", file=sys.stderr)
+
+    last_status = {}
+    while jobs:
+        for job_id, url in list(jobs.items()):
+            job = registry.get(job_id)
+            status = f"{job.progress * 100:3.0f}% {job.status_text}"
+            if not args.quiet and last_status.get(job_id) != status and not job.finished:
+                print(f"[{job.meta['title'][:40]}] {status}", file=sys.stderr)
+                last_status[job_id] = status
+            if not job.finished:
+                continue
+
+            del jobs[job_id]
+            if job.state == DONE:
+                try:
+                    print(save_result(job, args.output))
+                except Exception as e:
+                    print(f"FAILED {url}: {e}", file=sys.stderr)
+                    failures += 1
+            else:
+                print(f"FAILED {url}: {job.error}", file=sys.stderr)
+                failures += 1
+        if jobs:
+            time.sleep(config.JOB_POLL_INTERVAL)
+
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download YouTube videos without the web UI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    info = commands.add_parser('info', help="show the available formats")
+    info.add_argument('urls', nargs='*')
+    info.add_argument('-f', '--file', action='append', help="read URLs from a file, one per line (- for stdin)")
+    info.add_argument('--json', action='store_true', help="print the full video info as JSON")
+    info.set_defaults(run=command_info)
+
+    download = commands.add_parser('download', help="download one or more videos")
+    download.add_argument('urls', nargs='*')
+    download.add_argument('-f', '--file', action='append', help="read URLs from a file, one per line (- for stdin)")
+    download.add_argument('-q', '--quality', default='best',
+                          help="a label from `info`, a height like 720p, an audio mode (m4a, opus, mp3, audio) or best")
+    download.add_argument('-o', '--output', default='.', help="directory to save the files in")
+    download.add_argument('--whole-playlist', action='store_true', help="download every video of playlist URLs as a ZIP")
+    download.add_argument('--start', help="download only from this time on (h:mm:ss, m:ss or seconds; needs FFmpeg)")
+    download.add_argument('--end', help="download only up to this time")
+    download.add_argument('--quiet', action='store_true', help="don't print progress")
+    download.set_defaults(run=command_download)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Clip mode: download only a time range of a video. yt-dlp hands ranges to
+# FFmpeg, which seeks with HTTP Range requests (or picks the covering
+# fragments of DASH/HLS formats) and cuts with stream copy, so the bytes
+# transferred and the time taken follow the length of the clip rather than
+# the video. Without re-encoding the cut lands on the keyframe at or before
+# the start, so a clip may begin up to a few seconds early.
+
+
+# Seconds from "90", "1:30", "1:02:03" or "1:02:03.5"; raises ValueError
+def parse_timestamp(text):
+    parts = text.strip().split(':')
+    if not 1 <= len(parts) <= 3 or not all(parts):
+        raise ValueError(f"Not a timestamp: {text!r} (use h:mm:ss, m:ss or seconds)")
+    seconds = 0.0
+    for position, part in enumerate(parts):
+        try:
+            value = float(part) if position == len(parts) - 1 else int(part)
+        except ValueError:
+            raise ValueError(f"Not a timestamp: {text!r} (use h:mm:ss, m:ss or seconds)")
+        if value < 0 or (position and value >= 60):
+            raise ValueError(f"Not a timestamp: {text!r} (use h:mm:ss, m:ss or seconds)")
+        seconds = seconds * 60 + value
+    return seconds
+
+
+# "1:02:03" / "2:03", with tenths when the time has them
+def format_timestamp(seconds):
+    # Round first, so 59.96 becomes 1:00 rather than 0:59
+    whole, tenths = divmod(int(round(seconds * 10)), 10)
+    text = f"{whole // 3600}:{whole % 3600 // 60:02d}:{whole % 60:02d}" if whole >= 3600 else f"{whole // 60}:{whole % 60:02d}"
+    return f"{text}.{tenths}" if tenths else text
+
+
+# Validate a start/end pair against the video length; returns the clip as
+# (start, end) in seconds, or None for the whole video. An empty end means
+# "until the end". Raises ValueError.
+def parse_clip(start_text, end_text, duration=None):
+    start = parse_timestamp(start_text) if start_text and start_text.strip() else 0.0
+    end = parse_timestamp(end_text) if end_text and end_text.strip() else duration
+    if end is None:
+        raise ValueError("Enter an end time")
+    if duration:
+        if start >= duration:
+            raise ValueError(f"The video is only {format_timestamp(duration)} long")
+        end = min(end, duration)
+    if end <= start:
+        raise ValueError("The end must come after the start")
+    if start == 0 and duration and end >= duration:
+        return None
+    return (start, end)
+
+
+# "1:30-2:00"
+def clip_label(clip):
+    return f"{format_timestamp(clip[0])}-{format_timestamp(clip[1])}"
+
+
+# Estimated size of a clip from the estimate for the whole video
+def clip_size(size, duration, clip):
+    if not size or not clip or not duration:
+        return size
+    return int(size * min((clip[1] - clip[0]) / duration, 1.0))
+
+
+# yt-dlp options that download only the clip
+def clip_options(clip):
+    from yt_dlp.utils import download_range_func
+
+    return {
+        'download_ranges': download_range_func(None, [clip]),
+        # Stream copy: no re-encoding, the cut snaps to keyframes
+        'force_keyframes_at_cuts': False,
+    }
@@ -0,0 +1,154 @@
+import os
+from pathlib import Path
+
+# Shared settings for the downloader. Every value can be overridden with an
+# environment variable so deployments don't need code changes.
+
+# Root directory for everything the app keeps on disk between restarts
+DATA_DIR = Path(os.environ.get("YTDL_DATA_DIR", Path.home() / ".cache" / "youtube-video-downloader"))
+
+# Video metadata cache (see metadata_cache.py)
+METADATA_CACHE_PATH = Path(os.environ.get("YTDL_METADATA_CACHE_PATH", DATA_DIR / "metadata.sqlite3"))
+METADATA_CACHE_TTL = float(os.environ.get("YTDL_METADATA_CACHE_TTL", 6 * 60 * 60))  # seconds
+METADATA_CACHE_MEMORY_ENTRIES = int(os.environ.get("YTDL_METADATA_CACHE_MEMORY_ENTRIES", 512))
+METADATA_CACHE_DISK_ENTRIES = int(os.environ.get("YTDL_METADATA_CACHE_DISK_ENTRIES", 20000))
+
+# Thumbnails in the info panel (see thumbnails.py): scaled to THUMBNAIL_WIDTH
+# pixels (twice the 180 shown, for high-DPI screens) and cached in memory
+# and on disk, revalidated after THUMBNAIL_CACHE_TTL seconds
+THUMBNAIL_CACHE_DIR = Path(os.environ.get("YTDL_THUMBNAIL_CACHE_DIR", DATA_DIR / "thumbnails"))
+THUMBNAIL_WIDTH = int(os.environ.get("YTDL_THUMBNAIL_WIDTH", 360))
+THUMBNAIL_CACHE_TTL = float(os.environ.get("YTDL_THUMBNAIL_CACHE_TTL", 24 * 60 * 60))
+THUMBNAIL_CACHE_MEMORY_BYTES = int(os.environ.get("YTDL_THUMBNAIL_CACHE_MEMORY_BYTES", 16 * 1024 ** 2))
+THUMBNAIL_CACHE_DISK_BYTES = int(os.environ.get("YTDL_THUMBNAIL_CACHE_DISK_BYTES", 256 * 1024 ** 2))
+THUMBNAIL_FETCH_TIMEOUT = float(os.environ.get("YTDL_THUMBNAIL_FETCH_TIMEOUT", 5))
+
+# Delivery of finished downloads (see delivery.py).
+# "stream" keeps files on disk and serves them from a small HTTP server with
+# Range support; "memory" reads the whole file into the session like before.
+# Streaming needs DELIVERY_PUBLIC_URL, the base URL the browser uses to reach
+# the delivery server (e.g. a path on the app's own origin that a reverse
+# proxy forwards to DELIVERY_HOST:DELIVERY_PORT); without it the browser may
+# not be able to reach the server at all, so "memory" is the default, and
+# files over DELIVERY_SESSION_MEMORY_BUDGET can't be delivered. The server
+# only listens on this host unless DELIVERY_HOST says otherwise.
+DELIVERY_HOST = os.environ.get("YTDL_DELIVERY_HOST", "127.0.0.1")
+DELIVERY_PORT = int(os.environ.get("YTDL_DELIVERY_PORT", 8502))
+DELIVERY_PUBLIC_URL = os.environ.get("YTDL_DELIVERY_PUBLIC_URL", "")
+DELIVERY_MODE = os.environ.get("YTDL_DELIVERY_MODE", "stream" if DELIVERY_PUBLIC_URL else "memory")
+DELIVERY_CHUNK_SIZE = int(os.environ.get("YTDL_DELIVERY_CHUNK_SIZE", 1024 * 1024))
+# Per-session budgets: disk held by finished artifacts, and the largest file
+# that "memory" mode may load; bigger ones are streamed if there is a
+# DELIVERY_PUBLIC_URL and refused otherwise
+DELIVERY_SESSION_DISK_BUDGET = int(os.environ.get("YTDL_DELIVERY_SESSION_DISK_BUDGET", 8 * 1024 ** 3))
+DELIVERY_SESSION_MEMORY_BUDGET = int(os.environ.get("YTDL_DELIVERY_SESSION_MEMORY_BUDGET", 200 * 1024 ** 2))
+# Which finished artifact goes first when a session is over budget:
+# "lru" (least recently served) or "fifo" (oldest finished)
+DELIVERY_EVICTION_POLICY = os.environ.get("YTDL_DELIVERY_EVICTION_POLICY", "lru")
+# Artifacts nobody has touched for this long are removed (seconds)
+DELIVERY_ARTIFACT_TTL = float(os.environ.get("YTDL_DELIVERY_ARTIFACT_TTL", 60 * 60))
+
+# Background download jobs (see jobs.py)
+JOB_WORKERS = int(os.environ.get("YTDL_JOB_WORKERS", 4))
+# How long finished jobs stay visible to the UI (seconds)
+JOB_RETENTION = float(os.environ.get("YTDL_JOB_RETENTION", 60 * 60))
+# How often the UI polls a running job (seconds)
+JOB_POLL_INTERVAL = float(os.environ.get("YTDL_JOB_POLL_INTERVAL", 1.0))
+
+# Scheduling of background jobs (see scheduler.py). JOB_WORKERS caps how
+# many run at once; SCHEDULER_SESSION_MAX_JOBS caps one session (0 = no
+# cap). A download only starts if its estimated size fits on the work
+# directory's disk next to the running ones, keeping SCHEDULER_DISK_RESERVE
+# bytes free. Bandwidth limits are in bytes per second (0 = unlimited).
+SCHEDULER_SESSION_MAX_JOBS = int(os.environ.get("YTDL_SCHEDULER_SESSION_MAX_JOBS", 0))
+SCHEDULER_DISK_RESERVE = int(os.environ.get("YTDL_SCHEDULER_DISK_RESERVE", 1024 ** 3))
+SCHEDULER_MAX_BANDWIDTH = float(os.environ.get("YTDL_SCHEDULER_MAX_BANDWIDTH", 0))
+SCHEDULER_SESSION_BANDWIDTH = float(os.environ.get("YTDL_SCHEDULER_SESSION_BANDWIDTH", 0))
+
+# Whole-playlist downloads (see playlist.py)
+PLAYLIST_CONCURRENCY = int(os.environ.get("YTDL_PLAYLIST_CONCURRENCY", 4))
+# Extra attempts for each entry that fails
+PLAYLIST_RETRIES = int(os.environ.get("YTDL_PLAYLIST_RETRIES", 2))
+
+# Format selection (see formats.py): pick the codec that needs the fewest
+# bytes for each resolution instead of the highest bitrate
+FORMAT_PREFER_SMALL_CODECS = os.environ.get("YTDL_FORMAT_PREFER_SMALL_CODECS", "0").lower() in ("1", "true", "yes")
+
+# Size estimation model calibrated from finished downloads (see size_estimator.py)
+SIZE_MODEL_PATH = Path(os.environ.get("YTDL_SIZE_MODEL_PATH", DATA_DIR / "size_model.json"))
+
+# Progress reporting (see progress.py)
+PROGRESS_MAX_UPDATES_PER_SECOND = float(os.environ.get("YTDL_PROGRESS_MAX_UPDATES_PER_SECOND", 4))
+# Weight of the newest sample in the smoothed download speed (0-1)
+PROGRESS_EWMA_ALPHA = float(os.environ.get("YTDL_PROGRESS_EWMA_ALPHA", 0.3))
+
+# Shared cache of finished downloads (see artifact_cache.py); 0 disables it
+ARTIFACT_CACHE_DIR = Path(os.environ.get("YTDL_ARTIFACT_CACHE_DIR", DATA_DIR / "artifacts"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get("YTDL_ARTIFACT_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+
+# Working directories of downloads in progress (see workdirs.py). Partial
+# files are kept after a failure so the next attempt resumes them; the
+# janitor removes directories untouched for WORK_DIR_MAX_AGE seconds and the
+# oldest ones once all of them together exceed WORK_DIR_MAX_BYTES.
+WORK_DIR = Path(os.environ.get("YTDL_WORK_DIR", DATA_DIR / "work"))
+WORK_DIR_MAX_AGE = float(os.environ.get("YTDL_WORK_DIR_MAX_AGE", 24 * 60 * 60))
+WORK_DIR_MAX_BYTES = int(os.environ.get("YTDL_WORK_DIR_MAX_BYTES", 20 * 1024 ** 3))
+WORK_DIR_SWEEP_INTERVAL = float(os.environ.get("YTDL_WORK_DIR_SWEEP_INTERVAL", 10 * 60))
+# Extra attempts of a failed download, each resuming where the last stopped
+DOWNLOAD_RETRIES = int(os.environ.get("YTDL_DOWNLOAD_RETRIES", 2))
+
+# Pool of reusable yt-dlp instances (see ydl_pool.py): how many idle ones
+# are kept per set of options, and when one is replaced by a fresh one
+YDL_POOL_SIZE = int(os.environ.get("YTDL_YDL_POOL_SIZE", 4))
+YDL_POOL_MAX_USES = int(os.environ.get("YTDL_YDL_POOL_MAX_USES", 200))
+YDL_POOL_MAX_AGE = float(os.environ.get("YTDL_YDL_POOL_MAX_AGE", 30 * 60))  # seconds
+YDL_POOL_MAX_FAILURES = int(os.environ.get("YTDL_YDL_POOL_MAX_FAILURES", 3))  # in a row
+
+# Multi-connection downloads (see segmented.py and downloaders.py).
+# Progressive files are fetched as parallel byte ranges; DASH/HLS formats
+# use yt-dlp's concurrent fragment downloads with the same connection count.
+SEGMENTED_DOWNLOADS = os.environ.get("YTDL_SEGMENTED_DOWNLOADS", "1").lower() in ("1", "true", "yes")
+SEGMENTED_CONNECTIONS = int(os.environ.get("YTDL_SEGMENTED_CONNECTIONS", 4))
+SEGMENTED_CHUNK_SIZE = int(os.environ.get("YTDL_SEGMENTED_CHUNK_SIZE", 10 * 1024 * 1024))
+# Files smaller than this aren't worth splitting
+SEGMENTED_MIN_SIZE = int(os.environ.get("YTDL_SEGMENTED_MIN_SIZE", 16 * 1024 * 1024))
+
+# Segment-parallel MP3 encoding (see parallel_encode.py). Sources at least
+# PARALLEL_ENCODE_MIN_DURATION seconds long are cut into segments of at
+# least PARALLEL_ENCODE_MIN_SEGMENT seconds, each cut moved into a silence
+# up to PARALLEL_ENCODE_SILENCE_WINDOW seconds away (0 = cut at exact
+# times). The audio conversions of all jobs (segments, one-piece encodes
+# and remuxes) share PARALLEL_ENCODE_WORKERS FFmpeg processes; merges done
+# by yt-dlp itself aren't counted.
+PARALLEL_ENCODE_WORKERS = int(os.environ.get("YTDL_PARALLEL_ENCODE_WORKERS", os.cpu_count() or 1))
+PARALLEL_ENCODE_MIN_DURATION = float(os.environ.get("YTDL_PARALLEL_ENCODE_MIN_DURATION", 10 * 60))
+PARALLEL_ENCODE_MIN_SEGMENT = float(os.environ.get("YTDL_PARALLEL_ENCODE_MIN_SEGMENT", 2 * 60))
+PARALLEL_ENCODE_SILENCE_WINDOW = float(os.environ.get("YTDL_PARALLEL_ENCODE_SILENCE_WINDOW", 15))
+
+# How often FFmpeg/ffprobe are re-probed in the background (seconds, 0 = never)
+CAPABILITY_REFRESH_INTERVAL = float(os.environ.get("YTDL_CAPABILITY_REFRESH_INTERVAL", 10 * 60))
+# Show the startup timing report at the bottom of the page
+SHOW_STARTUP_TIMING = os.environ.get("YTDL_SHOW_STARTUP_TIMING", "0").lower() in ("1", "true", "yes")
+
+# Prometheus metrics (see metrics.py), served at http://METRICS_HOST:METRICS_PORT/metrics.
+# Bound to localhost by default; set the port to 0 to turn the endpoint off.
+METRICS_HOST = os.environ.get("YTDL_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("YTDL_METRICS_PORT", 9502))
+# Append one JSON line per finished job with its phase timings (empty = off)
+METRICS_JOB_LOG = os.environ.get("YTDL_METRICS_JOB_LOG", "")
+
+# Headless HTTP API (python api.py). Bound to localhost by default; when
+# API_TOKEN is set, requests need "Authorization: Bearer <token>".
+API_HOST = os.environ.get("YTDL_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("YTDL_API_PORT", 8503))
+API_TOKEN = os.environ.get("YTDL_API_TOKEN", "")
+# API jobs are scheduled, throttled and budgeted per client: the
+# X-Client-Id header, or else the peer address. A client queues several
+# jobs before it fetches their results, so its finished files may use
+# API_CLIENT_DISK_BUDGET bytes before the oldest are dropped.
+API_CLIENT_DISK_BUDGET = int(os.environ.get("YTDL_API_CLIENT_DISK_BUDGET", 4 * DELIVERY_SESSION_DISK_BUDGET))
+
+# Bulk mode: how many videos' metadata is fetched at once, and the most
+# unique URLs accepted per list
+BULK_CONCURRENCY = int(os.environ.get("YTDL_BULK_CONCURRENCY", 8))
+BULK_MAX_URLS = int(os.environ.get("YTDL_BULK_MAX_URLS", 1000))
@@ -0,0 +1,649 @@
+# Extraction, format selection and downloads, shared by the Streamlit UI
+# (main.py), the HTTP API (api.py) and the batch CLI (cli.py). Nothing in
+# here touches Streamlit; failures are raised as exceptions.
+
+import contextvars
+import datetime
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config
+from artifact_cache import artifact_key, get_artifact_cache
+from audio import finish_audio
+from bulk import dedupe_urls, fetch_rows, make_rows
+from capabilities import get_capabilities
+from clips import clip_label, clip_options, clip_size
+from delivery import get_artifact_store
+from jobs import current_job, get_job_registry
+from metadata_cache import get_metadata_cache
+from metrics import get_metrics
+from playlist import download_playlist, playlist_format_spec
+from progress import ProgressAggregator
+from scheduler import get_bandwidth
+from singleflight import get_flights
+from size_estimator import get_size_estimator
+from url_utils import extract_video_id, is_playlist_url, safe_filename
+from video_info import build_video_info
+from workdirs import get_work_dirs
+from ydl_pool import get_ydl_pool
+from zipstream import ZipLayout
+
+
+class VideoInfoError(Exception):
+    pass
+
+
+class DownloadError(Exception):
+    pass
+
+
+# Video title, channel and the {label: format} download options for a URL.
+# ffmpeg_available defaults to what the host can do. Raises VideoInfoError.
+def get_video_info(url, ffmpeg_available=None):
+    if ffmpeg_available is None:
+        ffmpeg_available = get_capabilities().ffmpeg_available
+    cache = get_metadata_cache()
+    
+    # The offered formats depend on FFmpeg and the codec preference,
+    # so each combination is cached separately
+    cache_variant = "merge" if ffmpeg_available else "split"
+    if config.FORMAT_PREFER_SMALL_CODECS:
+        cache_variant += "-small"
+    
+    # Playlist links resolve to the whole playlist, so they bypass the cache
+    video_id = None
+    if not is_playlist_url(url):
+        video_id = extract_video_id(url)
+    
+    if video_id:
+        cached = cache.get(f"{video_id}:{cache_variant}")
+        if cached is not None:
+            return cached
+    
+    # Sessions asking for the same video at the same time share one extraction
+    flight_key = f"{video_id or url}:{cache_variant}"
+    return get_flights('info').run(flight_key, lambda publish: _extract_video_info(url, ffmpeg_available, cache_variant))
+
+# Extract, select formats and cache the result; once per flight
+def _extract_video_info(url, ffmpeg_available, cache_variant):
+    cache = get_metadata_cache()
+    try:
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+        }
+        
+        with get_ydl_pool().borrow('info', ydl_opts) as ydl:
+            with get_metrics().span('extraction'):
+                info = ydl.extract_info(url, download=False)
+            if info is None:
+                raise Exception("Failed to extract video information")
+            
+            with get_metrics().span('format_selection'):
+                video_info = build_video_info(info, ffmpeg_available, config.FORMAT_PREFER_SMALL_CODECS)
+            
+            # Cache single videos under their canonical ID
+            if 'entries' not in info and info.get('id'):
+                cache.set(f"{info['id']}:{cache_variant}", video_info)
+            
+            return video_info
+    except Exception as e:
+        raise VideoInfoError(f"Error fetching video info: {str(e)}") from e
+
+# Pick a mime type from the file extension
+def get_mime_type(filename):
+    file_ext = os.path.splitext(filename)[1][1:] if '.' in filename else 'mp4'
+    if file_ext == "mp3":
+        return "audio/mp3"
+    if file_ext == "zip":
+        return "application/zip"
+    if file_ext == "mkv":
+        return "video/x-matroska"
+    return f"video/{file_ext}"
+
+# Format file size for display
+def format_size(size_bytes):
+    if size_bytes is None:  # Check if size_bytes is None
+        return "Unknown size"
+    
+    if size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+# Files in a work directory that aren't a finished download
+def _is_partial(name):
+    return name.startswith('.') or name.endswith(('.part', '.ytdl', '.segments')) or '.part-Frag' in name
+
+# Run yt-dlp for one URL and return the name of the file it wrote. Failed
+# attempts are retried with the same options; yt-dlp skips files that
+# already finished and continues .part files where they stopped.
+def _download_with_retries(ydl_opts, url, is_playlist, progress):
+    for attempt in range(config.DOWNLOAD_RETRIES + 1):
+        try:
+            with get_ydl_pool().borrow('download', ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                if info is None:
+                    raise Exception("Failed to extract video information")
+                
+                # Handle playlist vs single video differently
+                if is_playlist and 'entries' in info:
+                    # For playlists, we'll just take the first successful download
+                    for entry in info['entries']:
+                        if entry:
+                            return ydl.prepare_filename(entry)
+                    return None
+                # For single videos
+                return ydl.prepare_filename(info)
+        except Exception:
+            if attempt == config.DOWNLOAD_RETRIES:
+                raise
+            progress.message("Resuming download...")
+
+# Function to download video
+# progress_callback(progress=None, text=None) receives progress updates; this
+# runs in a background job worker, so it must not touch Streamlit directly.
+# Callers combining several downloads pass their own aggregator as `progress`.
+# The download runs in the durable work directory of this video and format
+# (see workdirs.py): a failed or interrupted download leaves its partial
+# files there, and the next download of the same file resumes them.
+# `clip` is an optional (start, end) in seconds to download only that part.
+# A caller that passes `work_dir` (that download's work directory, locked
+# with download_work_dir) gets the finished file left in it, to finish or
+# keep for a later attempt itself.
+def download_video(url, format_id, quality, selected_format, progress_callback=None, progress=None, clip=None,
+                   work_dir=None):
+    from downloaders import ydl_download_options
+    
+    owns_work_dir = work_dir is None
+    if owns_work_dir:
+        work_dir = download_work_dir(url, format_id, quality, selected_format, clip)
+    try:
+        temp_dir = str(work_dir.path)
+        
+        # yt-dlp's byte counts go to an aggregator that computes speed and
+        # ETA itself and rate-limits updates to the caller
+        if progress is None:
+            progress = ProgressAggregator(progress_callback, total_hint=selected_format.get('size'))
+        progress_hooks = [progress.hook, get_metrics().download_hook]
+        
+        # Bandwidth limits apply to the session of the job running this
+        bandwidth = get_bandwidth()
+        if not bandwidth.unlimited:
+            job = current_job()
+            progress_hooks.append(bandwidth.hook(job.session_id if job else None))
+        
+        # Generate a timestamp-based filename to ensure it appears at the top
+        # in file explorer. A resumed download keeps the name of the first
+        # attempt so yt-dlp finds its .part files.
+        state = work_dir.load_state()
+        if 'timestamp' not in state:
+            state = {'timestamp': datetime.datetime.now().strftime("%Y%m%d_%H%M%S"), 'url': url, 'format_id': format_id}
+            work_dir.save_state(state)
+        else:
+            progress.message("Resuming download...")
+        current_time = state['timestamp']
+        
+        # Determine if this is a playlist
+        is_playlist = is_playlist_url(url)
+        
+        # Prepare filename template with playlist index if needed
+        if is_playlist:
+            filename_template = os.path.join(temp_dir, f"{current_time}_(1)_%(title)s.%(ext)s")
+        else:
+            filename_template = os.path.join(temp_dir, f"{current_time}_%(title)s.%(ext)s")
+        
+        # For audio-only downloads
+        if "Audio Only" in quality:
+            audio_mode = selected_format.get('audio_mode', 'mp3')
+            
+            # Only the source stream is downloaded here; any conversion
+            # happens afterwards on the local file
+            ydl_opts = {
+                'format': format_id,
+                'outtmpl': filename_template,
+                'progress_hooks': progress_hooks,
+                'noplaylist': not is_playlist,
+                'continuedl': True,
+                **ydl_download_options(),
+                **(clip_options(clip) if clip else {}),
+            }
+            filename = _download_with_retries(ydl_opts, url, is_playlist, progress)
+            
+            # Find the downloaded file
+            source_path = os.path.join(temp_dir, os.path.basename(filename)) if filename else None
+            if not source_path or not os.path.exists(source_path):
+                source_path = None
+                for file in os.listdir(temp_dir):
+                    file_path = os.path.join(temp_dir, file)
+                    if os.path.isfile(file_path) and not _is_partial(file):
+                        source_path = file_path
+                        break
+            if source_path is None:
+                raise Exception("Downloaded file not found")
+            
+            # Stream copy or encode as requested; a failed MP3 encode fails
+            # the download but leaves the source for the next attempt
+            final_path = finish_audio(source_path, audio_mode, progress)
+            if owns_work_dir:
+                final_path = work_dir.finish(final_path)
+            return os.path.basename(final_path), final_path
+        
+        # For video downloads
+        else:
+            # Use the specific format ID picked by get_video_info: either a
+            # progressive format or a video+audio pair that FFmpeg merges
+            ydl_opts = {
+                'format': format_id,
+                'outtmpl': filename_template,
+                'progress_hooks': progress_hooks,
+                'postprocessor_hooks': [progress.postprocessor_hook, get_metrics().postprocessor_hook],
+                'noplaylist': not is_playlist,
+                'continuedl': True,
+                # Important: Don't abort if FFmpeg is not available
+                'ignoreerrors': True,
+                'abort_on_error': False,
+                **ydl_download_options(),
+                **(clip_options(clip) if clip else {}),
+            }
+            if selected_format.get('merge'):
+                ydl_opts['merge_output_format'] = selected_format['ext']
+            filename = _download_with_retries(ydl_opts, url, is_playlist, progress)
+            
+            # Find the downloaded file
+            final_path = os.path.join(temp_dir, os.path.basename(filename)) if filename else None
+            if not final_path or not os.path.exists(final_path):
+                # Try to find the file with a similar name
+                final_path = None
+                for file in os.listdir(temp_dir):
+                    file_path = os.path.join(temp_dir, file)
+                    if os.path.isfile(file_path) and not _is_partial(file):
+                        final_path = file_path
+                        break
+            if final_path is None:
+                raise Exception("Downloaded file not found")
+            
+            if owns_work_dir:
+                final_path = work_dir.finish(final_path)
+            return os.path.basename(final_path), final_path
+    
+    except Exception as e:
+        # Partial files stay in the work directory for the next attempt;
+        # the janitor removes them if nobody comes back for them
+        raise DownloadError(f"Download failed: {str(e)}") from e
+    finally:
+        if owns_work_dir:
+            work_dir.release()
+
+# The durable work directory of a download (see download_video), locked
+def download_work_dir(url, format_id, quality, selected_format, clip=None):
+    postprocessing = postprocessing_options(quality, selected_format, clip)
+    return get_work_dirs().acquire(artifact_key(extract_video_id(url) or url, format_id, postprocessing))
+
+# Post-processing that changes the bytes of a download, for the cache key
+def postprocessing_options(quality, selected_format, clip=None):
+    options = {}
+    if "Audio Only" in quality:
+        options['audio'] = selected_format.get('audio_mode', 'mp3')
+    elif selected_format.get('merge'):
+        options['merge'] = selected_format['ext']
+    elif selected_format.get('needs_ffmpeg'):
+        options['split'] = True
+    if clip:
+        options['clip'] = list(clip)
+    return options
+
+# Download the video and the audio stream of a split format (one that
+# needs FFmpeg to merge, on a host without it) at the same time. Each is an
+# ordinary download with its own work directory, so each resumes on its
+# own. Both directories stay locked until both streams are done; if one
+# fails, the other's finished file stays in its directory and the next
+# attempt picks it up without downloading it again. Returns [(name in the
+# archive, path)] for the video and the audio.
+def download_split_streams(url, format_id, selected_format, progress_callback=None):
+    progress = ProgressAggregator(progress_callback, total_hint=selected_format.get('size'))
+    streams = list(zip(("video", "audio"), format_id.split('+', 1)))
+    work_dirs = [download_work_dir(url, stream_format, "", {'merge': False}) for _, stream_format in streams]
+    try:
+        with ThreadPoolExecutor(max_workers=len(streams), thread_name_prefix="split-stream") as pool:
+            # Each stream runs in a copy of this context, so it is throttled
+            # and measured as part of this job
+            futures = [
+                pool.submit(contextvars.copy_context().run, download_video, url, stream_format, "", {'merge': False},
+                            progress=progress, work_dir=work_dir)
+                for (_, stream_format), work_dir in zip(streams, work_dirs)
+            ]
+            wait(futures)
+        
+        failed = [future for future in futures if future.exception() is not None]
+        if failed:
+            raise failed[0].exception()
+        
+        # Name the files after the title and what they hold (both may be
+        # .webm); the timestamp prefix download_video gives its files is
+        # dropped
+        members = []
+        for (kind, _), future, work_dir in zip(streams, futures, work_dirs):
+            filename, filepath = future.result()
+            filepath = work_dir.finish(filepath)
+            name, ext = os.path.splitext(filename)
+            arcname = f"{name.split('_', 2)[-1]} ({kind}){ext}"
+            target = os.path.join(os.path.dirname(filepath), arcname)
+            os.replace(filepath, target)
+            members.append((arcname, target))
+        return members
+    finally:
+        for work_dir in work_dirs:
+            work_dir.release()
+
+# README.txt of a split download
+def split_readme(video_name, audio_name):
+    return f"""This archive contains a video and its sound as two separate files:
+
+    {video_name}
+    {audio_name}
+
+The server that downloaded them could not merge them into one file, so
+play them together:
+
+- VLC: Media > Open Multiple Files..., add the video file, tick "Show more
+  options", tick "Play another media synchronously" and pick the audio file.
+- mpv: mpv "{video_name}" --audio-file="{audio_name}"
+
+Or merge them into one file with FFmpeg (no re-encoding, takes seconds):
+
+    ffmpeg -i "{video_name}" -i "{audio_name}" -c copy merged.mkv
+"""
+
+# Runs in a job worker for split formats: download both streams, then
+# register a ZIP of them and a README with the delivery store. The ZIP is
+# never written to disk; it is assembled from the two files while it is
+# being sent (see zipstream.py).
+def run_split_download_job(url, video_id, format_id, selected_format, session_id, progress_callback=None):
+    cache_key = artifact_key(video_id, format_id, postprocessing_options("", selected_format))
+    work_dirs = get_work_dirs()
+    
+    def fetch(publish):
+        with get_metrics().span('download'):
+            return download_split_streams(url, format_id, selected_format, publish)
+    
+    def cleanup(streams):
+        for _, path in streams:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    
+    # Like run_download_job, jobs for the same format share one download and
+    # each links the finished files into a directory of its own
+    with get_flights('download').share(cache_key, fetch, progress_callback, cleanup=cleanup) as streams:
+        members, target_dir = [], None
+        for arcname, path in streams:
+            linked = work_dirs.link(path, target_dir)
+            target_dir = os.path.dirname(linked)
+            members.append((arcname, linked))
+    
+    (video_name, video_path), (audio_name, _) = members
+    layout = ZipLayout(members + [("README.txt", split_readme(video_name, audio_name).encode('utf-8'))])
+    filename = f"{video_name.rsplit(' (video)', 1)[0]}.zip"
+    token = get_artifact_store().register(
+        session_id,
+        video_path,
+        get_mime_type(filename),
+        cleanup_dir=target_dir,
+        layout=layout,
+    )
+    return {'filename': filename, 'token': token, 'cached': False}
+
+# Runs in a job worker: download (or reuse a cached copy), then hand the
+# file to the delivery store
+def run_download_job(url, video_id, format_id, quality, selected_format, session_id, duration, progress_callback=None,
+                     clip=None):
+    if selected_format.get('needs_ffmpeg'):
+        return run_split_download_job(url, video_id, format_id, selected_format, session_id, progress_callback)
+    
+    store = get_artifact_store()
+    cache = get_artifact_cache()
+    cache_key = artifact_key(video_id, format_id, postprocessing_options(quality, selected_format, clip))
+    
+    # Serve straight from the shared cache if someone fetched this before
+    entry = cache.acquire(cache_key) if cache else None
+    if entry is not None:
+        if progress_callback:
+            progress_callback(progress=1.0, text="Served from cache")
+        token = store.register(
+            session_id,
+            entry.path,
+            get_mime_type(entry.filename),
+            on_drop=lambda: cache.release(cache_key),
+        )
+        return {'filename': entry.filename, 'token': token, 'cached': True}
+    
+    def fetch(publish):
+        with get_metrics().span('download'):
+            filename, filepath = download_video(url, format_id, quality, selected_format, publish, clip=clip)
+        
+        # Calibrate the size model with the real size (of whole videos only)
+        if clip:
+            return filename, filepath
+        get_size_estimator().record(
+            selected_format['height'] if isinstance(selected_format['height'], int) else 0,
+            selected_format.get('vcodec'),
+            duration,
+            os.path.getsize(filepath),
+            audio_only="Audio Only" in quality,
+            predicted=selected_format.get('size'),
+            source=selected_format.get('size_source'),
+        )
+        return filename, filepath
+    
+    # Jobs for the same file running at the same time share one download
+    # and its progress; each gets its own link to the finished file, and the
+    # shared one is removed once all of them have theirs
+    with get_flights('download').share(
+        cache_key,
+        fetch,
+        progress_callback,
+        cleanup=lambda result: shutil.rmtree(os.path.dirname(result[1]), ignore_errors=True),
+    ) as (filename, shared_path):
+        filepath = get_work_dirs().link(shared_path)
+    
+    # Keep a copy in the shared cache for the next request, pinned while
+    # this session can still download it. A file that didn't come out in
+    # the requested container (e.g. Opus left in WebM without FFmpeg) isn't
+    # what the key stands for, so it isn't cached.
+    cacheable = cache and os.path.splitext(filename)[1][1:].lower() == selected_format.get('ext')
+    entry = cache.put(cache_key, filepath) if cacheable else None
+    if entry is not None:
+        shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
+        token = store.register(
+            session_id,
+            entry.path,
+            get_mime_type(filename),
+            on_drop=lambda: cache.release(cache_key),
+        )
+    else:
+        token = store.register(
+            session_id,
+            filepath,
+            get_mime_type(filename),
+            cleanup_dir=os.path.dirname(filepath),
+        )
+    return {'filename': filename, 'token': token, 'cached': False}
+
+# Runs in a job worker: download every playlist entry into one ZIP
+def run_playlist_job(url, quality, selected_format, session_id, progress_callback=None):
+    if selected_format.get('audio_mode'):
+        format_spec = selected_format['format_id']
+    else:
+        format_spec = playlist_format_spec(selected_format['height'], selected_format.get('merge', False))
+    
+    def download_entry(entry_url, entry_progress):
+        with get_metrics().span('download'):
+            return download_video(entry_url, format_spec, quality, selected_format, progress=entry_progress)
+    
+    # The archive is built in a work directory of its own, so the janitor
+    # and its size limit cover it like any other download
+    work_dir = get_work_dirs().acquire(
+        artifact_key(url, format_spec, {'playlist': postprocessing_options(quality, selected_format)}))
+    try:
+        filename, zip_path = download_playlist(url, download_entry, progress_callback=progress_callback,
+                                               work_dir=str(work_dir.path))
+        filepath = work_dir.finish(zip_path)
+    finally:
+        work_dir.release()
+    token = get_artifact_store().register(
+        session_id,
+        filepath,
+        get_mime_type(filename),
+        cleanup_dir=os.path.dirname(filepath),
+    )
+    return {'filename': filename, 'token': token}
+
+
+# Runs in a job worker: fetch info for many URLs, BULK_CONCURRENCY at a
+# time. `rows` is also in job.meta, so the UI can show them as they arrive.
+def run_bulk_info_job(rows, progress_callback=None):
+    fetch_rows(rows, get_video_info, config.BULK_CONCURRENCY, progress_callback)
+    return {
+        'fetched': sum(1 for row in rows if row['status'] == 'done'),
+        'failed': sum(1 for row in rows if row['status'] == 'error'),
+    }
+
+# Queue a metadata fetch for a list of URLs, deduplicated by video ID, and
+# return the job ID
+def submit_bulk_info(urls, session_id):
+    groups = dedupe_urls(urls)
+    rows = make_rows(groups[:config.BULK_MAX_URLS])
+    meta = {
+        'kind': 'bulk_info',
+        'title': f"{len(rows)} videos",
+        'given': len(urls),
+        'unique': len(groups),
+        'dropped': max(len(groups) - config.BULK_MAX_URLS, 0),
+        'rows': rows,
+    }
+    return get_job_registry().submit(run_bulk_info_job, rows, session_id=session_id, meta=meta)
+
+# The format to download for a quality given as a label from video_info
+# ("720p (HD)"), a height ("720" or "720p"), an audio mode ("m4a", "opus",
+# "mp3" or just "audio") or "best". Returns (label, format); raises ValueError.
+def pick_format(video_info, quality=None):
+    formats = video_info['formats']
+    if quality in formats:
+        return quality, formats[quality]
+
+    wanted = (quality or 'best').strip().lower()
+    video = [(label, fmt) for label, fmt in formats.items() if isinstance(fmt['height'], int)]
+    audio = [(label, fmt) for label, fmt in formats.items() if fmt.get('audio_mode')]
+
+    if wanted == 'best' and video:
+        return max(video, key=lambda item: item[1]['height'])
+    if wanted == 'audio' and audio:
+        return audio[0]
+    for label, fmt in audio:
+        if fmt['audio_mode'] == wanted:
+            return label, fmt
+
+    height = wanted[:-1] if wanted.endswith('p') else wanted
+    if height.isdigit():
+        fitting = [item for item in video if item[1]['height'] <= int(height)]
+        if fitting:
+            return max(fitting, key=lambda item: item[1]['height'])
+
+    raise ValueError(f"No format matches {quality!r}; available: {', '.join(formats)}")
+
+# Why `clip` can't be combined with a format and playlist mode on this
+# host, or None
+def clip_conflict(selected_format, whole_playlist=False):
+    if not get_capabilities().ffmpeg_available:
+        return "Clips are cut with FFmpeg, which is not installed on this server"
+    if whole_playlist:
+        return "A clip can't be cut from a whole playlist; download a single video instead"
+    if selected_format.get('needs_ffmpeg'):
+        return "This quality is delivered as separate files without FFmpeg, so it can't be clipped"
+    return None
+
+# Queue a download of `quality` (a label from video_info['formats']) and
+# return the job ID. With whole_playlist a playlist URL is downloaded
+# into one ZIP instead of just its first video. Raises ValueError for a
+# clip that can't be honoured (see clip_conflict).
+def submit_download(url, video_info, quality, session_id, whole_playlist=False, clip=None):
+    selected_format = video_info['formats'][quality]
+    is_playlist = is_playlist_url(url)
+    whole_playlist = whole_playlist and is_playlist
+    
+    # A clip of a single video: its estimate covers only the clip
+    conflict = clip_conflict(selected_format, whole_playlist) if clip else None
+    if conflict:
+        raise ValueError(conflict)
+    if clip:
+        selected_format = {**selected_format, 'size': clip_size(selected_format.get('size'), video_info['duration'], clip)}
+    
+    # Disk the scheduler sets aside before the job may start. A playlist ZIP
+    # grows to about one video per entry; when the entry count isn't known
+    # the videos downloading at once are reserved at least. A file the
+    # artifact cache already holds needs no new disk.
+    estimated_bytes = selected_format.get('size')
+    if whole_playlist and estimated_bytes:
+        estimated_bytes *= video_info.get('playlist_count') or config.PLAYLIST_CONCURRENCY
+    cache = get_artifact_cache()
+    if not whole_playlist and cache and cache.has(
+            artifact_key(video_info['id'], selected_format['format_id'],
+                         postprocessing_options(quality, selected_format, clip))):
+        estimated_bytes = None
+    meta = {
+        'kind': 'playlist' if whole_playlist else 'video',
+        'title': video_info['title'],
+        'quality': quality,
+        'height': selected_format['height'],
+        'is_playlist': is_playlist,
+        'whole_playlist': whole_playlist,
+        'clip': clip_label(clip) if clip else None,
+        'estimated_bytes': estimated_bytes,
+    }
+    
+    registry = get_job_registry()
+    if whole_playlist:
+        return registry.submit(
+            run_playlist_job,
+            url,
+            quality,
+            selected_format,
+            session_id,
+            session_id=session_id,
+            meta=meta,
+        )
+    return registry.submit(
+        run_download_job,
+        url,
+        video_info['id'],
+        selected_format['format_id'],
+        quality,
+        selected_format,
+        session_id,
+        video_info['duration'],
+        session_id=session_id,
+        meta=meta,
+        clip=clip,
+    )
+
+# File name to save a finished job's file under, from the video title
+def job_download_filename(job):
+    filename = job.result['filename']
+    file_ext = os.path.splitext(filename)[1][1:] if '.' in filename else 'mp4'
+    
+    # Create a safe filename
+    safe_title = safe_filename(job.meta['title'])
+    
+    # Clips carry their time range, with "." for ":" which file names can't have
+    if job.meta.get('clip'):
+        safe_title += f" ({job.meta['clip'].replace(':', '.')})"
+    
+    # Add (1) for playlist items
+    if job.meta.get('whole_playlist'):
+        return f"{safe_title}.{file_ext}"
+    elif job.meta['is_playlist']:
+        return f"{safe_title} (1).{file_ext}"
+    return f"{safe_title}.{file_ext}"
@@ -0,0 +1,350 @@
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+import config
+from metrics import get_metrics
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+# A finished download waiting on disk for the browser to fetch it
+# If `on_drop` is given the file isn't ours to delete; on_drop is called
+# instead once the artifact is evicted and no longer being streamed.
+# With a `layout` (a zipstream.ZipLayout) the artifact is an archive that
+# is put together from its member files while it is being sent.
+class Artifact:
+    def __init__(self, token, session_id, path, mime, cleanup_dir=None, on_drop=None, layout=None):
+        self.token = token
+        self.session_id = session_id
+        self.path = path
+        self.mime = mime
+        self.cleanup_dir = cleanup_dir
+        self.on_drop = on_drop
+        self.layout = layout
+        self.size = layout.size if layout is not None else os.path.getsize(path)
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.active_streams = 0
+        self.evicted = False
+
+    # The bytes from `start` on, `length` of them, as bytes objects and
+    # (path, offset, count) ranges of files to send
+    def pieces(self, start, length):
+        if self.layout is not None:
+            return self.layout.pieces(start, length)
+        return [(self.path, start, length)]
+
+    # The whole artifact in memory (for small files only)
+    def read(self):
+        chunks = []
+        for piece in self.pieces(0, self.size):
+            if isinstance(piece, bytes):
+                chunks.append(piece)
+                continue
+            path, offset, count = piece
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                chunks.append(f.read(count))
+        return b''.join(chunks)
+
+    # Write the artifact to `target`
+    def save(self, target):
+        if self.layout is None:
+            shutil.copyfile(self.path, target)
+            return
+        with open(target, 'wb') as out:
+            for piece in self.pieces(0, self.size):
+                if isinstance(piece, bytes):
+                    out.write(piece)
+                    continue
+                path, offset, count = piece
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    while count > 0:
+                        chunk = f.read(min(count, 1024 * 1024))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        count -= len(chunk)
+
+
+# Keeps track of finished downloads per session and removes them once a
+# session goes over its disk budget or an artifact outlives its TTL.
+# Artifacts that are being streamed are only deleted after the stream ends.
+class ArtifactStore:
+    def __init__(self, session_disk_budget, eviction_policy, ttl):
+        self.session_disk_budget = session_disk_budget
+        self.eviction_policy = eviction_policy
+        self.ttl = ttl
+        self._budgets = {}  # session_id -> disk budget, where it isn't the default
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def register(self, session_id, path, mime, cleanup_dir=None, on_drop=None, layout=None):
+        token = secrets.token_urlsafe(16)
+        artifact = Artifact(token, session_id, path, mime, cleanup_dir, on_drop, layout)
+
+        with self._lock:
+            self._artifacts[token] = artifact
+            self._expire_locked(time.time())
+            self._enforce_budget_locked(session_id, keep=token)
+        return token
+
+    # Mark an artifact as being streamed; returns None if it is gone
+    def acquire(self, token):
+        with self._lock:
+            artifact = self._artifacts.get(token)
+            if artifact is None or artifact.evicted:
+                return None
+            artifact.active_streams += 1
+            artifact.last_access = time.time()
+            return artifact
+
+    def release(self, artifact):
+        with self._lock:
+            artifact.active_streams -= 1
+            artifact.last_access = time.time()
+            if artifact.evicted and artifact.active_streams == 0:
+                self._delete_files(artifact)
+
+    # Give one session a disk budget other than session_disk_budget
+    def set_session_budget(self, session_id, budget):
+        with self._lock:
+            self._budgets[session_id] = budget
+
+    def has(self, token):
+        with self._lock:
+            return token in self._artifacts
+
+    def discard(self, token):
+        with self._lock:
+            artifact = self._artifacts.get(token)
+            if artifact is not None:
+                self._evict_locked(artifact)
+
+    def session_usage(self, session_id):
+        with self._lock:
+            artifacts = [a for a in self._artifacts.values() if a.session_id == session_id]
+            return {
+                'artifacts': len(artifacts),
+                'disk_bytes': sum(a.size for a in artifacts),
+                'active_streams': sum(a.active_streams for a in artifacts),
+            }
+
+    # Directories holding files that are still registered
+    def directories(self):
+        with self._lock:
+            return {a.cleanup_dir or os.path.dirname(a.path) for a in self._artifacts.values()}
+
+    def sweep(self):
+        with self._lock:
+            self._expire_locked(time.time())
+
+    def _expire_locked(self, now):
+        for artifact in list(self._artifacts.values()):
+            if artifact.active_streams == 0 and now - artifact.last_access > self.ttl:
+                self._evict_locked(artifact)
+
+    def _enforce_budget_locked(self, session_id, keep):
+        artifacts = [a for a in self._artifacts.values() if a.session_id == session_id]
+        used = sum(a.size for a in artifacts)
+        budget = self._budgets.get(session_id, self.session_disk_budget)
+        if used <= budget:
+            return
+
+        if self.eviction_policy == "fifo":
+            artifacts.sort(key=lambda a: a.created_at)
+        else:
+            artifacts.sort(key=lambda a: a.last_access)
+
+        for artifact in artifacts:
+            if used <= budget:
+                break
+            if artifact.token == keep:
+                continue
+            used -= artifact.size
+            self._evict_locked(artifact)
+
+    def _evict_locked(self, artifact):
+        self._artifacts.pop(artifact.token, None)
+        artifact.evicted = True
+        if artifact.active_streams == 0:
+            self._delete_files(artifact)
+
+    def _delete_files(self, artifact):
+        if artifact.on_drop is not None:
+            artifact.on_drop()
+            return
+        try:
+            os.remove(artifact.path)
+        except OSError:
+            pass
+        if artifact.cleanup_dir:
+            shutil.rmtree(artifact.cleanup_dir, ignore_errors=True)
+
+
+# Parse a single "bytes=start-end" range against a file size.
+# Returns (start, end) inclusive, None for no/unsupported range, or
+# raises ValueError if the range can't be satisfied.
+def parse_range(header, size):
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class DeliveryHandler(BaseHTTPRequestHandler):
+    store = None
+    chunk_size = 1024 * 1024
+
+    # URLs look like /files/<token>/<download filename>
+    def _lookup(self):
+        parts = self.path.split('?', 1)[0].split('/')
+        if len(parts) < 3 or parts[1] != 'files':
+            return None, None
+        token = parts[2]
+        filename = unquote(parts[3]) if len(parts) > 3 else None
+        return self.store.acquire(token), filename
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        artifact, filename = self._lookup()
+        if artifact is None:
+            self.send_error(404, "File expired or not found")
+            return
+
+        try:
+            size = artifact.size
+            try:
+                byte_range = parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+
+            length = end - start + 1 if size else 0
+            self.send_header('Content-Type', artifact.mime)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            if filename:
+                self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(filename)}")
+            self.end_headers()
+
+            if send_body and length:
+                with get_metrics().span('delivery', mode='stream'):
+                    for piece in artifact.pieces(start, length):
+                        if isinstance(piece, bytes):
+                            self.wfile.write(piece)
+                            continue
+                        path, offset, count = piece
+                        with open(path, 'rb') as f:
+                            self._send_file(f, offset, count)
+                get_metrics().inc('ytdl_delivery_bytes_total', length, mode='stream')
+        except (BrokenPipeError, ConnectionResetError):
+            # The browser went away or paused; it can resume with a Range request
+            pass
+        finally:
+            self.store.release(artifact)
+
+    def _send_file(self, f, offset, count):
+        self.wfile.flush()
+        try:
+            # Let the kernel copy straight from the page cache when it can
+            self.connection.sendfile(f, offset, count)
+            return
+        except (AttributeError, OSError, ValueError):
+            pass
+
+        f.seek(offset)
+        remaining = count
+        while remaining > 0:
+            chunk = f.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_store = None
+_server = None
+_lock = threading.Lock()
+
+
+# Process-wide artifact store shared by every Streamlit session
+def get_artifact_store():
+    global _store
+    with _lock:
+        if _store is None:
+            _store = ArtifactStore(
+                session_disk_budget=config.DELIVERY_SESSION_DISK_BUDGET,
+                eviction_policy=config.DELIVERY_EVICTION_POLICY,
+                ttl=config.DELIVERY_ARTIFACT_TTL,
+            )
+        return _store
+
+
+# Start the delivery HTTP server once per process, in a daemon thread
+def start_delivery_server(host=None, port=None):
+    global _server
+    store = get_artifact_store()
+    with _lock:
+        if _server is None:
+            handler = type('Handler', (DeliveryHandler,), {
+                'store': store,
+                'chunk_size': config.DELIVERY_CHUNK_SIZE,
+            })
+            _server = ThreadingHTTPServer(
+                (host or config.DELIVERY_HOST, port if port is not None else config.DELIVERY_PORT),
+                handler,
+            )
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="delivery-server", daemon=True).start()
+        return _server
+
+
+# Browser-facing URL for a registered artifact (on this host if no public
+# URL is configured)
+def artifact_url(token, filename):
+    base = config.DELIVERY_PUBLIC_URL or f"http://localhost:{config.DELIVERY_PORT}"
+    return f"{base.rstrip('/')}/files/{token}/{quote(filename)}"
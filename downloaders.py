@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+
+import yt_dlp
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+
+import config
+from segmented import download_segmented, probe_size
+
+
+# Extra yt-dlp options for parallel downloads: concurrent fragments for
+# DASH/HLS formats and chunked requests for the single-connection fallback
+def ydl_download_options():
+    if not config.SEGMENTED_DOWNLOADS:
+        return {}
+    return {
+        'concurrent_fragment_downloads': config.SEGMENTED_CONNECTIONS,
+        'http_chunk_size': config.SEGMENTED_CHUNK_SIZE,
+    }
+
+
+# yt-dlp downloader that fetches a progressive HTTP format as parallel byte
+# ranges. Falls back to yt-dlp's own HTTP downloader for small files and
+# servers that don't support ranges.
+class SegmentedFD(FileDownloader):
+    def real_download(self, filename, info_dict):
+        url = info_dict['url']
+        headers = info_dict.get('http_headers') or {}
+
+        def open_range(start, end):
+            return self.ydl.urlopen(Request(url, headers={**headers, 'Range': f'bytes={start}-{end}'}))
+
+        size, supports_ranges = probe_size(open_range)
+        if not supports_ranges or not size or size < config.SEGMENTED_MIN_SIZE:
+            fallback = HttpFD(self.ydl, self.params)
+            for hook in self._progress_hooks:
+                fallback.add_progress_hook(hook)
+            return fallback.real_download(filename, info_dict)
+
+        tmpfilename = self.temp_name(filename)
+        self.report_destination(filename)
+        started = time.time()
+
+        # Chunks finished by an earlier attempt are listed next to the .part
+        # file; they are only trusted if the file and chunking still match
+        segments_path = tmpfilename + '.segments'
+        done = set()
+        if os.path.exists(tmpfilename) and self.params.get('continuedl', True):
+            try:
+                with open(segments_path, encoding='utf-8') as f:
+                    segments = json.load(f)
+                if segments.get('size') == size and segments.get('chunk_size') == config.SEGMENTED_CHUNK_SIZE:
+                    done = set(segments.get('done', []))
+            except (OSError, ValueError):
+                pass
+        segments_lock = threading.Lock()
+
+        def on_chunk_done(start):
+            with segments_lock:
+                done.add(start)
+                with open(segments_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump({'size': size, 'chunk_size': config.SEGMENTED_CHUNK_SIZE, 'done': sorted(done)}, f)
+                os.replace(segments_path + '.tmp', segments_path)
+
+        def on_progress(downloaded):
+            elapsed = time.time() - started
+            self._hook_progress({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': size,
+                'filename': filename,
+                'tmpfilename': tmpfilename,
+                'elapsed': elapsed,
+            }, info_dict)
+
+        download_segmented(
+            open_range,
+            tmpfilename,
+            size,
+            connections=config.SEGMENTED_CONNECTIONS,
+            chunk_size=config.SEGMENTED_CHUNK_SIZE,
+            on_progress=on_progress,
+            done=set(done),
+            on_chunk_done=on_chunk_done,
+        )
+        self.try_rename(tmpfilename, filename)
+        try:
+            os.remove(segments_path)
+        except OSError:
+            pass
+
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'elapsed': time.time() - started,
+        }, info_dict)
+        return True
+
+
+# YoutubeDL that routes plain HTTP(S) downloads through SegmentedFD;
+# everything else (fragments, live streams, time ranges, external
+# downloaders) is handled by yt-dlp as usual
+class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+    def dl(self, name, info, subtitle=False, test=False):
+        if (not config.SEGMENTED_DOWNLOADS or subtitle or test or name == '-'
+                or info.get('protocol') not in ('http', 'https')
+                or info.get('section_start') or info.get('section_end')
+                or info.get('is_live') or self.params.get('external_downloader')):
+            return super().dl(name, info, subtitle=subtitle, test=test)
+
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+
+        fd = SegmentedFD(self, self.params)
+        for hook in self._progress_hooks:
+            fd.add_progress_hook(hook)
+        return fd.download(name, new_info, subtitle)
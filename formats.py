@@ -0,0 +1,219 @@
+# Format selection: index yt-dlp's format list once and pick the best
+# progressive format or adaptive video+audio pair for each resolution tier.
+
+# Common resolutions offered in the UI
+RESOLUTION_TIERS = {
+    "2160p (4K)": 2160,
+    "1440p (2K)": 1440,
+    "1080p (Full HD)": 1080,
+    "720p (HD)": 720,
+    "480p": 480,
+    "360p": 360,
+    "240p": 240,
+    "144p": 144
+}
+
+# Audio containers that can be merged into each video container without re-encoding
+COMPATIBLE_AUDIO = {
+    'mp4': ('m4a', 'mp4'),
+    'webm': ('webm',),
+}
+
+
+# Group a codec string like "avc1.640028" or "vp09.00.40.08" into a family
+def codec_family(codec):
+    codec = (codec or '').lower()
+    if codec.startswith(('av01', 'av1')):
+        return 'av1'
+    if codec.startswith(('vp09', 'vp9')):
+        return 'vp9'
+    if codec.startswith(('avc', 'h264')):
+        return 'h264'
+    if codec.startswith(('hev', 'hvc', 'h265')):
+        return 'hevc'
+    if codec.startswith(('mp4a', 'aac')):
+        return 'aac'
+    if codec.startswith('opus'):
+        return 'opus'
+    return codec.split('.')[0] or 'unknown'
+
+
+def has_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none') and bool(fmt.get('height'))
+
+
+def has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none')
+
+
+# Bitrate in kbit/s, derived from the size when yt-dlp didn't report one
+def format_bitrate(fmt, duration):
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if tbr:
+        return tbr
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size and duration:
+        return size * 8 / 1000 / duration
+    return 0
+
+
+# Size in bytes from the exact size, yt-dlp's approximation, or bitrate x duration
+def format_bytes(fmt, duration):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if tbr and duration:
+        return tbr * 1000 / 8 * duration
+    return None
+
+
+# One downloadable choice: a progressive format or a video+audio pair
+class Candidate:
+    def __init__(self, video, audio, duration):
+        self.video = video
+        self.audio = audio
+        self.height = video['height']
+        self.fps = video.get('fps') or 0
+        self.codec = codec_family(video.get('vcodec'))
+        self.bitrate = format_bitrate(video, duration)
+
+        video_bytes = format_bytes(video, duration)
+        if audio is None:
+            self.bytes = video_bytes
+        else:
+            self.bitrate += format_bitrate(audio, duration)
+            audio_bytes = format_bytes(audio, duration)
+            self.bytes = video_bytes + audio_bytes if video_bytes and audio_bytes else None
+
+    @property
+    def format_id(self):
+        if self.audio is None:
+            return self.video['format_id']
+        return f"{self.video['format_id']}+{self.audio['format_id']}"
+
+    @property
+    def ext(self):
+        if self.audio is None:
+            return self.video.get('ext', 'mp4')
+        return merge_container(self.video, self.audio)
+
+
+# Container for merging a video and audio stream without re-encoding
+def merge_container(video, audio):
+    video_ext = video.get('ext')
+    if audio.get('ext') in COMPATIBLE_AUDIO.get(video_ext, ()):
+        return video_ext
+    return 'mkv'
+
+
+class FormatIndex:
+    def __init__(self, info):
+        self.duration = info.get('duration') or 0
+        self.progressive = {}  # height -> [formats]
+        self.video_only = {}   # height -> [formats]
+        self.audio_only = []
+
+        for fmt in info.get('formats') or []:
+            if not fmt.get('format_id'):
+                continue
+            if has_video(fmt) and has_audio(fmt):
+                self.progressive.setdefault(fmt['height'], []).append(fmt)
+            elif has_video(fmt):
+                self.video_only.setdefault(fmt['height'], []).append(fmt)
+            elif has_audio(fmt):
+                self.audio_only.append(fmt)
+
+        # Highest bitrate first, so the first compatible match is the best one
+        self.audio_only.sort(key=lambda f: format_bitrate(f, self.duration), reverse=True)
+
+    # Highest-bitrate audio, optionally limited to a container or codec
+    # family, or compatible with a video stream's container
+    def best_audio(self, video=None, ext=None, codec=None):
+        if not self.audio_only:
+            return None
+        if ext or codec:
+            for fmt in self.audio_only:
+                if (not ext or fmt.get('ext') == ext) and (not codec or codec_family(fmt.get('acodec')) == codec):
+                    return fmt
+            return None
+        if video is not None:
+            compatible = COMPATIBLE_AUDIO.get(video.get('ext'), ())
+            for fmt in self.audio_only:
+                if fmt.get('ext') in compatible:
+                    return fmt
+        return self.audio_only[0]
+
+    def candidates(self, height, allow_merge):
+        found = [Candidate(fmt, None, self.duration) for fmt in self.progressive.get(height, [])]
+        if allow_merge:
+            for fmt in self.video_only.get(height, []):
+                audio = self.best_audio(fmt)
+                if audio is not None:
+                    found.append(Candidate(fmt, audio, self.duration))
+        return found
+
+    def heights(self, allow_merge):
+        heights = set(self.progressive)
+        if allow_merge and self.audio_only:
+            heights.update(self.video_only)
+        return sorted(heights, reverse=True)
+
+    # Best choice at the highest available height <= target_height.
+    # By default the highest bitrate wins; with prefer_small the codec that
+    # needs the fewest bytes for that resolution wins instead.
+    def best(self, target_height, allow_merge=True, prefer_small=False):
+        for height in self.heights(allow_merge):
+            if height > target_height:
+                continue
+            candidates = self.candidates(height, allow_merge)
+            if not candidates:
+                continue
+            if prefer_small:
+                sized = [c for c in candidates if c.bytes]
+                if sized:
+                    return min(sized, key=lambda c: (c.bytes, -c.fps))
+            return max(candidates, key=lambda c: (c.fps, c.bitrate, c.audio is None))
+        return None
+
+
+# Build the {label: format} options shown in the UI, one per resolution tier
+# that actually has a matching format. With allow_split (for hosts without
+# FFmpeg), tiers above the best progressive format get a video+audio pair
+# that is delivered as two files in a ZIP instead of being merged.
+def select_formats(info, allow_merge=True, prefer_small=False, allow_split=False):
+    index = FormatIndex(info)
+    targets = list(RESOLUTION_TIERS.values())
+
+    # A split pair (separate files for the user to merge) is only worth it
+    # above every progressive format, not to fill gaps between them
+    best_progressive = max(index.progressive, default=0)
+
+    formats = {}
+    for position, (name, target_height) in enumerate(RESOLUTION_TIERS.items()):
+        choice = index.best(target_height, allow_merge, prefer_small)
+        split = False
+        if allow_split and not allow_merge:
+            pair = index.best(target_height, True, prefer_small)
+            if pair is not None and pair.audio is not None and pair.height > best_progressive:
+                choice, split = pair, True
+        if choice is None:
+            continue
+
+        # Skip tiers that would only repeat the next lower tier's format
+        lower_target = targets[position + 1] if position + 1 < len(targets) else 0
+        if choice.height <= lower_target:
+            continue
+
+        formats[name] = {
+            'format_id': choice.format_id,
+            'size': choice.bytes,
+            'height': choice.height,
+            'ext': choice.ext,
+            'vcodec': choice.codec,
+            'merge': choice.audio is not None and not split,
+        }
+        if split:
+            formats[name].update(ext='zip', needs_ffmpeg=True)
+
+    return formats, index
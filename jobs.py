@@ -0,0 +1,183 @@
+import contextvars
+import threading
+import time
+import traceback
+import uuid
+
+import config
+from metrics import get_metrics
+from scheduler import Scheduler, Task
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# The job whose worker is running the current code
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+def current_job():
+    return _current_job.get()
+
+
+# Raised from a cancelled job's progress callback to stop its work. Like
+# KeyboardInterrupt it isn't an Exception, so the `except Exception` retry
+# and error handling along the way (ours and yt-dlp's) lets it through.
+class JobCancelled(BaseException):
+    pass
+
+
+# State of one background job. Workers update it through `update`;
+# the UI only ever reads it.
+class Job:
+    def __init__(self, job_id, session_id, meta):
+        self.id = job_id
+        self.session_id = session_id
+        self.meta = meta
+        self.state = QUEUED
+        self.progress = 0.0
+        self.status_text = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def update(self, progress=None, text=None):
+        if progress is not None:
+            self.progress = min(max(progress, 0.0), 1.0)
+        if text is not None:
+            self.status_text = text
+
+    # The progress callback handed to the job's function; once the job is
+    # cancelled every call raises JobCancelled, even one without arguments
+    def report(self, progress=None, text=None):
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.update(progress, text)
+
+
+# Runs jobs on a bounded thread pool and keeps their state in memory so any
+# rerun (or a reloaded browser tab) can pick them up again by ID.
+# Jobs are started by a Scheduler (see scheduler.py): sessions take turns,
+# and a job whose meta has 'estimated_bytes' waits until that much disk is
+# free in the work directory.
+class JobRegistry:
+    def __init__(self, max_workers, retention, session_max_workers=0, disk_path=None, disk_reserve=0):
+        self.retention = retention
+        self._scheduler = Scheduler(
+            max_workers,
+            session_max_running=session_max_workers,
+            disk_path=disk_path,
+            disk_reserve=disk_reserve,
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Queue `fn(*args, progress_callback=..., **kwargs)` and return its job ID.
+    # Whatever `fn` returns becomes `job.result`.
+    def submit(self, fn, *args, session_id=None, meta=None, **kwargs):
+        job = Job(uuid.uuid4().hex, session_id, meta or {})
+        with self._lock:
+            self._prune_locked(time.time())
+            self._jobs[job.id] = job
+        self._scheduler.submit(Task(
+            job.id,
+            session_id,
+            lambda: self._run(job, fn, args, kwargs),
+            estimated_bytes=job.meta.get('estimated_bytes'),
+            notify=lambda text: job.update(text=text),
+            reject=lambda message: self._fail(job, message),
+            # Download progress stands in for the bytes written so far
+            written=lambda: job.progress * (job.meta.get('estimated_bytes') or 0),
+        ))
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for_session(self, session_id):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    # Ask a job to stop; it fails with "Cancelled" the next time it reports
+    # progress (or right away if it hasn't started). Returns False if there
+    # is no such job or it already finished.
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_requested = True
+        job.update(text="Cancelling...")
+        if self._scheduler.remove(job.id):
+            self._fail(job, "Cancelled")
+        return True
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    # End a job that never started
+    def _fail(self, job, message):
+        job.error = message
+        job.state = FAILED
+        job.finished_at = time.time()
+
+    def _run(self, job, fn, args, kwargs):
+        job.state = RUNNING
+        job.started_at = time.time()
+        job.update(text="Starting download...")
+        get_metrics().add_phase('queued', job.started_at - job.created_at)
+        token = _current_job.set(job)
+        with get_metrics().job_trace(job):
+            try:
+                job.report()
+                job.result = fn(*args, progress_callback=job.report, **kwargs)
+                job.update(progress=1.0, text="Done")
+                job.state = DONE
+            except JobCancelled:
+                job.error = "Cancelled"
+                job.state = FAILED
+            except Exception as e:
+                job.error = str(e)
+                job.traceback = traceback.format_exc()
+                job.state = FAILED
+            finally:
+                job.finished_at = time.time()
+        _current_job.reset(token)
+
+    def _prune_locked(self, now):
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+# Process-wide registry shared by every Streamlit session
+def get_job_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = JobRegistry(
+                max_workers=config.JOB_WORKERS,
+                retention=config.JOB_RETENTION,
+                session_max_workers=config.SCHEDULER_SESSION_MAX_JOBS,
+                disk_path=config.WORK_DIR,
+                disk_reserve=config.SCHEDULER_DISK_RESERVE,
+            )
+        return _registry
@@ -1,14 +1,44 @@
+import time
+
+# Taken before anything else is imported, for the startup timing report
+script_started = time.perf_counter()
+
 import streamlit as st
-import yt_dlp
+import csv
+import io
 import os
-from pathlib import Path
-import re
-import time
-import datetime
-import base64
-import tempfile
-import shutil
-import subprocess
+import uuid
+
+import config
+import startup
+from bulk import parse_url_list
+from capabilities import get_capabilities
+from clips import clip_label, clip_size, format_timestamp, parse_clip
+from core import (
+    VideoInfoError,
+    clip_conflict,
+    format_size,
+    get_mime_type,
+    get_video_info,
+    job_download_filename,
+    pick_format,
+    submit_bulk_info,
+    submit_download,
+)
+from delivery import artifact_url, get_artifact_store, start_delivery_server
+from jobs import DONE, FAILED, get_job_registry
+from metadata_cache import get_metadata_cache
+from metrics import get_metrics, start_metrics_server
+from size_estimator import get_size_estimator
+from thumbnails import get_thumbnail_cache
+from url_utils import is_playlist_url
+
+# yt-dlp is imported lazily where it's used; start loading it in the
+# background now so the first fetch doesn't have to wait for it
+startup.warm_up_imports()
+new_session = 'session_id' not in st.session_state
+timer = startup.ScriptTimer(script_started, new_session)
+timer.mark("imports")
 
 # Page configuration
 st.set_page_config(
@@ -22,366 +52,101 @@ st.title("YouTube HD Downloader")
 st.write("Download high-quality videos")
 
 # Initialize session state
-if 'download_started' not in st.session_state:
-    st.session_state.download_started = False
-if 'download_complete' not in st.session_state:
-    st.session_state.download_complete = False
-if 'download_error' not in st.session_state:
-    st.session_state.download_error = None
-if 'download_path' not in st.session_state:
-    st.session_state.download_path = None
-if 'filename' not in st.session_state:
-    st.session_state.filename = None
+if 'job_id' not in st.session_state:
+    # Reattach to a background download after a browser reload
+    st.session_state.job_id = st.query_params.get('job')
+if 'delivered_job' not in st.session_state:
+    st.session_state.delivered_job = None
 if 'video_info' not in st.session_state:
     st.session_state.video_info = None
 if 'download_data' not in st.session_state:
     st.session_state.download_data = None
-if 'ffmpeg_available' not in st.session_state:
-    # Check if FFmpeg is available
+if 'download_token' not in st.session_state:
+    st.session_state.download_token = None
+if 'download_too_large' not in st.session_state:
+    st.session_state.download_too_large = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'bulk_job_id' not in st.session_state:
+    st.session_state.bulk_job_id = None
+timer.mark("session state")
+
+# FFmpeg/ffprobe are probed once per process and refreshed in the background
+ffmpeg_available = get_capabilities().ffmpeg_available
+timer.mark("capabilities")
+
+# Start the file delivery server (once per process)
+delivery_mode = config.DELIVERY_MODE
+if delivery_mode == "stream":
     try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        st.session_state.ffmpeg_available = True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        st.session_state.ffmpeg_available = False
+        start_delivery_server()
+    except OSError as e:
+        st.warning(f"File streaming is unavailable ({e}). Falling back to in-memory downloads.")
+        delivery_mode = "memory"
+timer.mark("delivery server")
+
+# Prometheus metrics on a local port (once per process). If the port is
+# taken, metrics are still collected, just not served.
+try:
+    start_metrics_server()
+except OSError:
+    pass
 
 # Input for YouTube URL
 youtube_url = st.text_input("Enter YouTube Video URL:", placeholder="https://www.youtube.com/watch?v=...")
 
-# Clean ANSI color codes from text
-def clean_ansi(text):
-    if not text:
-        return ""
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+# Poll a running job and redraw its progress without rerunning the whole page
+@st.fragment(run_every=config.JOB_POLL_INTERVAL)
+def show_job_progress(job_id):
+    job = get_job_registry().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.progress, text=job.status_text)
+    if not job.cancel_requested and st.button("Cancel", key=f"cancel_{job_id}"):
+        get_job_registry().cancel(job_id)
 
-# Function to get video info
-def get_video_info(url):
-    try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Create format options with sizes
-            formats = {}
-            
-            # Get all available formats with both video and audio
-            available_formats = []
-            for fmt in info.get('formats', []):
-                # Only include formats that have both video and audio
-                if fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none':
-                    height = fmt.get('height', 0)
-                    if height > 0:  # Only include formats with valid height
-                        available_formats.append({
-                            'format_id': fmt['format_id'],
-                            'height': height,
-                            'ext': fmt.get('ext', 'mp4'),
-                            'filesize': fmt.get('filesize', 0)
-                        })
-            
-            # Sort by height (resolution)
-            available_formats.sort(key=lambda x: x['height'], reverse=True)
-            
-            # Group by common resolutions
-            resolution_groups = {
-                "2160p (4K)": 2160,
-                "1440p (2K)": 1440,
-                "1080p (Full HD)": 1080,
-                "720p (HD)": 720,
-                "480p": 480,
-                "360p": 360,
-                "240p": 240,
-                "144p": 144
-            }
-            
-            # Find the best format for each resolution group
-            for name, target_height in resolution_groups.items():
-                best_format = None
-                
-                # Find the highest quality format that doesn't exceed the target height
-                for fmt in available_formats:
-                    if fmt['height'] <= target_height:
-                        if best_format is None or fmt['height'] > best_format['height']:
-                            best_format = fmt
-                
-                if best_format:
-                    # Calculate estimated size
-                    size = best_format.get('filesize', 0)
-                    if not size:
-                        size = estimate_size(info, best_format['format_id'], best_format['height'])
-                    
-                    formats[name] = {
-                        'format_id': best_format['format_id'],
-                        'size': size,
-                        'height': best_format['height'],
-                        'ext': best_format['ext']
-                    }
-            
-            # Add audio-only option
-            formats["Audio Only (MP3)"] = {
-                'format_id': 'bestaudio',
-                'size': estimate_size(info, 'bestaudio', 0, audio_only=True),
-                'height': 'Audio',
-                'ext': 'mp3'
-            }
-            
-            return {
-                'id': info.get('id', 'unknown'),
-                'title': info.get('title', 'Unknown'),
-                'channel': info.get('uploader', 'Unknown'),
-                'duration': info.get('duration', 0),
-                'views': info.get('view_count', 0),
-                'thumbnail': info.get('thumbnail', ''),
-                'formats': formats
-            }
-    except Exception as e:
-        st.error(f"Error fetching video info: {str(e)}")
-        return None
+BULK_STATUS = {'queued': "⏳ Queued", 'fetching': "🔄 Fetching", 'done': "✅ Ready", 'error': "❌ Failed"}
 
-# Estimate file size based on resolution and duration
-def estimate_size(info, format_id, height=None, audio_only=False):
-    try:
-        duration = info.get('duration', 0)
-        if not duration:
-            return None
-        
-        # Estimate size based on resolution and duration
-        if audio_only:
-            # Audio: ~1MB per minute
-            return duration * 1024 * 1024 / 60
-        elif height is not None:  # Check if height is not None
-            # Video: size depends on resolution
-            if height >= 2160:
-                return duration * 20 * 1024 * 1024 / 60  # ~20MB per minute for 4K
-            elif height >= 1440:
-                return duration * 15 * 1024 * 1024 / 60  # ~15MB per minute for 2K
-            elif height >= 1080:
-                return duration * 10 * 1024 * 1024 / 60  # ~10MB per minute for 1080p
-            elif height >= 720:
-                return duration * 5 * 1024 * 1024 / 60   # ~5MB per minute for 720p
-            elif height >= 480:
-                return duration * 2.5 * 1024 * 1024 / 60 # ~2.5MB per minute for 480p
-            elif height >= 240:
-                return duration * 1.2 * 1024 * 1024 / 60 # ~1.2MB per minute for 240p
-            else:
-                return duration * 0.8 * 1024 * 1024 / 60 # ~0.8MB per minute for 144p
-        else:
-            # Default estimate: ~5MB per minute
-            return duration * 5 * 1024 * 1024 / 60
-    except:
-        # If estimation fails, return None
-        return None
+# One table row per unique URL of a bulk fetch
+def bulk_table(rows):
+    table = []
+    for position, row in enumerate(rows, start=1):
+        info = row['info']
+        entry = {
+            '#': position,
+            'Status': BULK_STATUS[row['status']],
+            'Title': info['title'] if info else "",
+            'Channel': info['channel'] if info else "",
+            'Length': f"{info['duration'] // 60}m {info['duration'] % 60}s" if info and info['duration'] else "",
+            'Best quality': "",
+            'Size': "",
+            'URL': row['url'],
+            'Duplicates': len(row['given']) - 1,
+            'Error': row['error'] or "",
+        }
+        if info and info['formats']:
+            try:
+                label, best = pick_format(info, 'best')
+            except ValueError:
+                label, best = next(iter(info['formats'].items()))
+            entry['Best quality'] = label
+            entry['Size'] = format_size(best['size'])
+        table.append(entry)
+    return table
 
-# Format file size for display
-def format_size(size_bytes):
-    if size_bytes is None:  # Check if size_bytes is None
-        return "Unknown size"
-    
-    if size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.1f} KB"
-    elif size_bytes < 1024 * 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.1f} MB"
-    else:
-        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
-
-# Function to download video
-def download_video(url, format_id, quality, selected_format):
-    try:
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
-        
-        # Create progress indicators
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        def progress_hook(d):
-            if d['status'] == 'downloading':
-                # Calculate progress
-                progress = 0  # Default to 0
-                
-                # Safely calculate progress
-                if 'total_bytes' in d and d['total_bytes'] and d['total_bytes'] > 0:
-                    progress = d['downloaded_bytes'] / d['total_bytes']
-                elif 'total_bytes_estimate' in d and d['total_bytes_estimate'] and d['total_bytes_estimate'] > 0:
-                    progress = d['downloaded_bytes'] / d['total_bytes_estimate']
-                
-                # Update progress bar
-                progress_bar.progress(min(progress, 1.0))
-                
-                # Update status text (clean up ANSI codes)
-                percent = d.get('_percent_str', '0%')
-                percent = clean_ansi(percent).strip()
-                
-                speed = d.get('_speed_str', '0 B/s')
-                speed = clean_ansi(speed).strip()
-                
-                status_text.text(f"Downloading: {percent} at {speed}")
-            
-            elif d['status'] == 'finished':
-                progress_bar.progress(1.0)
-                status_text.text("Processing video... Almost done!")
-        
-        # Generate a timestamp-based filename to ensure it appears at the top in file explorer
-        current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Determine if this is a playlist
-        is_playlist = False
-        if "playlist" in url.lower() or "&list=" in url:
-            is_playlist = True
-            
-        # Prepare filename template with playlist index if needed
-        if is_playlist:
-            filename_template = os.path.join(temp_dir, f"{current_time}_(1)_%(title)s.%(ext)s")
-        else:
-            filename_template = os.path.join(temp_dir, f"{current_time}_%(title)s.%(ext)s")
-        
-        # For audio-only downloads
-        if "Audio Only" in quality:
-            ydl_opts = {
-                'format': 'bestaudio',
-                'outtmpl': filename_template,
-                'progress_hooks': [progress_hook],
-                'noplaylist': not is_playlist,
-                # Try to extract audio without FFmpeg if possible
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                # Important: Don't abort if FFmpeg is not available
-                'ignoreerrors': True,
-                'abort_on_error': False
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                try:
-                    info = ydl.extract_info(url, download=True)
-                    if info is None:
-                        raise Exception("Failed to extract video information")
-                    
-                    # Handle playlist vs single video differently
-                    if is_playlist and 'entries' in info:
-                        # For playlists, we'll just take the first successful download
-                        for entry in info['entries']:
-                            if entry:
-                                filename = ydl.prepare_filename(entry)
-                                break
-                    else:
-                        # For single videos
-                        filename = ydl.prepare_filename(info)
-                    
-                    # Find the downloaded file
-                    # Try with mp3 extension first (if FFmpeg worked)
-                    mp3_filename = os.path.splitext(filename)[0] + '.mp3'
-                    mp3_path = os.path.join(temp_dir, os.path.basename(mp3_filename))
-                    
-                    if os.path.exists(mp3_path):
-                        return os.path.basename(mp3_path), mp3_path
-                    
-                    # If mp3 not found, look for any audio file
-                    for file in os.listdir(temp_dir):
-                        file_path = os.path.join(temp_dir, file)
-                        if os.path.isfile(file_path):
-                            return os.path.basename(file_path), file_path
-                    
-                    raise Exception("Downloaded file not found")
-                    
-                except Exception as e:
-                    # If the first attempt fails, try with a simpler approach
-                    status_text.text("Retrying with a different method...")
-                    
-                    # Try a simpler approach without FFmpeg
-                    simple_ydl_opts = {
-                        'format': 'bestaudio',
-                        'outtmpl': filename_template,
-                        'progress_hooks': [progress_hook],
-                        'noplaylist': not is_playlist,
-                        # No postprocessors
-                    }
-                    
-                    with yt_dlp.YoutubeDL(simple_ydl_opts) as simple_ydl:
-                        info = simple_ydl.extract_info(url, download=True)
-                        if info is None:
-                            raise Exception("Failed to extract video information")
-                        
-                        # Handle playlist vs single video differently
-                        if is_playlist and 'entries' in info:
-                            # For playlists, we'll just take the first successful download
-                            for entry in info['entries']:
-                                if entry:
-                                    filename = simple_ydl.prepare_filename(entry)
-                                    break
-                        else:
-                            # For single videos
-                            filename = simple_ydl.prepare_filename(info)
-                        
-                        # Find the downloaded file
-                        final_path = os.path.join(temp_dir, os.path.basename(filename))
-                        if not os.path.exists(final_path):
-                            # Try to find the file with a similar name
-                            for file in os.listdir(temp_dir):
-                                file_path = os.path.join(temp_dir, file)
-                                if os.path.isfile(file_path):
-                                    final_path = file_path
-                                    break
-                        
-                        return os.path.basename(final_path), final_path
-        
-        # For video downloads
-        else:
-            # Use the specific format ID that we know has both video and audio
-            ydl_opts = {
-                'format': format_id,
-                'outtmpl': filename_template,
-                'progress_hooks': [progress_hook],
-                'noplaylist': not is_playlist,
-                # Important: Don't abort if FFmpeg is not available
-                'ignoreerrors': True,
-                'abort_on_error': False
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                if info is None:
-                    raise Exception("Failed to extract video information")
-                
-                # Handle playlist vs single video differently
-                if is_playlist and 'entries' in info:
-                    # For playlists, we'll just take the first successful download
-                    for entry in info['entries']:
-                        if entry:
-                            filename = ydl.prepare_filename(entry)
-                            break
-                else:
-                    # For single videos
-                    filename = ydl.prepare_filename(info)
-                
-                # Find the downloaded file
-                final_path = os.path.join(temp_dir, os.path.basename(filename))
-                if not os.path.exists(final_path):
-                    # Try to find the file with a similar name
-                    for file in os.listdir(temp_dir):
-                        file_path = os.path.join(temp_dir, file)
-                        if os.path.isfile(file_path):
-                            final_path = file_path
-                            break
-                
-                return os.path.basename(final_path), final_path
-    
-    except Exception as e:
-        # Clean up temp directory
-        try:
-            shutil.rmtree(temp_dir)
-        except:
-            pass
-        raise Exception(f"Download failed: {str(e)}")
+# Redraw the bulk results table while the fetch runs
+@st.fragment(run_every=config.JOB_POLL_INTERVAL)
+def show_bulk_progress(job_id):
+    job = get_job_registry().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.progress, text=job.status_text)
+    if not job.cancel_requested and st.button("Cancel", key=f"cancel_{job_id}"):
+        get_job_registry().cancel(job_id)
+    st.dataframe(bulk_table(job.meta['rows']), hide_index=True)
 
 # Show FFmpeg status
-if not st.session_state.ffmpeg_available:
+if not ffmpeg_available:
     st.info("ℹ️ FFmpeg is not installed on the server. High-resolution videos (720p+) will be downloaded as separate video and audio files that you can play together.")
 
 # Always show the "Fetch Video Info" button
@@ -390,15 +155,16 @@ if st.button("Fetch Video Info"):
         with st.spinner("Fetching video information..."):
             try:
                 start_time = time.time()
-                st.session_state.video_info = get_video_info(youtube_url)
+                st.session_state.video_info = get_video_info(youtube_url, ffmpeg_available)
                 fetch_time = time.time() - start_time
                 
-                if st.session_state.video_info:
-                    st.success(f"Video information fetched in {fetch_time:.2f} seconds")
-                else:
-                    st.error("Failed to fetch video information. Please check the URL and try again.")
-            except Exception as e:
-                st.error(f"Error fetching video info: {str(e)}")
+                st.success(f"Video information fetched in {fetch_time:.2f} seconds")
+                cache_stats = get_metadata_cache().stats()
+                st.caption(f"Metadata cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+            except VideoInfoError as e:
+                st.session_state.video_info = None
+                st.error(str(e))
+                st.error("Failed to fetch video information. Please check the URL and try again.")
     else:
         st.error("Please enter a YouTube URL first")
 
@@ -413,7 +179,9 @@ if st.session_state.video_info:
     
     with col1:
         if video_info['thumbnail']:
-            st.image(video_info['thumbnail'], width=180)
+            # Scaled down and cached on the server (see thumbnails.py)
+            thumbnail, _ = get_thumbnail_cache().get(video_info['id'], video_info['thumbnail'])
+            st.image(thumbnail, width=180)
         else:
             st.write("No thumbnail available")
     
@@ -440,106 +208,224 @@ if st.session_state.video_info:
     if selected_format['height'] in [1440, 2160]:
         st.warning(f"⚠️ **Note:** {selected_quality} videos may not play smoothly on some devices due to high resolution. VLC or a powerful media player is recommended.")
     
+    # Clip mode: download only part of the video (FFmpeg cuts it)
+    clip = None
+    if ffmpeg_available and not is_playlist_url(youtube_url) and video_info['duration']:
+        if st.checkbox("Download only part of the video"):
+            clip_col1, clip_col2 = st.columns(2)
+            with clip_col1:
+                clip_start = st.text_input("Start", value="0:00", help="h:mm:ss, m:ss or seconds")
+            with clip_col2:
+                clip_end = st.text_input("End", value=format_timestamp(video_info['duration']))
+            try:
+                clip = parse_clip(clip_start, clip_end, video_info['duration'])
+            except ValueError as e:
+                st.error(str(e))
+                clip = None
+            conflict = clip_conflict(selected_format) if clip else None
+            if conflict:
+                st.error(conflict)
+            elif clip:
+                st.caption(f"Only {clip_label(clip)} is downloaded. Cuts are made without re-encoding, "
+                           "so the clip may start a few seconds early.")
+    
     # Show file size
-    size_str = format_size(selected_format['size'])
+    size_str = format_size(clip_size(selected_format['size'], video_info['duration'], clip))
     st.info(f"File size: **{size_str}**")
+    size_source = selected_format.get('size_source')
+    if size_source == 'model':
+        accuracy = get_size_estimator().error_stats().get('model')
+        if accuracy and accuracy['samples'] >= 5:
+            st.caption(f"Estimated from past downloads (typically within ±{accuracy['mean_abs_error_pct']:.0f}%)")
+        else:
+            st.caption("Estimated from past downloads")
+    elif size_source == 'default':
+        st.caption("Rough estimate based on resolution and length")
     
     # Special note for formats that need FFmpeg but it's not available
     if selected_format.get('needs_ffmpeg', False):
         st.info("📝 This quality will download as separate video and audio files in a ZIP archive. Instructions for playing them together will be included.")
     
     # Check if URL is a playlist
-    is_playlist = "playlist" in youtube_url.lower() or "&list=" in youtube_url
+    is_playlist = is_playlist_url(youtube_url)
+    whole_playlist = False
     if is_playlist:
-        st.info("📋 This appears to be a playlist. The first video will be downloaded.")
+        playlist_mode = st.radio(
+            "📋 This appears to be a playlist. What should be downloaded?",
+            ["First video only", "Whole playlist (ZIP)"],
+        )
+        whole_playlist = playlist_mode == "Whole playlist (ZIP)"
+        if whole_playlist:
+            st.info(f"Videos will be downloaded {config.PLAYLIST_CONCURRENCY} at a time and packed into a ZIP file.")
     
     # Download button - always visible
     if st.button("Download Now", type="primary"):
-        st.session_state.download_started = True
-        st.session_state.download_complete = False
-        st.session_state.download_error = None
-        st.session_state.download_data = None
-        
+        # Downloads run in a background worker so this session stays responsive
+        # and the job survives reruns and browser reloads
         try:
-            # Start download with spinner
-            with st.spinner("Downloading video..."):
-                format_id = video_info['formats'][selected_quality]['format_id']
-                filename, filepath = download_video(youtube_url, format_id, selected_quality, selected_format)
-            
-            # Update session state
-            st.session_state.download_complete = True
-            st.session_state.filename = filename
-            st.session_state.download_path = filepath
-            
-            # Read the file data for download link
-            with open(filepath, 'rb') as f:
-                st.session_state.download_data = f.read()
-            
-            # Clean up the file
-            try:
-                os.remove(filepath)
-                os.path.dirname(filepath) and shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
-            except:
-                pass
-            
-            # Force refresh
-            st.rerun()
+            st.session_state.job_id = submit_download(
+                youtube_url,
+                video_info,
+                selected_quality,
+                st.session_state.session_id,
+                whole_playlist=whole_playlist,
+                clip=clip,
+            )
+            st.query_params['job'] = st.session_state.job_id
+        except ValueError as e:
+            st.error(str(e))
+
+# Show download status
+job = get_job_registry().get(st.session_state.job_id) if st.session_state.job_id else None
+if job is not None:
+    if not job.finished:
+        st.subheader(f"Downloading: {job.meta['title']}")
+        show_job_progress(job.id)
+    
+    elif job.state == FAILED and job.cancel_requested:
+        st.info("Download cancelled.")
+    
+    elif job.state == FAILED:
+        st.error(f"Download failed: {job.error}")
         
-        except Exception as e:
-            st.session_state.download_error = str(e)
+        # Provide more specific error guidance
+        error_msg = str(job.error).lower()
+        if "http error 403" in error_msg:
+            st.error("This video may be restricted or not available for download.")
+        elif "signature" in error_msg:
+            st.error("YouTube may have changed their system. Try updating yt-dlp.")
+        elif "network" in error_msg or "connection" in error_msg:
+            st.error("Network error. Check your internet connection and try again.")
     
-    # Show download status
-    if st.session_state.download_started:
-        if st.session_state.download_error:
-            st.error(f"Download failed: {st.session_state.download_error}")
-            
-            # Provide more specific error guidance
-            error_msg = str(st.session_state.download_error).lower()
-            if "http error 403" in error_msg:
-                st.error("This video may be restricted or not available for download.")
-            elif "signature" in error_msg:
-                st.error("YouTube may have changed their system. Try updating yt-dlp.")
-            elif "network" in error_msg or "connection" in error_msg:
-                st.error("Network error. Check your internet connection and try again.")
+    elif job.state == DONE:
+        store = get_artifact_store()
         
-        elif st.session_state.download_complete and st.session_state.download_data:
-            st.success("✅ Download Complete!")
+        # Hand the finished file over to this session (once per job)
+        if st.session_state.delivered_job != job.id:
+            if st.session_state.download_token and st.session_state.download_token != job.result['token']:
+                store.discard(st.session_state.download_token)
+            st.session_state.download_token = job.result['token']
+            st.session_state.download_data = None
+            st.session_state.download_too_large = None
+            st.session_state.delivered_job = job.id
             
-            # Determine file extension and mime type
-            filename = st.session_state.filename
-            file_ext = os.path.splitext(filename)[1][1:] if '.' in filename else 'mp4'
-            mime_type = f"video/{file_ext}" if file_ext != "mp3" else "audio/mp3"
-            
-            # Create a safe filename
-            safe_title = re.sub(r'[^\w\-_\. ]', '_', video_info['title'])
-            
-            # Add (1) for playlist items
-            if is_playlist:
-                download_filename = f"{safe_title} (1).{file_ext}"
-            else:
-                download_filename = f"{safe_title}.{file_ext}"
-            
-            # Create a download button
+            # Files stay on disk and are streamed by the delivery server.
+            # In "memory" mode files within the session's memory budget are
+            # read into the session; bigger ones are only streamed if the
+            # browser can reach the server (a public URL is configured), and
+            # never loaded into memory.
+            artifact = store.acquire(job.result['token'])
+            if artifact is not None and delivery_mode == "memory":
+                if artifact.size <= config.DELIVERY_SESSION_MEMORY_BUDGET:
+                    with get_metrics().span('delivery', mode='memory'):
+                        st.session_state.download_data = artifact.read()
+                    get_metrics().inc('ytdl_delivery_bytes_total', len(st.session_state.download_data), mode='memory')
+                elif config.DELIVERY_PUBLIC_URL:
+                    try:
+                        start_delivery_server()
+                    except OSError:
+                        st.session_state.download_too_large = artifact.size
+                else:
+                    st.session_state.download_too_large = artifact.size
+            if artifact is not None:
+                store.release(artifact)
+                if st.session_state.download_data or st.session_state.download_too_large:
+                    store.discard(job.result['token'])
+                    st.session_state.download_token = None
+        
+        st.success("✅ Download Complete!")
+        if job.result.get('cached'):
+            st.caption("This file was already on the server, so it was ready instantly.")
+        
+        # Determine file extension and mime type
+        filename = job.result['filename']
+        file_ext = os.path.splitext(filename)[1][1:] if '.' in filename else 'mp4'
+        mime_type = get_mime_type(filename)
+        download_filename = job_download_filename(job)
+        
+        # Create a download button
+        if st.session_state.download_data:
             st.download_button(
                 label="⬇️ Download File",
                 data=st.session_state.download_data,
                 file_name=download_filename,
                 mime=mime_type
             )
+        elif st.session_state.download_too_large:
+            st.error(
+                f"This file is {format_size(st.session_state.download_too_large)}, more than the "
+                f"{format_size(config.DELIVERY_SESSION_MEMORY_BUDGET)} this server hands over in the browser session. "
+                "Choose a lower quality or a clip, or ask the administrator to enable streamed downloads "
+                "(YTDL_DELIVERY_PUBLIC_URL)."
+            )
+        elif store.has(st.session_state.download_token):
+            st.link_button(
+                "⬇️ Download File",
+                artifact_url(st.session_state.download_token, download_filename),
+            )
+        else:
+            st.warning("This file has expired. Click \"Download Now\" to fetch it again.")
+        
+        # Playlist archives hold one file per video
+        if job.meta.get('whole_playlist'):
+            st.info("This ZIP file contains every video of the playlist. Any videos that could not be downloaded are listed in FAILED.txt inside it.")
+        
+        # Special instructions for ZIP files (separate video/audio)
+        elif file_ext == "zip":
+            st.info("""
+            **Important: This download contains separate video and audio files**
             
-            # Special instructions for ZIP files (separate video/audio)
-            if file_ext == "zip":
-                st.info("""
-                **Important: This download contains separate video and audio files**
-                
-                1. Extract the ZIP file after downloading
-                2. Read the included README.txt file for instructions
-                3. You can play both files together using VLC Media Player
-                """)
+            1. Extract the ZIP file after downloading
+            2. Read the included README.txt file for instructions
+            3. You can play both files together using VLC Media Player
+            """)
+        
+        # For high-resolution videos, add a playback tip
+        elif job.meta['height'] in [1440, 2160]:
+            st.warning("For smooth playback of high-resolution videos, use VLC Media Player or another powerful video player.")
+
+# Bulk mode: metadata for a whole list of URLs, fetched in parallel
+with st.expander("Bulk mode: fetch info for a list of URLs", expanded=bool(st.session_state.bulk_job_id)):
+    bulk_text = st.text_area("Paste YouTube URLs (one per line):", height=150)
+    bulk_file = st.file_uploader("Or upload a text or CSV file with URLs:", type=["txt", "csv"])
+    
+    if st.button("Fetch All"):
+        text = bulk_text
+        if bulk_file is not None:
+            text += "\n" + bulk_file.getvalue().decode('utf-8', errors='replace')
+        urls = parse_url_list(text)
+        if urls:
+            st.session_state.bulk_job_id = submit_bulk_info(urls, st.session_state.session_id)
+        else:
+            st.error("No YouTube URLs found in the list")
+    
+    bulk_job = get_job_registry().get(st.session_state.bulk_job_id) if st.session_state.bulk_job_id else None
+    if bulk_job is not None:
+        summary = f"{bulk_job.meta['given']} URLs, {bulk_job.meta['unique']} unique videos"
+        if bulk_job.meta['dropped']:
+            summary += f" (only the first {config.BULK_MAX_URLS} are fetched)"
+        st.caption(summary + f", fetched {config.BULK_CONCURRENCY} at a time")
+        
+        if not bulk_job.finished:
+            show_bulk_progress(bulk_job.id)
+        elif bulk_job.state == FAILED and bulk_job.cancel_requested:
+            st.info("Bulk fetch cancelled.")
+            st.dataframe(bulk_table(bulk_job.meta['rows']), hide_index=True)
+        elif bulk_job.state == FAILED:
+            st.error(f"Bulk fetch failed: {bulk_job.error}")
+        else:
+            table = bulk_table(bulk_job.meta['rows'])
+            fetched = f"Fetched {bulk_job.result['fetched']} videos"
+            if bulk_job.result['failed']:
+                fetched += f", {bulk_job.result['failed']} failed"
+            st.success(fetched)
+            st.dataframe(table, hide_index=True)
             
-            # For high-resolution videos, add a playback tip
-            elif selected_format['height'] in [1440, 2160]:
-                st.warning("For smooth playback of high-resolution videos, use VLC Media Player or another powerful video player.")
+            csv_file = io.StringIO()
+            writer = csv.DictWriter(csv_file, fieldnames=list(table[0]) if table else ['URL'])
+            writer.writeheader()
+            writer.writerows(table)
+            st.download_button("⬇️ Download Table (CSV)", csv_file.getvalue(), file_name="videos.csv", mime="text/csv")
 
 # Instructions
 with st.expander("How to use"):
@@ -559,7 +445,8 @@ with st.expander("How to use"):
     - **HD (720p)** is a good balance of quality and file size
     - **480p** and **360p** are lower quality but smaller file size
     - **240p** and **144p** are very low quality but smallest file size
-    - **Audio Only (MP3)** will extract just the audio track
+    - **Audio Only (M4A)** and **Audio Only (Opus)** save the original audio track without re-encoding
+    - **Audio Only (MP3)** converts the audio track to MP3 (needs FFmpeg)
     
     ### High-Resolution Downloads Without FFmpeg
     
@@ -580,3 +467,10 @@ with st.expander("How to use"):
 # Footer
 st.markdown("---")
 st.caption("Made with Streamlit and yt-dlp • Click the Download File button to save your video")
+
+timer.mark("page")
+startup.record_run(timer)
+
+if config.SHOW_STARTUP_TIMING:
+    with st.expander("Startup timing"):
+        st.code(startup.format_report())
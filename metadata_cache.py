@@ -0,0 +1,165 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import config
+from metrics import get_metrics
+
+
+# Two-level cache for processed video info: an in-memory LRU in front of a
+# SQLite table, so repeat lookups are fast and survive restarts.
+# Entries expire after `ttl` seconds; both layers are bounded by entry count.
+class MetadataCache:
+    def __init__(self, path, ttl, max_memory_entries, max_disk_entries):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            self._open()
+
+    def _open(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS video_info ("
+                " key TEXT PRIMARY KEY,"
+                " stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " value TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS video_info_accessed ON video_info (accessed_at)"
+            )
+            self._conn.commit()
+        except sqlite3.Error:
+            # Fall back to memory-only caching if the disk layer is unusable
+            self._conn = None
+
+    def _expired(self, stored_at, now):
+        return now - stored_at > self.ttl
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    # Look up a key, returning None on a miss or an expired entry
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    get_metrics().inc('ytdl_cache_requests_total', cache='metadata', result='hit')
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT stored_at, value FROM video_info WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        stored_at, raw = row
+                        if not self._expired(stored_at, now):
+                            value = json.loads(raw)
+                            self._conn.execute(
+                                "UPDATE video_info SET accessed_at = ? WHERE key = ?", (now, key)
+                            )
+                            self._conn.commit()
+                            self._remember(key, stored_at, value)
+                            self.hits += 1
+                            self.disk_hits += 1
+                            get_metrics().inc('ytdl_cache_requests_total', cache='metadata', result='hit')
+                            return value
+                        self._conn.execute("DELETE FROM video_info WHERE key = ?", (key,))
+                        self._conn.commit()
+                except (sqlite3.Error, ValueError):
+                    pass
+
+            self.misses += 1
+            get_metrics().inc('ytdl_cache_requests_total', cache='metadata', result='miss')
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO video_info (key, stored_at, accessed_at, value)"
+                        " VALUES (?, ?, ?, ?)",
+                        (key, now, now, json.dumps(value)),
+                    )
+                    self._prune_disk(now)
+                    self._conn.commit()
+                except (sqlite3.Error, TypeError, ValueError):
+                    pass
+
+    def _prune_disk(self, now):
+        self._conn.execute("DELETE FROM video_info WHERE stored_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM video_info WHERE key NOT IN ("
+            " SELECT key FROM video_info ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_disk_entries,),
+        )
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM video_info WHERE key = ?", (key,))
+                    self._conn.commit()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Process-wide cache shared by every Streamlit session
+def get_metadata_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache(
+                config.METADATA_CACHE_PATH,
+                ttl=config.METADATA_CACHE_TTL,
+                max_memory_entries=config.METADATA_CACHE_MEMORY_ENTRIES,
+                max_disk_entries=config.METADATA_CACHE_DISK_ENTRIES,
+            )
+        return _cache
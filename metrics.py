@@ -0,0 +1,261 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# Built-in instrumentation: counters and histograms kept in memory and
+# exposed in Prometheus text format, plus an optional JSON line per job
+# with the time each phase took.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100))
+
+# name -> (type, help, buckets)
+METRICS = {
+    'ytdl_phase_seconds': (
+        'histogram',
+        "Time spent per phase: extraction, format_selection, download, postprocessing, delivery",
+        DURATION_BUCKETS,
+    ),
+    'ytdl_phase_errors_total': ('counter', "Phases that ended with an error", None),
+    'ytdl_download_bytes_total': ('counter', "Bytes downloaded from the video host", None),
+    'ytdl_download_throughput_bytes_per_second': (
+        'histogram',
+        "Average throughput of each finished download",
+        THROUGHPUT_BUCKETS,
+    ),
+    'ytdl_delivery_bytes_total': ('counter', "Bytes handed to browsers, by delivery mode", None),
+    'ytdl_cache_requests_total': ('counter', "Cache lookups, by cache and result", None),
+    'ytdl_jobs_total': ('counter', "Finished background jobs, by kind and state", None),
+    'ytdl_coalesced_requests_total': ('counter', "Requests that joined an identical one already in flight", None),
+    'ytdl_ydl_instances_total': ('counter', "yt-dlp instances created, reused and recycled by the pool", None),
+}
+
+# The job whose worker is running the current code, so spans and counters
+# can be attributed to it
+_current_trace = contextvars.ContextVar('job_trace', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Phase timings and counters of one job, written to the job log when it ends
+class JobTrace:
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self.phases = {}    # phase -> seconds
+        self.counters = {}  # series -> value
+        self._lock = threading.Lock()
+
+    def add_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_counter(self, series, value):
+        with self._lock:
+            self.counters[series] = self.counters.get(series, 0) + value
+
+    def as_dict(self):
+        job = self.job
+        with self._lock:
+            return {
+                'job_id': job.id,
+                'session_id': job.session_id,
+                'kind': job.meta.get('kind', 'job'),
+                'meta': {key: value for key, value in job.meta.items()
+                         if isinstance(value, (str, int, float, bool, type(None)))},
+                'state': job.state,
+                'error': job.error,
+                'queued_seconds': self.started - job.created_at,
+                'run_seconds': time.time() - self.started,
+                'phases': dict(self.phases),
+                'counters': dict(self.counters),
+                'finished_at': time.time(),
+            }
+
+
+class Metrics:
+    def __init__(self, job_log=None):
+        self.job_log = job_log
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._postprocessors = {}  # (thread, postprocessor) -> start time
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_counter(name + _format_labels(key[1]), value)
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for position, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_phase(self, phase, seconds, **labels):
+        self.observe('ytdl_phase_seconds', seconds, phase=phase, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_phase(phase, seconds)
+
+    # Time a block as one phase; phases may nest (a download includes its
+    # postprocessing). Errors are counted and re-raised.
+    @contextmanager
+    def span(self, phase, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('ytdl_phase_errors_total', phase=phase)
+            raise
+        finally:
+            self.add_phase(phase, time.perf_counter() - started, **labels)
+
+    # yt-dlp progress hook: count bytes and throughput of finished downloads
+    def download_hook(self, d):
+        if d.get('status') != 'finished':
+            return
+        downloaded = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        if downloaded:
+            self.inc('ytdl_download_bytes_total', downloaded)
+        elapsed = d.get('elapsed')
+        if downloaded and elapsed:
+            self.observe('ytdl_download_throughput_bytes_per_second', downloaded / elapsed)
+
+    # yt-dlp postprocessor hook: time FFmpeg merges and conversions
+    def postprocessor_hook(self, d):
+        key = (threading.get_ident(), d.get('postprocessor'))
+        if d.get('status') == 'started':
+            self._postprocessors[key] = time.perf_counter()
+        elif d.get('status') == 'finished':
+            started = self._postprocessors.pop(key, None)
+            if started is not None:
+                self.add_phase('postprocessing', time.perf_counter() - started, postprocessor=key[1] or 'unknown')
+
+    # Attribute everything recorded while the job's function runs to the
+    # job, then count it and append it to the job log
+    @contextmanager
+    def job_trace(self, job):
+        trace = JobTrace(job)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self.inc('ytdl_jobs_total', kind=job.meta.get('kind', 'job'), state=job.state)
+            if self.job_log:
+                self._write_job_log(trace.as_dict())
+
+    def _write_job_log(self, record):
+        try:
+            line = json.dumps(record, default=str)
+            with self._log_lock, open(self.job_log, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except (OSError, TypeError, ValueError):
+            pass
+
+    # Everything in Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (series, labels), value in sorted(counters.items()):
+                    if series == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                for (series, labels), (counts, total, count) in sorted(histograms.items()):
+                    if series != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(float(bound)))])} {bucket_count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics = None
+_server = None
+_lock = threading.Lock()
+
+
+# Process-wide metrics shared by every session and job worker
+def get_metrics():
+    global _metrics
+    with _lock:
+        if _metrics is None:
+            _metrics = Metrics(job_log=config.METRICS_JOB_LOG or None)
+        return _metrics
+
+
+# Serve /metrics for Prometheus (once per process); does nothing when the
+# port is set to 0
+def start_metrics_server(host=None, port=None):
+    global _server
+    metrics = get_metrics()
+    port = config.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            handler = type('Handler', (MetricsHandler,), {'metrics': metrics})
+            _server = ThreadingHTTPServer((host or config.METRICS_HOST, port), handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
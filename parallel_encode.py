@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, wait
+
+import config
+from capabilities import get_capabilities
+
+# Segment-parallel MP3 encoding. LAME is single-threaded, so one long file
+# keeps one core busy for minutes. Long sources are instead cut into
+# segments, preferably inside a silence near each cut, every segment is
+# encoded by its own FFmpeg process, and the MP3 frames of the segments are
+# spliced together.
+#
+# A plain concatenation of separately encoded files isn't gapless: every
+# file starts with the encoder delay and ends with padding, and without the
+# Xing/LAME header nothing tells the player to drop them. So the cuts are
+# put on the MP3 frame grid (1152 samples) of the source, each segment is
+# encoded with OVERLAP_FRAMES of extra audio on both sides, and only the
+# frames covering its own part are kept. LAME's delay is the same in every
+# segment, so the kept frames line up with those a single encode would
+# write; the bit reservoir is turned off so no frame borrows bits from a
+# frame of another segment.
+#
+# All FFmpeg work of the audio modes (this, the one-piece MP3 encode and
+# the remuxes) runs on one pool of PARALLEL_ENCODE_WORKERS slots, and jobs
+# take turns getting a slot so a second job isn't stuck behind all of the
+# first one's segments.
+
+DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+SAMPLE_RATE_RE = re.compile(r'Stream #\S+.*?Audio: .*?(\d+) Hz')
+SILENCE_RE = re.compile(r'silence_(start|end): (-?\d+(?:\.\d+)?)')
+
+# Samples in an MPEG-1 Layer III frame, and the header tables it uses
+FRAME_SAMPLES = 1152
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+MP3_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+# Frames encoded before and after each segment's own part and thrown away
+OVERLAP_FRAMES = 10
+
+
+def _ffmpeg(args, log_level='error'):
+    result = subprocess.run(
+        [get_capabilities().ffmpeg_path or 'ffmpeg', '-hide_banner', '-nostdin', '-loglevel', log_level, '-y', *args],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg failed: {result.stderr.strip()[-500:]}")
+    return result.stderr
+
+
+# (length in seconds, sample rate) of the first audio stream of a media
+# file, from ffprobe, or from the header FFmpeg prints when there is no
+# ffprobe; (None, None) if neither can tell
+def probe_audio(path):
+    capabilities = get_capabilities()
+    try:
+        if capabilities.ffprobe_available:
+            result = subprocess.run(
+                [capabilities.ffprobe_path, '-v', 'error', '-select_streams', 'a:0',
+                 '-show_entries', 'format=duration:stream=sample_rate', '-of', 'json', path],
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+            info = json.loads(result.stdout)
+            return float(info['format']['duration']), int(info['streams'][0]['sample_rate'])
+        result = subprocess.run(
+            [capabilities.ffmpeg_path or 'ffmpeg', '-hide_banner', '-nostdin', '-i', path],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        duration, sample_rate = DURATION_RE.search(result.stderr), SAMPLE_RATE_RE.search(result.stderr)
+        if duration is None or sample_rate is None:
+            return None, None
+        hours, minutes, seconds = duration.groups()
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds), int(sample_rate.group(1))
+    except (subprocess.SubprocessError, OSError, ValueError, KeyError, IndexError):
+        return None, None
+
+
+# Middle points of the silences in `length` seconds from `start` on
+def find_silences(path, start, length):
+    output = _ffmpeg([
+        '-ss', f'{start:.3f}', '-t', f'{length:.3f}', '-i', path, '-vn',
+        '-af', 'silencedetect=noise=-35dB:d=0.3', '-f', 'null', '-',
+    ], log_level='info')
+    silences, silence_start = [], None
+    for kind, value in SILENCE_RE.findall(output):
+        if kind == 'start':
+            silence_start = float(value)
+        elif silence_start is not None:
+            silences.append(start + (silence_start + float(value)) / 2)
+            silence_start = None
+    return silences
+
+
+# Cut a `duration` long file into `count` segments of about equal length.
+# Each cut moves to the middle of the nearest silence in `silences` that
+# lies within `window` seconds. Returns [(start, end)]; the last end is
+# None (until the end of the file).
+def plan_segments(duration, count, silences=(), window=0):
+    cuts = []
+    for position in range(1, count):
+        target = duration * position / count
+        near = [point for point in silences if abs(point - target) <= window]
+        cuts.append(min(near, key=lambda point: abs(point - target)) if near else target)
+    bounds = [0.0] + sorted(set(cuts)) + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+# Byte offsets of the frames of an MP3 file as written here (MPEG-1 Layer
+# III, no tags, no Xing header), followed by the end of the last frame
+def mp3_frame_offsets(path):
+    offsets = []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset < size:
+            f.seek(offset)
+            header = f.read(4)
+            if len(header) < 4 or header[0] != 0xFF or header[1] & 0xFE != 0xFA:
+                raise ValueError(f"No MP3 frame at byte {offset} of {path}")
+            bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+            if not 0 < bitrate_index < len(MP3_BITRATES) or rate_index >= len(MP3_SAMPLE_RATES):
+                raise ValueError(f"Unsupported MP3 frame at byte {offset} of {path}")
+            offsets.append(offset)
+            offset += 144000 * MP3_BITRATES[bitrate_index] // MP3_SAMPLE_RATES[rate_index] + ((header[2] >> 1) & 1)
+    offsets.append(min(offset, size))
+    return offsets
+
+
+# Runs FFmpeg work on a fixed number of slots. Every owner (one encode) has
+# its own queue and the owners take turns, so concurrent jobs share the
+# cores fairly instead of first come, first served.
+class CorePool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._queues = OrderedDict()  # owner -> deque of (fn, future)
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"encode-{i}", daemon=True).start()
+
+    # Run `fn` on a slot of its own and wait for it
+    def run(self, fn):
+        return self.submit(object(), fn).result()
+
+    def submit(self, owner, fn):
+        future = Future()
+        with self._cond:
+            self._queues.setdefault(owner, deque()).append((fn, future))
+            self._cond.notify()
+        return future
+
+    # Drop an owner's work that hasn't started yet
+    def cancel(self, owner):
+        with self._cond:
+            for _, future in self._queues.pop(owner, ()):
+                future.cancel()
+
+    def _next_locked(self):
+        for owner, queue in self._queues.items():
+            fn, future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(owner)
+            else:
+                del self._queues[owner]
+            return fn, future
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                fn, future = self._next_locked()
+                while fn is None:
+                    self._cond.wait()
+                    fn, future = self._next_locked()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+
+# Encode `source_path` to MP3 on several cores; returns False (without doing
+# anything) when the source is too short, has a sample rate MPEG-1 can't
+# store, or there is only one slot, so the caller encodes it in one piece
+# instead. `progress` is a ProgressAggregator.
+def encode_mp3_parallel(source_path, output_path, bitrate=192, progress=None):
+    pool = get_core_pool()
+    if pool.workers < 2:
+        return False
+    duration, sample_rate = probe_audio(source_path)
+    if not duration or duration < config.PARALLEL_ENCODE_MIN_DURATION or sample_rate not in MP3_SAMPLE_RATES:
+        return False
+    count = min(pool.workers, int(duration // config.PARALLEL_ENCODE_MIN_SEGMENT))
+    if count < 2:
+        return False
+
+    owner = object()
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(output_path) or None)
+    try:
+        # Look for silences around each planned cut, in parallel too
+        window = config.PARALLEL_ENCODE_SILENCE_WINDOW
+        silences = []
+        if window > 0:
+            searches = [
+                pool.submit(owner, lambda start=start: find_silences(source_path, start, 2 * window))
+                for start in (max(duration * position / count - window, 0) for position in range(1, count))
+            ]
+            for future in searches:
+                try:
+                    silences.extend(future.result())
+                except Exception:
+                    pass
+
+        # Cuts in samples, on the frame grid
+        overlap = OVERLAP_FRAMES * FRAME_SAMPLES
+        cuts = [0]
+        for start, _ in plan_segments(duration, count, silences, window)[1:]:
+            cut = round(start * sample_rate / FRAME_SAMPLES) * FRAME_SAMPLES
+            if cut - overlap > cuts[-1]:
+                cuts.append(cut)
+        ends = cuts[1:] + [None]
+
+        # Segments are cut by sample count rather than with -ss, which isn't
+        # sample-exact for every codec (Opus in WebM lands ~50 samples off)
+        def encode_segment(index, cut, end):
+            segment_path = os.path.join(work_dir, f"{index:04d}.mp3")
+            trim = f'atrim=start_sample={max(cut - overlap, 0)}'
+            if end is not None:
+                trim += f':end_sample={end + overlap}'
+            _ffmpeg([
+                '-i', source_path, '-vn', '-map', '0:a:0', '-af', trim, '-threads', '1',
+                '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k', '-reservoir', '0',
+                '-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', segment_path,
+            ])
+            return segment_path
+
+        futures = [
+            pool.submit(owner, lambda index=index, cut=cut, end=end: encode_segment(index, cut, end))
+            for index, (cut, end) in enumerate(zip(cuts, ends))
+        ]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1.0)
+            for future in done:
+                future.result()
+            if progress:
+                progress.message(f"Converting to MP3... {len(futures) - len(pending)}/{len(futures)} parts")
+
+        # Keep each segment's frames from its cut to the next one
+        with open(output_path, 'wb') as out:
+            for future, cut, end in zip(futures, cuts, ends):
+                offsets = mp3_frame_offsets(future.result())
+                skip = (cut - max(cut - overlap, 0)) // FRAME_SAMPLES
+                stop = len(offsets) - 1 if end is None else skip + (end - cut) // FRAME_SAMPLES
+                if stop >= len(offsets):
+                    raise ValueError(f"MP3 segment {future.result()} is shorter than planned")
+                with open(future.result(), 'rb') as segment:
+                    segment.seek(offsets[skip])
+                    remaining = offsets[stop] - offsets[skip]
+                    while remaining:
+                        chunk = segment.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            raise ValueError(f"MP3 segment {future.result()} ended early")
+                        out.write(chunk)
+                        remaining -= len(chunk)
+        return True
+    finally:
+        pool.cancel(owner)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+_pool = None
+_lock = threading.Lock()
+
+
+# Process-wide encoding slots shared by every job
+def get_core_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = CorePool(config.PARALLEL_ENCODE_WORKERS)
+        return _pool
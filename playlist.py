@@ -0,0 +1,179 @@
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+from progress import ProgressAggregator
+from url_utils import safe_filename
+from ydl_pool import get_ydl_pool
+
+
+# Yield playlist entries one at a time using flat extraction, so only the
+# playlist pages are fetched up front, not every video's metadata.
+# Returns (title, expected_count, entries_iterator).
+def expand_playlist(url):
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+    }
+
+    # The instance stays checked out while the lazy entries are consumed
+    pool = get_ydl_pool()
+    pooled = pool.acquire('flat', ydl_opts)
+    try:
+        info = pooled.ydl.extract_info(url, download=False)
+        if info is None:
+            raise Exception("Failed to extract playlist information")
+    except Exception:
+        pool.release(pooled, failed=True)
+        raise
+
+    def entries():
+        failed = True
+        try:
+            yield from playlist_entries(info)
+            failed = False
+        finally:
+            pool.release(pooled, failed=failed)
+
+    return info.get('title', 'Playlist'), info.get('playlist_count'), entries()
+
+
+# (index, url, title) for each entry of a flat playlist info dict
+def playlist_entries(info):
+    for index, entry in enumerate(info.get('entries') or [], start=1):
+        if not entry:
+            continue
+        entry_url = entry.get('url') or entry.get('webpage_url') or entry.get('id')
+        if entry_url:
+            yield index, entry_url, entry.get('title') or f"Video {index}"
+
+
+# yt-dlp format spec that works for every entry, since format IDs picked
+# for one video don't necessarily exist for the others
+def playlist_format_spec(height, allow_merge=False):
+    if allow_merge:
+        return f"bestvideo[height<={height}]+bestaudio/best[height<={height}]/best"
+    return f"best[height<={height}][vcodec!=none][acodec!=none]/best[height<={height}]/best"
+
+
+# Download every entry of a playlist with at most `concurrency` downloads in
+# flight, retrying failed entries on their own, and add each file to a ZIP
+# on disk as soon as it finishes.
+#
+# download_entry(entry_url, progress) must return (filename, filepath), feed
+# yt-dlp progress to `progress.hook`, and own its temporary directory (the
+# directory of filepath is removed once the file is in the archive).
+# `expand` defaults to expand_playlist and can be swapped for one that
+# replays a recorded playlist. The ZIP is built in `work_dir` (the
+# caller's, see workdirs.py) or else in a new temporary directory.
+def download_playlist(url, download_entry, concurrency=None, retries=None, progress_callback=None,
+                      expand=expand_playlist, work_dir=None):
+    concurrency = concurrency or config.PLAYLIST_CONCURRENCY
+    retries = config.PLAYLIST_RETRIES if retries is None else retries
+
+    title, expected_count, entries = expand(url)
+
+    temp_dir = work_dir or tempfile.mkdtemp()
+    zip_path = os.path.join(temp_dir, "playlist.zip")
+
+    lock = threading.Lock()
+    state = {'queued': 0, 'done': 0, 'failed': []}
+
+    # Byte counts of every entry feed one aggregator; the bar advances by
+    # entries, while speed and ETA come from the bytes
+    progress = ProgressAggregator(progress_callback, expected_items=expected_count)
+
+    def update_label():
+        with lock:
+            progress.expected_items = max(expected_count or 0, state['queued'], 1)
+            label = f"Downloaded {state['done']} of {expected_count or state['queued']} videos"
+            if state['failed']:
+                label += f" ({len(state['failed'])} failed)"
+        progress.set_label(label)
+
+    def run_entry(index, entry_url):
+        scope = progress.scope(index)
+        last_error = None
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(min(2 ** attempt, 30))
+                    scope.reset()
+                try:
+                    return download_entry(entry_url, scope)
+                except Exception as e:
+                    last_error = e
+            raise last_error
+        finally:
+            progress.item_done(index)
+
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf, \
+                ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="playlist-entry") as pool:
+            in_flight = {}
+
+            def add_to_zip(future):
+                index, entry_title = in_flight.pop(future)
+                try:
+                    filename, filepath = future.result()
+                except Exception as e:
+                    with lock:
+                        state['failed'].append((index, entry_title, str(e)))
+                    return
+
+                # Videos are already compressed, so store them as-is
+                zf.write(filepath, arcname=f"{index:03d} - {filename}")
+                shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
+                with lock:
+                    state['done'] += 1
+
+            # Only pull the next entry from the playlist when a slot frees up
+            for index, entry_url, entry_title in entries:
+                while len(in_flight) >= concurrency:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        add_to_zip(future)
+                    update_label()
+
+                # Each entry runs in a copy of this context, so metrics
+                # recorded by the entry are attributed to this job
+                future = pool.submit(contextvars.copy_context().run, run_entry, index, entry_url)
+                in_flight[future] = (index, entry_title)
+                with lock:
+                    state['queued'] += 1
+                update_label()
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    add_to_zip(future)
+                update_label()
+
+            if state['failed']:
+                lines = [f"{index:03d} - {entry_title}: {error}" for index, entry_title, error in sorted(state['failed'])]
+                zf.writestr("FAILED.txt", "These videos could not be downloaded:\n\n" + "\n".join(lines) + "\n")
+
+        if state['done'] == 0:
+            raise Exception("No videos in the playlist could be downloaded")
+
+        progress.message(f"Downloaded {state['done']} videos")
+        return f"{safe_filename(title)}.zip", zip_path
+
+    except BaseException:
+        if work_dir:
+            try:
+                os.remove(zip_path)
+            except OSError:
+                pass
+        else:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import config
+
+
+# Human-readable transfer rate, e.g. "3.2 MB/s"
+def format_rate(bytes_per_second):
+    if not bytes_per_second:
+        return "-- B/s"
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if bytes_per_second < 1024:
+            return f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.2f} GB/s"
+
+
+# Human-readable remaining time, e.g. "1m 05s"
+def format_eta(seconds):
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+# Progress of everything a job downloads: fragments, the separate video and
+# audio streams of a merged format, and playlist entries. yt-dlp's hook
+# calls only update counters here; speed and ETA are computed from raw byte
+# counts (EWMA-smoothed), and `publish(progress=..., text=...)` is called
+# at most `max_rate` times per second.
+class ProgressAggregator:
+    def __init__(self, publish=None, total_hint=None, expected_items=None, max_rate=None, alpha=None,
+                 clock=time.monotonic):
+        self.publish = publish
+        self.total_hint = total_hint or 0
+        self.expected_items = expected_items
+        self.min_interval = 1.0 / (max_rate or config.PROGRESS_MAX_UPDATES_PER_SECOND)
+        self.alpha = alpha or config.PROGRESS_EWMA_ALPHA
+        self.clock = clock
+        self.label = "Downloading"
+
+        self._lock = threading.Lock()
+        self._streams = {}        # (scope, stream) -> [downloaded, total]
+        self._scope_hints = {}    # scope -> expected bytes
+        self._items_done = 0
+        self._bytes = 0           # every byte received, including retried ones
+        self._started = clock()
+        self._sample_time = self._started
+        self._sample_bytes = 0
+        self._last_publish = None
+        self.speed = 0.0
+
+    # yt-dlp progress hook
+    def hook(self, d, scope=None):
+        stream = d.get('filename') or d.get('tmpfilename') or (d.get('info_dict') or {}).get('format_id')
+        status = d.get('status')
+        with self._lock:
+            entry = self._streams.setdefault((scope, stream), [0, 0])
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or entry[1]
+            downloaded = d.get('downloaded_bytes') or 0
+            if status == 'finished':
+                downloaded = max(downloaded, total, entry[0])
+                total = downloaded
+
+            # A restarted stream reports fewer bytes; only count growth
+            self._bytes += max(downloaded - entry[0], 0)
+            entry[0] = downloaded
+            entry[1] = total
+            self._sample_locked()
+
+        self._maybe_publish(force=status == 'finished')
+
+    # yt-dlp postprocessor hook (merging, audio extraction)
+    def postprocessor_hook(self, d, scope=None):
+        if d.get('status') == 'started' and scope is None:
+            self.message("Processing video... Almost done!")
+
+    # Progress of one part of the job, such as a playlist entry
+    def scope(self, name, total_hint=None):
+        if total_hint:
+            with self._lock:
+                self._scope_hints[name] = total_hint
+        return ProgressScope(self, name)
+
+    # A scope finished (or gave up); its bytes stay in the speed figures
+    def item_done(self, scope):
+        with self._lock:
+            for key in [key for key in self._streams if key[0] == scope]:
+                del self._streams[key]
+            self._scope_hints.pop(scope, None)
+            self._items_done += 1
+        self._maybe_publish(force=True)
+
+    def reset_scope(self, scope):
+        with self._lock:
+            for key in [key for key in self._streams if key[0] == scope]:
+                self._streams[key][0] = 0
+
+    def set_label(self, label):
+        self.label = label
+        self._maybe_publish(force=True)
+
+    # Status changes are always shown, regardless of the rate limit
+    def message(self, text):
+        if self.publish:
+            self._last_publish = self.clock()
+            self.publish(progress=self.fraction(), text=text)
+
+    def _sample_locked(self):
+        now = self.clock()
+        elapsed = now - self._sample_time
+        if elapsed < 0.25:
+            return
+        instant = (self._bytes - self._sample_bytes) / elapsed
+        self.speed = instant if not self.speed else self.alpha * instant + (1 - self.alpha) * self.speed
+        self._sample_time = now
+        self._sample_bytes = self._bytes
+
+    def _scope_fraction_locked(self, scope):
+        downloaded = total = 0
+        for (stream_scope, _), (stream_downloaded, stream_total) in self._streams.items():
+            if stream_scope == scope:
+                downloaded += stream_downloaded
+                total += stream_total
+        total = max(total, self._scope_hints.get(scope, 0))
+        if scope is None:
+            total = max(total, self.total_hint)
+        return downloaded, total
+
+    def fraction(self):
+        with self._lock:
+            if self.expected_items:
+                scopes = {scope for scope, _ in self._streams}
+                partial = 0.0
+                for scope in scopes:
+                    downloaded, total = self._scope_fraction_locked(scope)
+                    if total:
+                        partial += min(downloaded / total, 1.0)
+                return min((self._items_done + partial) / self.expected_items, 1.0)
+
+            downloaded, total = self._scope_fraction_locked(None)
+            return min(downloaded / total, 1.0) if total else 0.0
+
+    def eta(self):
+        fraction = self.fraction()
+        if fraction >= 1.0:
+            return 0
+        if self.expected_items:
+            # Items differ in size, so extrapolate from elapsed time
+            elapsed = self.clock() - self._started
+            return elapsed / fraction * (1 - fraction) if fraction > 0 else None
+        with self._lock:
+            downloaded, total = self._scope_fraction_locked(None)
+        if not self.speed or not total:
+            return None
+        return max(total - downloaded, 0) / self.speed
+
+    def snapshot(self):
+        return {
+            'fraction': self.fraction(),
+            'bytes': self._bytes,
+            'speed': self.speed,
+            'eta': self.eta(),
+        }
+
+    def _maybe_publish(self, force=False):
+        if not self.publish:
+            return
+        now = self.clock()
+        if not force and self._last_publish is not None and now - self._last_publish < self.min_interval:
+            return
+        self._last_publish = now
+
+        fraction = self.fraction()
+        text = f"{self.label}: {fraction * 100:.1f}% at {format_rate(self.speed)}, {format_eta(self.eta())} left"
+        self.publish(progress=fraction, text=text)
+
+
+# A view of an aggregator limited to one scope (e.g. one playlist entry),
+# usable anywhere an aggregator is expected
+class ProgressScope:
+    def __init__(self, aggregator, name):
+        self.aggregator = aggregator
+        self.name = name
+
+    def hook(self, d):
+        self.aggregator.hook(d, scope=self.name)
+
+    def postprocessor_hook(self, d):
+        self.aggregator.postprocessor_hook(d, scope=self.name)
+
+    def message(self, text):
+        # Per-entry status would flicker between entries; keep the overall one
+        pass
+
+    def reset(self):
+        self.aggregator.reset_scope(self.name)
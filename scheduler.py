@@ -0,0 +1,247 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+
+import config
+
+# Admission control and fair scheduling of background jobs, and bandwidth
+# limits for the downloads they run.
+#
+# Jobs wait in one queue per session and the sessions take turns, so a
+# session that queues twenty downloads doesn't push everyone else's single
+# download to the back. A job only starts when a worker is free, its session
+# is under its own cap, and the work directory's disk has room for its
+# estimated size next to everything already running. Download bytes pass a
+# global and a per-session token bucket.
+
+
+# Token bucket of `rate` bytes per second holding up to `burst` bytes.
+# consume() may run into debt; the caller then sleeps until it is paid
+# back, so large blocks are throttled as accurately as small ones.
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or rate
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    # Take `amount` tokens; returns how long the caller has to wait
+    def take(self, amount):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+# Global and per-session download bandwidth (0 = unlimited)
+class Bandwidth:
+    def __init__(self, global_rate, session_rate, idle_timeout=60):
+        self.global_bucket = TokenBucket(global_rate) if global_rate > 0 else None
+        self.session_rate = session_rate
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # session -> (bucket, last used)
+        self._lock = threading.Lock()
+
+    def _session_bucket(self, session_id):
+        if self.session_rate <= 0 or session_id is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            bucket, _ = self._sessions.get(session_id, (None, None))
+            if bucket is None:
+                # Forget sessions that stopped downloading
+                for other, (_, last_used) in list(self._sessions.items()):
+                    if now - last_used > self.idle_timeout:
+                        del self._sessions[other]
+                bucket = TokenBucket(self.session_rate)
+            self._sessions[session_id] = (bucket, now)
+            return bucket
+
+    # Account for `amount` downloaded bytes, sleeping as long as the
+    # tighter of the two limits requires
+    def throttle(self, session_id, amount):
+        wait = 0.0
+        for bucket in (self.global_bucket, self._session_bucket(session_id)):
+            if bucket is not None:
+                wait = max(wait, bucket.take(amount))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    # yt-dlp progress hook that throttles the thread reporting progress.
+    # yt-dlp reports after every block it reads, so sleeping here slows the
+    # download itself down.
+    def hook(self, session_id):
+        seen = {}  # stream -> bytes already accounted for
+        lock = threading.Lock()
+
+        def throttle_hook(d):
+            if d.get('status') != 'downloading':
+                return
+            stream = d.get('tmpfilename') or d.get('filename')
+            downloaded = d.get('downloaded_bytes') or 0
+            with lock:
+                delta = downloaded - seen.get(stream, 0)
+                seen[stream] = max(downloaded, seen.get(stream, 0))
+            if delta > 0:
+                self.throttle(session_id, delta)
+
+        return throttle_hook
+
+    @property
+    def unlimited(self):
+        return self.global_bucket is None and self.session_rate <= 0
+
+
+# A queued unit of work. `notify(text)` tells the owner why it is still
+# waiting; `reject(message)` is called instead of `run` if it can never
+# be admitted. `written()` returns how many of the estimated bytes the
+# running task has already put on disk.
+class Task:
+    def __init__(self, key, session_id, run, estimated_bytes=0, notify=None, reject=None, written=None):
+        self.key = key
+        self.session_id = session_id
+        self.run = run
+        self.estimated_bytes = estimated_bytes or 0
+        self.notify = notify
+        self.reject = reject
+        self.written = written
+        self.waiting_for = None
+
+    # Estimated bytes still to be written; what is already on disk shows up
+    # in the measured free space
+    def outstanding(self):
+        written = self.written() if self.written else 0
+        return max(self.estimated_bytes - written, 0)
+
+
+class Scheduler:
+    def __init__(self, max_running, session_max_running=0, disk_path=None, disk_reserve=0, recheck_interval=5.0):
+        self.max_running = max_running
+        self.session_max_running = session_max_running
+        self.disk_path = disk_path
+        self.disk_reserve = disk_reserve
+        self.recheck_interval = recheck_interval
+
+        self._queues = OrderedDict()  # session -> deque of tasks, in turn order
+        self._running = {}            # session -> running task count
+        self._active = set()          # running tasks with an estimate
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"download-job-{i}", daemon=True)
+            for i in range(max_running)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, task):
+        with self._cond:
+            self._queues.setdefault(task.session_id, deque()).append(task)
+            self._cond.notify()
+
+    # Take a task out of the queue before it starts; False if it isn't queued
+    def remove(self, key):
+        with self._cond:
+            for session_id, queue in self._queues.items():
+                for task in queue:
+                    if task.key == key:
+                        queue.remove(task)
+                        if not queue:
+                            del self._queues[session_id]
+                        return True
+        return False
+
+    def queued(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _free_disk(self):
+        if not self.disk_path:
+            return None
+        try:
+            os.makedirs(self.disk_path, exist_ok=True)
+            return shutil.disk_usage(self.disk_path).free
+        except OSError:
+            return None
+
+    # Whether a task fits on disk next to what the running tasks have yet to
+    # write: True, False (wait), or None (it won't fit even on its own)
+    def _fits_locked(self, task, free):
+        if free is None or not task.estimated_bytes:
+            return True
+        available = free - sum(running.outstanding() for running in self._active) - self.disk_reserve
+        if task.estimated_bytes <= available:
+            return True
+        if not self._active and task.estimated_bytes > free - self.disk_reserve:
+            return None
+        return False
+
+    # The next task to run: sessions are visited in turn and each offers
+    # the head of its queue; a session that runs a task goes to the back
+    def _next_locked(self):
+        free = self._free_disk() if any(q[0].estimated_bytes for q in self._queues.values()) else None
+        for session_id in list(self._queues):
+            if self.session_max_running and self._running.get(session_id, 0) >= self.session_max_running:
+                continue
+            queue = self._queues[session_id]
+            task = queue[0]
+            fits = self._fits_locked(task, free)
+            if fits is False:
+                if task.waiting_for != 'disk' and task.notify:
+                    task.notify("Waiting for disk space...")
+                task.waiting_for = 'disk'
+                continue
+
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            return task, fits is None
+        return None, False
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task, rejected = self._next_locked()
+                while task is None:
+                    self._cond.wait(self.recheck_interval)
+                    task, rejected = self._next_locked()
+                if not rejected:
+                    self._running[task.session_id] = self._running.get(task.session_id, 0) + 1
+                    if task.estimated_bytes:
+                        self._active.add(task)
+
+            if rejected:
+                if task.reject:
+                    task.reject("Not enough disk space for this download")
+                continue
+
+            try:
+                task.run()
+            finally:
+                with self._cond:
+                    self._running[task.session_id] -= 1
+                    if not self._running[task.session_id]:
+                        del self._running[task.session_id]
+                    self._active.discard(task)
+                    self._cond.notify_all()
+
+
+_bandwidth = None
+_lock = threading.Lock()
+
+
+# Process-wide bandwidth limits shared by every download
+def get_bandwidth():
+    global _bandwidth
+    with _lock:
+        if _bandwidth is None:
+            _bandwidth = Bandwidth(config.SCHEDULER_MAX_BANDWIDTH, config.SCHEDULER_SESSION_BANDWIDTH)
+        return _bandwidth
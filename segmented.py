@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+
+class SegmentedDownloadError(Exception):
+    pass
+
+
+# open_range(start, end) for plain HTTP(S) URLs using urllib; `end` is inclusive
+def urllib_range_opener(url, headers=None, timeout=30):
+    def open_range(start, end):
+        request = urllib.request.Request(url, headers=dict(headers or {}))
+        request.add_header('Range', f'bytes={start}-{end}')
+        return urllib.request.urlopen(request, timeout=timeout)
+    return open_range
+
+
+# Find the total size with a one-byte range request.
+# Returns (size, supports_ranges); size is None if the server won't say.
+def probe_size(open_range):
+    try:
+        with open_range(0, 0) as response:
+            status = getattr(response, 'status', None) or response.getcode()
+            headers = response.headers
+            content_range = headers.get('Content-Range', '')
+            if status == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                if total.isdigit():
+                    return int(total), True
+            length = headers.get('Content-Length')
+            return (int(length) if length and length.isdigit() else None), False
+    except Exception:
+        return None, False
+
+
+# Download `size` bytes into `dest` over `connections` parallel range
+# requests of `chunk_size` bytes each. Every chunk is written straight to
+# its offset in a preallocated file, so nothing is copied or reassembled
+# afterwards. on_progress(downloaded_bytes) is called as data arrives.
+# To resume, pass the start offsets of chunks an earlier run already wrote
+# to `dest` as `done`; on_chunk_done(start) is called as each chunk lands.
+def download_segmented(open_range, dest, size, connections=4, chunk_size=10 * 1024 * 1024,
+                       on_progress=None, retries=3, buffer_size=256 * 1024, done=(), on_chunk_done=None):
+    done = set(done)
+    chunks = queue.Queue()
+    resumed = 0
+    for start in range(0, size, chunk_size):
+        end = min(start + chunk_size, size) - 1
+        if start in done:
+            resumed += end - start + 1
+        else:
+            chunks.put((start, end))
+
+    lock = threading.Lock()
+    state = {'downloaded': resumed, 'error': None}
+
+    fd = os.open(dest, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, size)
+
+        def fetch(start, end, attempt_bytes):
+            offset = start
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            with open_range(start, end) as response:
+                status = getattr(response, 'status', None) or response.getcode()
+                if status != 206 and not (start == 0 and end == size - 1):
+                    raise SegmentedDownloadError(f"Server ignored the range request (HTTP {status})")
+                readinto = getattr(response, 'readinto', None)
+                while offset <= end:
+                    want = min(buffer_size, end - offset + 1)
+                    if readinto is not None:
+                        read = readinto(view[:want])
+                    else:
+                        data = response.read(want)
+                        read = len(data)
+                        view[:read] = data
+                    if not read:
+                        break
+                    written = os.pwrite(fd, view[:read], offset)
+                    offset += written
+                    attempt_bytes[0] += written
+                    with lock:
+                        state['downloaded'] += written
+                        downloaded = state['downloaded']
+                    if on_progress:
+                        on_progress(downloaded)
+            if offset <= end:
+                raise SegmentedDownloadError(f"Connection closed early at byte {offset} of {start}-{end}")
+
+        def worker():
+            while state['error'] is None:
+                try:
+                    start, end = chunks.get_nowait()
+                except queue.Empty:
+                    return
+
+                for attempt in range(retries + 1):
+                    attempt_bytes = [0]
+                    try:
+                        fetch(start, end, attempt_bytes)
+                        if on_chunk_done:
+                            on_chunk_done(start)
+                        break
+                    except BaseException as e:
+                        # Don't count the partial chunk twice when it is refetched
+                        with lock:
+                            state['downloaded'] -= attempt_bytes[0]
+                        # A cancelled job stops every connection right away
+                        if attempt == retries or not isinstance(e, Exception):
+                            state['error'] = e
+                            return
+                        time.sleep(min(2 ** attempt, 10))
+
+        threads = [
+            threading.Thread(target=worker, name=f"segment-{i}", daemon=True)
+            for i in range(max(1, min(connections, chunks.qsize())))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        os.close(fd)
+
+    if state['error'] is not None:
+        if not isinstance(state['error'], Exception):
+            raise state['error']
+        raise SegmentedDownloadError(f"Segmented download failed: {state['error']}")
+    return dest
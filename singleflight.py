@@ -0,0 +1,154 @@
+import threading
+from contextlib import contextmanager
+
+import config
+from jobs import JobCancelled
+from metrics import get_metrics
+
+# Request coalescing. Concurrent requests for the same key (a video's
+# metadata, or the same video and format for downloads) attach to one
+# in-flight operation instead of each running their own: the first caller
+# runs it, everyone sees its progress and gets its result or error. The
+# shared work is cancelled only once every caller has left; a caller that
+# leaves early just stops receiving updates.
+
+
+class Flight:
+    def __init__(self):
+        self.callbacks = {}  # participant -> progress callback or None
+        self.sharers = set()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self._last_update = {}
+        self._cleanup = None
+        self._lock = threading.Lock()
+
+    # Add a participant; returns the latest update so it can catch up
+    def join(self, participant, progress_callback):
+        with self._lock:
+            self.callbacks[participant] = progress_callback
+            return dict(self._last_update)
+
+    def leave(self, participant):
+        with self._lock:
+            self.callbacks.pop(participant, None)
+            if not self.callbacks and not self.done.is_set():
+                self.cancelled = True
+
+    # The progress callback of the shared operation: passes every update on
+    # to the participants, dropping those whose job was cancelled, and stops
+    # the operation when nobody is left
+    def publish(self, progress=None, text=None):
+        with self._lock:
+            if progress is not None:
+                self._last_update['progress'] = progress
+            if text is not None:
+                self._last_update['text'] = text
+            callbacks = list(self.callbacks.items())
+        for participant, callback in callbacks:
+            if callback is None:
+                continue
+            try:
+                callback(progress=progress, text=text)
+            except JobCancelled:
+                self.leave(participant)
+        if self.cancelled:
+            raise JobCancelled()
+
+    def finish(self, cleanup):
+        with self._lock:
+            self.sharers = set(self.callbacks)
+            self._cleanup = cleanup if self.error is None else None
+            orphaned = self._cleanup if not self.sharers else None
+        self.done.set()
+        # Everyone left while the work was finishing
+        if orphaned is not None:
+            orphaned(self.result)
+
+    # A participant is done with the result; the last one runs the cleanup
+    def release(self, participant):
+        with self._lock:
+            self.sharers.discard(participant)
+            cleanup = self._cleanup if not self.sharers else None
+            if cleanup is not None:
+                self._cleanup = None
+        if cleanup is not None:
+            cleanup(self.result)
+
+
+class SingleFlight:
+    def __init__(self, kind):
+        self.kind = kind
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    # Run fn(publish) once for all concurrent callers of `key` and return
+    # its result (or raise its error) to each of them
+    def run(self, key, fn, progress_callback=None):
+        with self.share(key, fn, progress_callback) as result:
+            return result
+
+    # Like run(), for results that must be cleaned up: the result is valid
+    # inside the block, and cleanup(result) runs after the last participant
+    # has left it. progress_callback(progress=None, text=None) gets the
+    # shared progress; when it raises JobCancelled the caller leaves.
+    @contextmanager
+    def share(self, key, fn, progress_callback=None, cleanup=None):
+        participant = object()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None or flight.cancelled
+            if leader:
+                flight = self._flights[key] = Flight()
+            last_update = flight.join(participant, progress_callback)
+
+        if not leader:
+            get_metrics().inc('ytdl_coalesced_requests_total', kind=self.kind)
+            if progress_callback is not None and last_update:
+                try:
+                    progress_callback(**last_update)
+                except JobCancelled:
+                    flight.leave(participant)
+                    raise
+
+        if leader:
+            try:
+                flight.result = fn(flight.publish)
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                flight.finish(cleanup)
+        else:
+            while not flight.done.wait(config.JOB_POLL_INTERVAL):
+                if progress_callback is not None:
+                    try:
+                        progress_callback()
+                    except JobCancelled:
+                        flight.leave(participant)
+                        raise
+
+        if participant not in flight.sharers:
+            raise JobCancelled()
+        try:
+            if flight.error is not None:
+                raise flight.error
+            yield flight.result
+        finally:
+            flight.release(participant)
+
+
+_flights = {}
+_lock = threading.Lock()
+
+
+# Process-wide coalescing per kind of request ('info', 'download')
+def get_flights(kind):
+    with _lock:
+        if kind not in _flights:
+            _flights[kind] = SingleFlight(kind)
+        return _flights[kind]
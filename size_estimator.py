@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import config
+from formats import RESOLUTION_TIERS, codec_family, format_bytes
+
+# Rough MB per minute by height, used until downloads have calibrated the model
+DEFAULT_MB_PER_MINUTE = [
+    (2160, 20),
+    (1440, 15),
+    (1080, 10),
+    (720, 5),
+    (480, 2.5),
+    (240, 1.2),
+    (0, 0.8),
+]
+AUDIO_MB_PER_MINUTE = 1
+
+# Upper bounds (seconds) of the duration buckets
+DURATION_BUCKETS = [(5 * 60, 'short'), (20 * 60, 'medium'), (60 * 60, 'long')]
+
+
+def height_bucket(height):
+    if not height:
+        return 0
+    for tier_height in sorted(RESOLUTION_TIERS.values()):
+        if height <= tier_height:
+            return tier_height
+    return max(RESOLUTION_TIERS.values())
+
+
+def duration_bucket(duration):
+    for limit, name in DURATION_BUCKETS:
+        if duration <= limit:
+            return name
+    return 'very_long'
+
+
+def default_bytes_per_second(height, audio_only):
+    if audio_only:
+        return AUDIO_MB_PER_MINUTE * 1024 * 1024 / 60
+    if height is not None:
+        for min_height, mb_per_minute in DEFAULT_MB_PER_MINUTE:
+            if height >= min_height:
+                return mb_per_minute * 1024 * 1024 / 60
+    # Unknown resolution: ~5MB per minute
+    return 5 * 1024 * 1024 / 60
+
+
+# Estimates download sizes. Format metadata (filesize, filesize_approx,
+# tbr x duration) is used when present; otherwise a bytes-per-second model
+# keyed by resolution, codec and duration, calibrated from finished
+# downloads and stored as JSON next to the other caches.
+class SizeEstimator:
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self.rates = {}   # "height|codec|duration" -> {'bytes': .., 'seconds': ..}
+        self.errors = {}  # source -> {'samples': .., 'abs_pct': .., 'pct': ..}
+        self._load()
+
+    def _load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            self.rates = data.get('rates', {})
+            self.errors = data.get('errors', {})
+        except (OSError, ValueError):
+            pass
+
+    def _save_locked(self):
+        if not self.path:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({'rates': self.rates, 'errors': self.errors}))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    # Candidate keys from most to least specific
+    def _keys(self, height, codec, duration):
+        bucket = height_bucket(height)
+        return [
+            f"{bucket}|{codec}|{duration_bucket(duration)}",
+            f"{bucket}|{codec}|*",
+            f"{bucket}|*|*",
+        ]
+
+    # Model estimate for a height/codec/duration, with where it came from
+    def predict(self, height, codec, duration, audio_only=False):
+        if not duration:
+            return None, None
+        codec = 'audio' if audio_only else (codec or 'unknown')
+        with self._lock:
+            for key in self._keys(0 if audio_only else height, codec, duration):
+                rate = self.rates.get(key)
+                if rate and rate['seconds'] > 0:
+                    return rate['bytes'] / rate['seconds'] * duration, 'model'
+        return default_bytes_per_second(height, audio_only) * duration, 'default'
+
+    # Size of a yt-dlp format spec like "137" or "137+140", from metadata
+    # if every part has it, otherwise from the model
+    def estimate(self, info, format_id, height=None, audio_only=False):
+        duration = info.get('duration') or 0
+        by_id = {fmt.get('format_id'): fmt for fmt in info.get('formats') or []}
+        parts = [by_id.get(part) for part in str(format_id).split('+')]
+
+        codec = None
+        if all(parts):
+            sizes = [format_bytes(fmt, duration) for fmt in parts]
+            if all(sizes):
+                return sum(sizes), 'metadata'
+            codec = codec_family(parts[0].get('vcodec'))
+
+        return self.predict(height if isinstance(height, int) else None, codec, duration, audio_only)
+
+    # Calibrate from a finished download. `predicted` and `source` are what
+    # the UI showed, so the error statistics reflect real estimates.
+    def record(self, height, codec, duration, actual_bytes, audio_only=False, predicted=None, source=None):
+        if not duration or not actual_bytes:
+            return
+        codec = 'audio' if audio_only else (codec or 'unknown')
+        with self._lock:
+            for key in self._keys(0 if audio_only else height, codec, duration):
+                rate = self.rates.setdefault(key, {'bytes': 0, 'seconds': 0})
+                rate['bytes'] += actual_bytes
+                rate['seconds'] += duration
+
+            if predicted and source:
+                error = (predicted - actual_bytes) / actual_bytes
+                stats = self.errors.setdefault(source, {'samples': 0, 'abs_pct': 0.0, 'pct': 0.0})
+                stats['samples'] += 1
+                stats['abs_pct'] += abs(error) * 100
+                stats['pct'] += error * 100
+
+            self._save_locked()
+
+    # Mean absolute error and bias (positive = overestimates), in percent
+    def error_stats(self):
+        with self._lock:
+            return {
+                source: {
+                    'samples': stats['samples'],
+                    'mean_abs_error_pct': stats['abs_pct'] / stats['samples'],
+                    'bias_pct': stats['pct'] / stats['samples'],
+                }
+                for source, stats in self.errors.items()
+                if stats['samples']
+            }
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+# Process-wide estimator shared by every Streamlit session
+def get_size_estimator():
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = SizeEstimator(config.SIZE_MODEL_PATH)
+        return _estimator
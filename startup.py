@@ -0,0 +1,105 @@
+import sys
+import threading
+import time
+
+# Where cold-start and new-session time goes. Each script run records named
+# phases; the first run of the process is kept as the cold-start report and
+# later runs that start a new session are averaged.
+
+_lock = threading.Lock()
+_cold_start = None
+_background = {}          # phase -> seconds, for work done off the script thread
+_new_sessions = {'runs': 0, 'phases': {}}
+
+
+class ScriptTimer:
+    def __init__(self, started, new_session):
+        self.started = started
+        self.new_session = new_session
+        self.phases = []
+        self._last = started
+
+    # Close the current phase under `name`
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+
+def record_run(timer):
+    global _cold_start
+    first = False
+    with _lock:
+        if _cold_start is None:
+            _cold_start = list(timer.phases)
+            first = True
+        elif timer.new_session:
+            _new_sessions['runs'] += 1
+            for name, seconds in timer.phases:
+                _new_sessions['phases'][name] = _new_sessions['phases'].get(name, 0.0) + seconds
+    if first:
+        print(format_report(), file=sys.stderr)
+
+
+# Time something that runs in a background thread, like warming up imports
+def record_background(name, seconds):
+    with _lock:
+        _background[name] = seconds
+
+
+def report():
+    with _lock:
+        runs = _new_sessions['runs']
+        return {
+            'cold_start': list(_cold_start or []),
+            'background': dict(_background),
+            'new_session_runs': runs,
+            'new_session_avg': {
+                name: total / runs for name, total in _new_sessions['phases'].items()
+            } if runs else {},
+        }
+
+
+def format_report():
+    data = report()
+    lines = ["Startup timing (first script run):"]
+    total = 0.0
+    for name, seconds in data['cold_start']:
+        lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        total += seconds
+    lines.append(f"  {'total':<28} {total * 1000:8.1f} ms")
+    for name, seconds in data['background'].items():
+        lines.append(f"  {name + ' (background)':<28} {seconds * 1000:8.1f} ms")
+    if data['new_session_runs']:
+        lines.append(f"New sessions (average of {data['new_session_runs']}):")
+        for name, seconds in data['new_session_avg'].items():
+            lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+_warmed_up = False
+
+
+# Import yt-dlp (and our modules built on it) in a background thread, so the
+# first page render doesn't wait for it but the first fetch usually won't either
+def warm_up_imports():
+    global _warmed_up
+    with _lock:
+        if _warmed_up:
+            return
+        _warmed_up = True
+
+    def run():
+        started = time.perf_counter()
+        try:
+            import yt_dlp  # noqa: F401
+            import downloaders  # noqa: F401
+        except ImportError:
+            return
+        record_background("yt-dlp import", time.perf_counter() - started)
+
+    threading.Thread(target=run, name="import-warmup", daemon=True).start()
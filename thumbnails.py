@@ -0,0 +1,279 @@
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+import config
+from metrics import get_metrics
+from singleflight import get_flights
+
+# Thumbnails for the info panel, fetched on the server once per video and
+# scaled down to the size they are shown at, so a page carries a few KB of
+# JPEG instead of every browser pulling the full-size image again on each
+# render. Scaled images are cached in memory and on disk, both bounded by
+# bytes. Expired entries are still shown while they are revalidated in the
+# background with the ETag / Last-Modified of the stored copy, so a render
+# never waits on the image host for a video it has shown before. If the
+# image can't be fetched the stale copy, or else a placeholder, is shown.
+
+# Largest source image that is downloaded (full-size thumbnails are < 1 MB)
+MAX_SOURCE_BYTES = 8 * 1024 * 1024
+# Failed fetches aren't retried for this long (seconds)
+FAILURE_RETRY = 60
+
+
+class Thumbnail:
+    def __init__(self, url, data, mime, etag=None, last_modified=None, fetched_at=None):
+        self.url = url
+        self.data = data
+        self.mime = mime
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at or time.time()
+
+
+# Scale an image down to `width` pixels and re-encode it as JPEG. Without
+# Pillow the image is kept as it is.
+def downscale(data, mime, width):
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, mime
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width > width:
+            image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+        out = io.BytesIO()
+        image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True)
+    return out.getvalue(), 'image/jpeg'
+
+
+# A flat grey 16:9 PNG, built without any imaging library
+def placeholder(width):
+    height = width * 9 // 16
+    row = b'\x00' + b'\xd0\xd0\xd0' * width
+    pixels = zlib.compress(row * height, 9)
+
+    def chunk(kind, body):
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', pixels)
+            + chunk(b'IEND', b''))
+
+
+class ThumbnailCache:
+    def __init__(self, directory, width, ttl, max_memory_bytes, max_disk_bytes, timeout=5.0):
+        self.directory = Path(directory) if directory else None
+        self.width = width
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.timeout = timeout
+        self.placeholder = (placeholder(width), 'image/png')
+
+        self._memory = OrderedDict()  # key -> Thumbnail, least recently used first
+        self._memory_bytes = 0
+        self._disk = {}               # key -> (size, last used)
+        self._failed = {}             # key -> time of the last failed fetch
+        self._refreshing = set()      # keys revalidated in the background
+        self._lock = threading.Lock()
+
+        if self.directory:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                for path in self.directory.glob('*.json'):
+                    image = path.with_suffix('.img')
+                    if image.exists():
+                        self._disk[path.stem] = (image.stat().st_size, image.stat().st_mtime)
+            except OSError:
+                # Memory-only caching if the directory is unusable
+                self.directory = None
+
+    # (image bytes, mime type) of the thumbnail of `video_id` at `url`;
+    # never raises
+    def get(self, video_id, url):
+        key = self.key(video_id, url)
+        entry = self._lookup(key)
+        if entry is not None and entry.url == url and time.time() - entry.fetched_at <= self.ttl:
+            get_metrics().inc('ytdl_cache_requests_total', cache='thumbnail', result='hit')
+            return entry.data, entry.mime
+        if entry is not None and entry.url == url:
+            # Show the expired copy now and revalidate it for the next render
+            get_metrics().inc('ytdl_cache_requests_total', cache='thumbnail', result='stale')
+            self._refresh_later(key, url, entry)
+            return entry.data, entry.mime
+
+        # Sessions showing the same video at the same time fetch it once
+        return get_flights('thumbnail').run(key, lambda publish: self._refresh(key, url, entry))
+
+    # Name of the cache entry (and its files) for a video's thumbnail
+    def key(self, video_id, url):
+        return hashlib.sha256(f"{video_id or url}:{self.width}".encode('utf-8')).hexdigest()[:32]
+
+    # One background revalidation per key at a time
+    def _refresh_later(self, key, url, entry):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                get_flights('thumbnail').run(key, lambda publish: self._refresh(key, url, entry))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="thumbnail-refresh", daemon=True).start()
+
+    def _refresh(self, key, url, entry):
+        if entry is not None and entry.url != url:
+            entry = None
+        with self._lock:
+            failed_at = self._failed.get(key)
+        if failed_at is not None and time.time() - failed_at < FAILURE_RETRY:
+            return (entry.data, entry.mime) if entry is not None else self.placeholder
+
+        request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        if entry is not None and entry.etag:
+            request.add_header('If-None-Match', entry.etag)
+        if entry is not None and entry.last_modified:
+            request.add_header('If-Modified-Since', entry.last_modified)
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read(MAX_SOURCE_BYTES + 1)
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise ValueError("Thumbnail too large")
+                data, mime = downscale(data, response.headers.get_content_type(), self.width)
+                entry = Thumbnail(url, data, mime, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            result = 'miss'
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or entry is None:
+                return self._fail(key, entry)
+            # Unchanged; the stored copy is good for another TTL
+            entry.fetched_at = time.time()
+            result = 'revalidated'
+        except Exception:
+            # Unreachable host, or not an image Pillow can read
+            return self._fail(key, entry)
+
+        get_metrics().inc('ytdl_cache_requests_total', cache='thumbnail', result=result)
+        self._store(key, entry)
+        return entry.data, entry.mime
+
+    # Show what was cached before, however old, or the placeholder
+    def _fail(self, key, entry):
+        with self._lock:
+            self._failed[key] = time.time()
+        get_metrics().inc('ytdl_cache_requests_total', cache='thumbnail', result='error')
+        if entry is not None:
+            return entry.data, entry.mime
+        return self.placeholder
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            if key not in self._disk:
+                return None
+        try:
+            with open(self.directory / f"{key}.json", encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self.directory / f"{key}.img", 'rb') as f:
+                data = f.read()
+            entry = Thumbnail(meta['url'], data, meta['mime'], meta.get('etag'), meta.get('last_modified'),
+                              float(meta['fetched_at']))
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable or not what _store writes; fetch the image again
+            with self._lock:
+                self._disk.pop(key, None)
+            return None
+        with self._lock:
+            self._remember_locked(key, entry)
+            if key in self._disk:
+                self._disk[key] = (self._disk[key][0], time.time())
+        return entry
+
+    def _remember_locked(self, key, entry):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.data)
+        self._memory[key] = entry
+        self._memory_bytes += len(entry.data)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped.data)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._failed.pop(key, None)
+            self._remember_locked(key, entry)
+        if self.directory is None:
+            return
+
+        meta = {
+            'url': entry.url,
+            'mime': entry.mime,
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'fetched_at': entry.fetched_at,
+        }
+        try:
+            for suffix, body in (('.img', entry.data), ('.json', json.dumps(meta).encode('utf-8'))):
+                tmp = self.directory / f"{key}{suffix}.tmp"
+                tmp.write_bytes(body)
+                os.replace(tmp, self.directory / f"{key}{suffix}")
+        except OSError:
+            return
+
+        # Drop the least recently used files until the disk layer fits
+        with self._lock:
+            self._disk[key] = (len(entry.data), time.time())
+            total = sum(size for size, _ in self._disk.values())
+            evicted = []
+            for other, (size, _) in sorted(self._disk.items(), key=lambda item: item[1][1]):
+                if total <= self.max_disk_bytes:
+                    break
+                if other == key:
+                    continue
+                del self._disk[other]
+                total -= size
+                evicted.append(other)
+        for other in evicted:
+            for suffix in ('.json', '.img'):
+                try:
+                    os.remove(self.directory / f"{other}{suffix}")
+                except OSError:
+                    pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Process-wide thumbnail cache shared by every Streamlit session
+def get_thumbnail_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache(
+                config.THUMBNAIL_CACHE_DIR,
+                width=config.THUMBNAIL_WIDTH,
+                ttl=config.THUMBNAIL_CACHE_TTL,
+                max_memory_bytes=config.THUMBNAIL_CACHE_MEMORY_BYTES,
+                max_disk_bytes=config.THUMBNAIL_CACHE_DISK_BYTES,
+                timeout=config.THUMBNAIL_FETCH_TIMEOUT,
+            )
+        return _cache
@@ -0,0 +1,69 @@
+import re
+from urllib.parse import urlparse, parse_qs
+
+# YouTube video IDs are always 11 characters from this alphabet
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+YOUTUBE_HOSTS = {
+    'youtube.com',
+    'www.youtube.com',
+    'm.youtube.com',
+    'music.youtube.com',
+    'youtube-nocookie.com',
+    'www.youtube-nocookie.com',
+}
+
+# Path prefixes that are followed directly by the video ID
+ID_PATH_PREFIXES = ('shorts', 'embed', 'live', 'v', 'e')
+
+
+# Extract the canonical video ID from any of the usual YouTube URL forms
+# (watch, youtu.be, shorts, embed, live). Returns None for anything else,
+# including bare playlist links.
+def extract_video_id(url):
+    if not url:
+        return None
+
+    url = url.strip()
+    if VIDEO_ID_RE.match(url):
+        return url
+
+    if '://' not in url:
+        url = 'https://' + url
+
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or '').lower()
+    parts = [p for p in parsed.path.split('/') if p]
+
+    candidate = None
+    if host in ('youtu.be', 'www.youtu.be'):
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        if parts and parts[0] == 'watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        elif len(parts) >= 2 and parts[0] in ID_PATH_PREFIXES:
+            candidate = parts[1]
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+# The one URL used for a video ID, whatever form it was given in
+def canonical_video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+# Links to a playlist (or a video inside one) resolve to the whole list
+def is_playlist_url(url):
+    return "playlist" in url.lower() or "&list=" in url
+
+
+# A title made safe to use as a file name: anything but word characters,
+# "-", "_", "." and spaces (path separators included) becomes "_"
+def safe_filename(title):
+    return re.sub(r'[^\w\-_\. ]', '_', title)
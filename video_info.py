@@ -0,0 +1,75 @@
+from audio import AUDIO_MODES
+from formats import format_bytes, select_formats
+from size_estimator import get_size_estimator
+
+
+# Estimate file size from the format metadata, falling back to a model
+# calibrated on past downloads. Returns (size, source), where source is
+# "metadata", "model" or "default"; size is None if it can't be estimated.
+def estimate_size(info, format_id, height=None, audio_only=False):
+    try:
+        return get_size_estimator().estimate(info, format_id, height, audio_only)
+    except Exception:
+        # If estimation fails, return None
+        return None, None
+
+
+# Turn a yt-dlp info dict into what the UI shows: title, channel and the
+# {label: format} options with their estimated sizes. No network access,
+# so it can be benchmarked against recorded or synthetic info dicts.
+def build_video_info(info, ffmpeg_available=False, prefer_small=False):
+    # Pick the best format per resolution tier. Adaptive video+audio
+    # pairs are merged when FFmpeg is available and delivered as separate
+    # files in a ZIP otherwise.
+    formats, format_index = select_formats(
+        info,
+        allow_merge=ffmpeg_available,
+        prefer_small=prefer_small,
+        allow_split=not ffmpeg_available,
+    )
+    for fmt in formats.values():
+        fmt['size_source'] = 'metadata'
+        if not fmt['size']:
+            fmt['size'], fmt['size_source'] = estimate_size(info, fmt['format_id'], fmt['height'])
+
+    # Add audio-only options. M4A and Opus keep the original stream,
+    # so their size is the source's; MP3 is re-encoded at a fixed bitrate.
+    for audio_mode, settings in AUDIO_MODES.items():
+        if audio_mode == 'mp3' and not ffmpeg_available:
+            continue
+
+        if 'bitrate' in settings and info.get('duration'):
+            audio_size = settings['bitrate'] * 1000 / 8 * info['duration']
+            audio_size_source = 'bitrate'
+        else:
+            audio_size, audio_size_source = estimate_size(info, settings['format'], 0, audio_only=True)
+            source = format_index.best_audio(ext=settings.get('source_ext'), codec=settings.get('source_codec'))
+            source_size = format_bytes(source, format_index.duration) if source else None
+            if source_size:
+                audio_size, audio_size_source = source_size, 'metadata'
+
+        # Without FFmpeg the Opus stream stays in its WebM container
+        ext = settings['ext']
+        if audio_mode == 'opus' and not ffmpeg_available:
+            ext = 'webm'
+
+        formats[settings['label']] = {
+            'format_id': settings['format'],
+            'size': audio_size,
+            'size_source': audio_size_source,
+            'height': 'Audio',
+            'ext': ext,
+            'audio_mode': audio_mode,
+        }
+
+    return {
+        'id': info.get('id', 'unknown'),
+        'title': info.get('title', 'Unknown'),
+        'channel': info.get('uploader', 'Unknown'),
+        'duration': info.get('duration', 0),
+        'views': info.get('view_count', 0),
+        'thumbnail': info.get('thumbnail', ''),
+        # Number of videos, for playlist links (None if unknown)
+        'playlist_count': info.get('playlist_count'),
+        'formats': formats
+    }
@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only work within this process
+    fcntl = None
+
+import config
+from delivery import get_artifact_store
+
+# Durable working directories for downloads. Each video/format/
+# post-processing combination always downloads into the same directory,
+# jobs/<key>/, so a retry, a new job or a restarted process finds the .part
+# files of an earlier attempt and yt-dlp continues them with Range requests
+# instead of starting over. A directory is locked while a download runs in
+# it; finished files are moved out to finished/ for delivery. A janitor
+# removes directories nobody came back for, by age and total size.
+
+LOCK_NAME = ".lock"
+STATE_NAME = ".state.json"
+
+_local_locks = {}  # path -> threading.Lock, where there is no fcntl
+_local_locks_lock = threading.Lock()
+
+
+# Lock a work directory (creating it if needed). Returns a handle, or None
+# if `blocking` is false and someone else holds the lock.
+def _lock_dir(path, blocking=True):
+    if fcntl is None:
+        with _local_locks_lock:
+            lock = _local_locks.setdefault(str(path), threading.Lock())
+        if not lock.acquire(blocking):
+            return None
+        path.mkdir(parents=True, exist_ok=True)
+        return lock
+
+    while True:
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            continue  # the janitor removed the directory in between
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # Whoever held the lock before may have removed the directory; a lock
+        # on the deleted file protects nothing, so start again
+        try:
+            if os.fstat(fd).st_ino == os.stat(path / LOCK_NAME).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _unlock_dir(handle):
+    if fcntl is None:
+        handle.release()
+    else:
+        os.close(handle)
+
+
+# Total bytes under a directory and the newest modification time in it
+def _dir_usage(path):
+    size, mtime = 0, path.stat().st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime)
+    return size, mtime
+
+
+# A locked working directory of one download
+class WorkDir:
+    def __init__(self, manager, path, handle):
+        self.manager = manager
+        self.path = path
+        self._handle = handle
+
+    # What an earlier attempt left behind (e.g. its output file name)
+    def load_state(self):
+        try:
+            with open(self.path / STATE_NAME, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        tmp = self.path / (STATE_NAME + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path / STATE_NAME)
+
+    # Move a finished file into a directory of its own that the caller owns
+    # (and later removes), and drop the working directory with its leftovers
+    def finish(self, filepath):
+        target_dir = tempfile.mkdtemp(dir=self.manager.finished_dir)
+        target = os.path.join(target_dir, os.path.basename(filepath))
+        shutil.move(filepath, target)
+        shutil.rmtree(self.path, ignore_errors=True)
+        return target
+
+    def release(self):
+        if self._handle is not None:
+            _unlock_dir(self._handle)
+            self._handle = None
+
+
+class WorkDirs:
+    def __init__(self, root, max_age, max_bytes):
+        self.root = Path(root)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.jobs_dir = self.root / "jobs"
+        self.finished_dir = self.root / "finished"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.finished_dir.mkdir(parents=True, exist_ok=True)
+
+    # The working directory for `key` (see artifact_key), locked for the
+    # caller; waits while another download of the same file runs in it
+    def acquire(self, key):
+        path = self.jobs_dir / key
+        return WorkDir(self, path, _lock_dir(path))
+
+    # A hard link to a finished file in a new directory of its own, or in
+    # `target_dir` (a copy where the filesystem has no hard links)
+    def link(self, filepath, target_dir=None):
+        target_dir = target_dir or tempfile.mkdtemp(dir=self.finished_dir)
+        target = os.path.join(target_dir, os.path.basename(filepath))
+        try:
+            os.link(filepath, target)
+        except OSError:
+            shutil.copyfile(filepath, target)
+        return target
+
+    # Remove abandoned directories: unfinished downloads untouched for
+    # max_age seconds, then the least recently touched ones until the total
+    # is under max_bytes, and finished files older than max_age that no
+    # artifact in `in_use` refers to. Directories in use are never touched.
+    # Returns the number of directories removed.
+    def sweep(self, in_use=()):
+        now = time.time()
+        removed = 0
+        in_use = {os.path.abspath(path) for path in in_use}
+
+        candidates = []  # (mtime, size, path)
+        total = 0
+        for path in self.jobs_dir.iterdir():
+            try:
+                size, mtime = _dir_usage(path)
+            except OSError:
+                continue
+            total += size
+            if now - mtime > self.max_age and self._remove(path):
+                total -= size
+                removed += 1
+            else:
+                candidates.append((mtime, size, path))
+
+        for mtime, size, path in sorted(candidates):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+
+        for path in self.finished_dir.iterdir():
+            if os.path.abspath(path) in in_use:
+                continue
+            try:
+                _, mtime = _dir_usage(path)
+            except OSError:
+                continue
+            if now - mtime > self.max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    # Remove a job directory unless a download holds its lock
+    def _remove(self, path):
+        handle = _lock_dir(path, blocking=False)
+        if handle is None:
+            return False
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            _unlock_dir(handle)
+        return True
+
+
+_work_dirs = None
+_janitor = None
+_lock = threading.Lock()
+
+
+def _sweep_forever(work_dirs, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            work_dirs.sweep(in_use=get_artifact_store().directories())
+        except Exception:
+            pass
+
+
+# Process-wide working directories; the first call sweeps what earlier runs
+# left behind and starts the janitor thread
+def get_work_dirs():
+    global _work_dirs, _janitor
+    with _lock:
+        if _work_dirs is None:
+            _work_dirs = WorkDirs(config.WORK_DIR, config.WORK_DIR_MAX_AGE, config.WORK_DIR_MAX_BYTES)
+            _work_dirs.sweep()
+        if _janitor is None and config.WORK_DIR_SWEEP_INTERVAL > 0:
+            _janitor = threading.Thread(
+                target=_sweep_forever,
+                args=(_work_dirs, config.WORK_DIR_SWEEP_INTERVAL),
+                name="work-dir-janitor",
+                daemon=True,
+            )
+            _janitor.start()
+        return _work_dirs
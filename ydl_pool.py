@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from metrics import get_metrics
+
+# Reusable yt-dlp instances. Creating a YoutubeDL sets up extractors,
+# cookies and request handlers, and a fresh instance opens new TCP/TLS
+# connections for every request; a pooled one keeps its extractor instances
+# and (with the requests handler) its keep-alive connections between uses.
+#
+# Instances are pooled per profile and set of options. Options that change
+# on every download are applied at checkout instead of being part of the
+# key, and hooks are routed through one dispatcher per instance so the
+# previous caller's hooks never fire for the next one.
+
+# Options applied per checkout rather than defining the pooled instance
+CALL_OPTIONS = ('format', 'outtmpl', 'noplaylist', 'merge_output_format', 'download_ranges', 'force_keyframes_at_cuts',
+                'progress_hooks', 'postprocessor_hooks')
+# Per-checkout options that are absent unless set
+OPTIONAL_CALL_OPTIONS = ('merge_output_format', 'download_ranges', 'force_keyframes_at_cuts')
+
+
+def _create_ydl(profile, options):
+    if profile == 'download':
+        from downloaders import SegmentedYoutubeDL
+        return SegmentedYoutubeDL(options)
+    import yt_dlp
+    return yt_dlp.YoutubeDL(options)
+
+
+class PooledYdl:
+    def __init__(self, key, ydl):
+        self.key = key
+        self.ydl = ydl
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.failures = 0  # in a row
+        self._progress_hooks = []
+        self._postprocessor_hooks = []
+        ydl.add_progress_hook(self._on_progress)
+        ydl.add_postprocessor_hook(self._on_postprocessor)
+
+    def _on_progress(self, d):
+        for hook in self._progress_hooks:
+            hook(d)
+
+    def _on_postprocessor(self, d):
+        for hook in self._postprocessor_hooks:
+            hook(d)
+
+    # Apply the per-checkout options (see CALL_OPTIONS)
+    def configure(self, options):
+        params = self.ydl.params
+        self._progress_hooks = list(options.get('progress_hooks') or ())
+        self._postprocessor_hooks = list(options.get('postprocessor_hooks') or ())
+        if 'outtmpl' in options:
+            params['outtmpl'] = {**params.get('outtmpl', {}), 'default': options['outtmpl']}
+        if 'format' in options:
+            params['format'] = options['format']
+            self.ydl.format_selector = self.ydl.build_format_selector(options['format'])
+        for name in ('noplaylist',) + OPTIONAL_CALL_OPTIONS:
+            if name in options:
+                params[name] = options[name]
+
+    def reset(self):
+        self._progress_hooks = []
+        self._postprocessor_hooks = []
+        for name in OPTIONAL_CALL_OPTIONS:
+            self.ydl.params.pop(name, None)
+
+
+class YdlPool:
+    def __init__(self, max_idle, max_uses, max_age, max_failures):
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self._idle = {}  # key -> [PooledYdl], most recently used last
+        self._lock = threading.Lock()
+
+    # Check out an instance for `profile` ('info', 'flat' or 'download')
+    # configured with `options`; give it back with release()
+    def acquire(self, profile, options):
+        static = {name: value for name, value in options.items() if name not in CALL_OPTIONS}
+        key = (profile, json.dumps(static, sort_keys=True, default=str))
+
+        pooled = None
+        stale = []
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if time.monotonic() - candidate.created_at > self.max_age:
+                    stale.append(candidate)
+                else:
+                    pooled = candidate
+                    break
+        for candidate in stale:
+            self._close(candidate)
+
+        if pooled is None:
+            pooled = PooledYdl(key, _create_ydl(profile, static))
+            get_metrics().inc('ytdl_ydl_instances_total', profile=profile, event='created')
+        else:
+            get_metrics().inc('ytdl_ydl_instances_total', profile=profile, event='reused')
+        pooled.configure(options)
+        pooled.uses += 1
+        return pooled
+
+    # Return an instance; one that failed too often in a row, was used too
+    # many times or is too old is closed instead of being handed out again
+    def release(self, pooled, failed=False):
+        pooled.reset()
+        pooled.failures = pooled.failures + 1 if failed else 0
+        healthy = (pooled.failures < self.max_failures
+                   and pooled.uses < self.max_uses
+                   and time.monotonic() - pooled.created_at <= self.max_age)
+        if healthy:
+            with self._lock:
+                idle = self._idle.setdefault(pooled.key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(pooled)
+                    return
+        self._close(pooled)
+
+    # acquire() and release() around a block; exceptions count as failures
+    @contextmanager
+    def borrow(self, profile, options):
+        pooled = self.acquire(profile, options)
+        failed = True
+        try:
+            yield pooled.ydl
+            failed = False
+        finally:
+            self.release(pooled, failed=failed)
+
+    def _close(self, pooled):
+        get_metrics().inc('ytdl_ydl_instances_total', profile=pooled.key[0], event='recycled')
+        try:
+            pooled.ydl.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_lock = threading.Lock()
+
+
+# Process-wide pool shared by every session and job worker
+def get_ydl_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = YdlPool(
+                max_idle=config.YDL_POOL_SIZE,
+                max_uses=config.YDL_POOL_MAX_USES,
+                max_age=config.YDL_POOL_MAX_AGE,
+                max_failures=config.YDL_POOL_MAX_FAILURES,
+            )
+        return _pool
@@ -0,0 +1,111 @@
+import os
+import struct
+import time
+import zlib
+
+# Stored (uncompressed) ZIP archives that are never written anywhere. The
+# archive is described as a list of parts, header bytes built here and
+# byte ranges of the member files on disk, so it can be streamed (with
+# sendfile, and with Range requests) straight from the members. Only the
+# CRC-32 of each member has to be computed up front, in one read of the
+# file; headers are laid out with ZIP64 records where sizes or offsets
+# don't fit 32 bits.
+
+ZIP64_LIMIT = 0xFFFFFFFF
+UTF8_FLAG = 0x800
+CRC_CHUNK_SIZE = 1024 * 1024
+
+
+def file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CRC_CHUNK_SIZE)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+
+# DOS date and time fields for a Unix timestamp
+def _dos_time(timestamp):
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipLayout:
+    # `members` is a list of (name in the archive, path of a file or bytes)
+    def __init__(self, members):
+        self.parts = []  # (offset, length, bytes or path)
+        self.paths = []
+        self.size = 0
+        central = []
+
+        for arcname, source in members:
+            if isinstance(source, bytes):
+                length, crc, mtime = len(source), zlib.crc32(source), time.time()
+            else:
+                length, crc, mtime = os.path.getsize(source), file_crc32(source), os.path.getmtime(source)
+                self.paths.append(source)
+            name = arcname.encode('utf-8')
+            dos_time, dos_date = _dos_time(mtime)
+            offset = self.size
+
+            zip64 = length >= ZIP64_LIMIT
+            extra = struct.pack('<HHQQ', 0x0001, 16, length, length) if zip64 else b''
+            header = struct.pack(
+                '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, UTF8_FLAG, 0, dos_time, dos_date, crc,
+                ZIP64_LIMIT if zip64 else length, ZIP64_LIMIT if zip64 else length, len(name), len(extra),
+            ) + name + extra
+            self._add(header)
+            self._add(source, length)
+
+            # The central directory only carries the fields that overflowed
+            central_extra = []
+            if zip64:
+                central_extra += [length, length]
+            if offset >= ZIP64_LIMIT:
+                central_extra.append(offset)
+            extra = struct.pack(f'<HH{len(central_extra)}Q', 0x0001, 8 * len(central_extra), *central_extra) \
+                if central_extra else b''
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45 if central_extra else 20, UTF8_FLAG, 0,
+                dos_time, dos_date, crc, ZIP64_LIMIT if zip64 else length, ZIP64_LIMIT if zip64 else length,
+                len(name), len(extra), 0, 0, 0, 0o100644 << 16, min(offset, ZIP64_LIMIT),
+            ) + name + extra)
+
+        directory = b''.join(central)
+        directory_offset = self.size
+        count = len(central)
+        trailer = b''
+        if directory_offset >= ZIP64_LIMIT or len(directory) >= ZIP64_LIMIT or count >= 0xFFFF:
+            record_offset = directory_offset + len(directory)
+            trailer += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, len(directory),
+                                   directory_offset)
+            trailer += struct.pack('<IIQI', 0x07064b50, 0, record_offset, 1)
+        trailer += struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                               min(len(directory), ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0)
+        self._add(directory + trailer)
+
+    def _add(self, source, length=None):
+        length = len(source) if length is None else length
+        if length:
+            self.parts.append((self.size, length, source))
+            self.size += length
+
+    # The archive bytes from `start` on, `length` of them, as a sequence of
+    # bytes objects and (path, offset, count) ranges of member files
+    def pieces(self, start, length):
+        end = start + length
+        for offset, part_length, source in self.parts:
+            if offset + part_length <= start:
+                continue
+            if offset >= end:
+                break
+            first = max(start - offset, 0)
+            last = min(end - offset, part_length)
+            if isinstance(source, bytes):
+                yield source[first:last]
+            else:
+                yield source, first, last - first